@@ -1,105 +1,152 @@
 import streamlit as st
-import pandas as pd
-import json, os
+import sqlite3, time
 
-from modules.auth import get_angelone_credentials, get_zerodha_credentials
+from modules.auth import load_accounts
 from utils.comparison import compute_common_unique
+from utils.schema import normalize_and_enrich
 from utils.helpers import clean_env_value  # still used elsewhere if needed
-from services.smartapi_service import (
-    fetch_portfolio as fetch_angelone_portfolio,
-    fetch_zerodha_portfolio
-)
+from services.smartapi_service import BROKER_FETCHERS
+from services.fetch_orchestrator import BrokerJob, fetch_all
+from services.holdings_cache import get_holdings_cache
+from services.history_store import get_history_store
+from services.price_stream import account_feed_factory, get_price_stream
+from services.live_alerts import get_live_alerts
+from services.statement_import import STATEMENT_EXTS, get_statement_importer, statement_files, statements_dir
 from modules.compare_tab import render_compare_tab
 from modules.alerts_tab import render_alerts_tab
 from modules.overview_tab import render_overview_tab
+from modules.perf_panel import render_perf_panel
+from utils.snapshot import snapshot_key
+from utils.timing import span, start_run, finish_run
 
 st.set_page_config(page_title="WHALESTREET DASHBOARD | Portfolio Dashboard",
                    layout="wide", page_icon="📊")
+start_run()
 st.title("📊 Portfolio Dashboard")
 
 # -------- Auth & Credentials --------
-angel_creds = get_angelone_credentials()
-zerodha_creds = get_zerodha_credentials()
+# One entry per broker account (config/accounts.json, or the legacy AngelOne + Zerodha env vars)
+try:
+    accounts = load_accounts()
+except (OSError, ValueError) as e:
+    st.error(f"❌ Could not load the account registry: {e}")
+    accounts = []
 
 # -------- Utility --------
-def refresh_portfolios():
-    for k in list(st.session_state.keys()):
-        if k.startswith("portfolio_"):
-            del st.session_state[k]
+holdings_cache = get_holdings_cache()
 
+# Refresh forces a synchronous refetch for this run; other sessions keep
+# being served from the shared cache.
+force_refresh = st.session_state.pop("force_refresh", False)
 if st.button("🔄 Refresh Portfolios"):
-    refresh_portfolios()
+    st.session_state.force_refresh = True
     st.rerun()
 
-def get_or_fetch(key, fetch_fn, *args, **kw):
-    skey = f"portfolio_{key}"
-    if skey not in st.session_state:
-        st.session_state[skey] = fetch_fn(*args, **kw)
-    return st.session_state[skey]
-
-def normalize_and_enrich(df: pd.DataFrame) -> pd.DataFrame:
-    if df is None or df.empty:
-        return pd.DataFrame()
-    df = df.copy()
-
-    # Standardize column names
-    for c in ["instrument","tradingsymbol","trading_symbol","symbol","name"]:
-        if c in df.columns:
-            df.rename(columns={c: "instrument"}, inplace=True); break
-    for c in ["quantity","qty","QTY","Quantity"]:
-        if c in df.columns and c != "quantity":
-            df.rename(columns={c:"quantity"}, inplace=True); break
-    for c in ["avg_price","average_price","Average Price","avgPrice","Avg. cost","avg_cost","avg_cost_price"]:
-        if c in df.columns and c != "avg_price":
-            df.rename(columns={c:"avg_price"}, inplace=True); break
-    for c in ["ltp","LTP","last_price","last_traded_price","close_price"]:
-        if c in df.columns and c != "ltp":
-            df.rename(columns={c:"ltp"}, inplace=True); break
-
-    if "invested" not in df.columns and {"avg_price","quantity"}.issubset(df.columns):
-        df["invested"] = (df["avg_price"].fillna(0)*df["quantity"].fillna(0)).round(2)
-    else:
-        df["invested"] = df.get("invested", 0).fillna(0)
-
-    if "pnl_abs" not in df.columns and {"avg_price","ltp","quantity"}.issubset(df.columns):
-        df["pnl_abs"] = ((df["ltp"]-df["avg_price"])*df["quantity"]).round(2)
-    else:
-        df["pnl_abs"] = df.get("pnl_abs", 0).fillna(0)
-
-    if "pnl_pct" not in df.columns and {"avg_price","ltp"}.issubset(df.columns):
-        df["pnl_pct"] = ((df["ltp"]-df["avg_price"])/df["avg_price"]).replace([pd.NA],0)*100
-    df["pnl_pct"] = df.get("pnl_pct", 0).fillna(0).round(2)
-    return df
+def cached_job(name, account, fetch_fn, args, timeout):
+    """BrokerJob that goes through the process-wide holdings cache."""
+    return BrokerJob(name, holdings_cache.get, ((name, account), fetch_fn, *args),
+                     {"force": force_refresh}, timeout=timeout)
+
+def get_or_fetch_all(jobs):
+    """Fetch every account concurrently, FETCH_CONCURRENCY at a time (cache hits return immediately)."""
+    try:
+        workers = int(clean_env_value("FETCH_CONCURRENCY") or 8)
+    except ValueError:
+        workers = 8
+    results = fetch_all(jobs, max_workers=workers)
+    st.session_state["fetch_timings"] = results
+    return {name: res.df for name, res in results.items()}
 
 # -------- Fetch Data --------
-angel_df = normalize_and_enrich(
-    get_or_fetch("AngelOne",
-                 fetch_angelone_portfolio,
-                 angel_creds.api_key,
-                 angel_creds.client_id,
-                 angel_creds.mpin,
-                 angel_creds.totp_secret)
-)
-zerodha_df = normalize_and_enrich(
-    get_or_fetch("Zerodha",
-                 fetch_zerodha_portfolio,
-                 zerodha_creds.api_key,
-                 zerodha_creds.api_secret,
-                 zerodha_creds.access_token)
-)
-
-dfs = {"AngelOne": angel_df, "Zerodha": zerodha_df}
-valid_dfs = {k:v for k,v in dfs.items() if not v.empty and "instrument" in v.columns}
-common_list, unique_per = compute_common_unique(valid_dfs)
+# Only configured accounts are fetched, so an unused broker's SDK is never imported
+configured = [acc for acc in accounts if acc.configured]
+broker_jobs = [
+    cached_job(acc.name, acc.account_id, BROKER_FETCHERS[acc.broker][0],
+               BROKER_FETCHERS[acc.broker][1](acc.creds), acc.timeout)
+    for acc in configured
+]
+accounts_by_name = {acc.name: acc for acc in configured}
+if not broker_jobs:
+    st.warning("⚠️ No broker credentials configured – see .env.example.")
+unconfigured = [acc.name for acc in accounts if not acc.configured]
+if unconfigured and broker_jobs:
+    st.sidebar.caption(f"Skipped (no credentials): {', '.join(unconfigured)}")
+with span("fetch.brokers"):
+    raw_dfs = get_or_fetch_all(broker_jobs)
+
+# -------- Statement imports --------
+# CSV/XLSX holdings statements (STATEMENTS_DIR plus sidebar uploads) become extra portfolios
+uploads = st.sidebar.file_uploader("📂 Import holdings statements", type=[e.lstrip(".") for e in STATEMENT_EXTS],
+                                   accept_multiple_files=True, key="statement_uploads")
+statement_sources = statement_files(statements_dir()) if statements_dir() else []
+statement_sources += [(u.name, u.getvalue()) for u in uploads or []]
+if statement_sources:
+    with span("import.statements"):
+        imported = get_statement_importer().import_files(statement_sources, reserved=raw_dfs.keys())
+    raw_dfs.update(imported.portfolios)
+    parsed = sum(src == "parse" for src in imported.sources.values())
+    st.sidebar.caption(f"📂 {len(imported.portfolios)} statement portfolio(s) "
+                       f"({parsed} parsed, {len(imported.portfolios) - parsed} cached) in {imported.duration:.2f}s")
+    for file_name, reason in imported.errors.items():
+        st.sidebar.warning(f"⚠️ {file_name}: {reason}")
+
+# -------- Live prices --------
+# Held tokens are streamed over the broker tick feeds; fresher ticks than the
+# holdings fetch are joined in below so P&L moves without a refetch.
+price_stream = get_price_stream()
+
+def live_prices(job):
+    acc = accounts_by_name[job.name]
+    factory = account_feed_factory(acc.broker, acc.name, acc.creds)
+    if price_stream is None or factory is None:
+        return None
+    price_stream.track(job.name, raw_dfs.get(job.name), factory)
+    entry = holdings_cache.info(job.args[0])
+    return price_stream.table.prices(job.name, since=entry.fetched_at if entry else 0.0)
+
+with span("prices.live"):
+    live = {job.name: live_prices(job) for job in broker_jobs}
+
+with st.sidebar.expander("⏱️ Broker fetch times", expanded=False):
+    for job in broker_jobs:
+        res = st.session_state["fetch_timings"][job.name]
+        note = f" – {res.error}" if res.error else ""
+        st.caption(f"{job.name}: {res.duration:.2f}s ({res.status}){note}")
+        entry = holdings_cache.info(job.args[0])
+        if entry is not None:
+            refreshing = " · refreshing…" if holdings_cache.is_refreshing(job.args[0]) else ""
+            st.caption(f"↳ data age {entry.age():.0f}s ({entry.source}){refreshing}")
+        if price_stream is not None and price_stream.is_streaming(job.name):
+            last = price_stream.table.last_tick(job.name)
+            st.caption(f"↳ live prices, last tick {time.time() - last:.0f}s ago" if last
+                       else "↳ live prices, waiting for ticks")
+
+with span("normalize"):
+    dfs = {name: normalize_and_enrich(df, broker=name, live_prices=live.get(name))
+           for name, df in raw_dfs.items()}
+    valid_dfs = {k:v for k,v in dfs.items() if not v.empty and "instrument" in v.columns}
+with span("compare.common_unique"):
+    comparison = compute_common_unique(valid_dfs)
+
+# Between reruns, ticks drive alert events through an incremental evaluator on these holdings
+if price_stream is not None and any(price_stream.is_streaming(job.name) for job in broker_jobs):
+    try:
+        get_live_alerts(price_stream.table).sync(snapshot_key(raw_dfs), valid_dfs)
+    except sqlite3.Error as e:
+        st.sidebar.caption(f"⚠️ Live alerts paused: {e}")
 
 # -------- Tabs --------
+# Each tab is a fragment: its own widgets rerun only that tab against the memoized data above
 tab_compare, tab_alerts, tab_overview = st.tabs(["Compare","Alerts","Overview"])
 
 with tab_compare:
-    render_compare_tab(valid_dfs, common_list, unique_per)
+    render_compare_tab(valid_dfs, comparison)
 
 with tab_alerts:
     render_alerts_tab(valid_dfs)
 
 with tab_overview:
-    render_overview_tab(dfs)
+    render_overview_tab(dfs, get_history_store())
+
+# -------- Performance --------
+render_perf_panel(finish_run())
@@ -0,0 +1,129 @@
+"""
+Render-time benchmark for the Compare and Alerts tabs at many-account scale.
+
+    python -m benchmarks.render                   # 10, 30 and 50 portfolios
+    python -m benchmarks.render --portfolios 30,50 --instruments 300 --rules 100
+
+Each size runs the two tabs headless through streamlit's AppTest: a cold first
+render (empty memo caches) and a warm rerun on unchanged holdings, which is
+what a widget interaction costs. Timings cover the tab render calls only.
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import tempfile
+from pathlib import Path
+
+from benchmarks.run import RESULTS_DIR, _git_rev
+
+DEFAULT_PORTFOLIOS = "10,30,50"
+
+
+def _tabs_script(n_ports, n_inst, seed):
+    # Runs as a streamlit script inside AppTest: imports must live here
+    import time
+
+    import streamlit as st
+
+    from benchmarks.synthetic import generate_portfolios
+    from modules.alerts_tab import render_alerts_tab
+    from modules.compare_tab import render_compare_tab
+    from utils.comparison import compute_common_unique
+    from utils.schema import normalize_and_enrich
+
+    raw = generate_portfolios(n_ports, n_inst, seed=seed)
+    dfs = {name: normalize_and_enrich(df, broker=name) for name, df in raw.items()}
+    timings = st.session_state.setdefault("bench_ms", [])
+    run = {}
+    t0 = time.perf_counter()
+    comparison = compute_common_unique(dfs)
+    run["compare.common_unique"] = (time.perf_counter() - t0) * 1000.0
+    tab_compare, tab_alerts = st.tabs(["Compare", "Alerts"])
+    with tab_compare:
+        t0 = time.perf_counter()
+        render_compare_tab(dfs, comparison)
+        run["render.compare"] = (time.perf_counter() - t0) * 1000.0
+    with tab_alerts:
+        t0 = time.perf_counter()
+        render_alerts_tab(dfs)
+        run["render.alerts"] = (time.perf_counter() - t0) * 1000.0
+    timings.append(run)
+
+
+def bench_portfolios(n_ports: int, n_inst: int, n_rules: int, warm_runs: int, seed: int) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    from benchmarks.synthetic import generate_rules
+    from services.rule_store import RuleStore
+    from utils import alerts as alerts_mod
+    from utils import comparison as comparison_mod
+    from utils import schema as schema_mod
+
+    # Fresh rule/event stores per size; the tab reads rules from ALERT_RULES_DB
+    tmp = tempfile.mkdtemp(prefix="render_bench_")
+    os.environ["ALERT_RULES_DB"] = str(Path(tmp) / "rules.db")
+    os.environ["ALERT_EVENTS_DB"] = str(Path(tmp) / "events.db")
+    import services.alert_events as events_mod
+    import services.rule_store as rule_store_mod
+    rule_store_mod._store = events_mod._store = None
+    store = RuleStore(Path(os.environ["ALERT_RULES_DB"]), legacy_json=None)
+    ports = [f"Portfolio{p + 1:02d}" for p in range(n_ports)]
+    for rule in generate_rules(n_rules, ports, seed=seed):
+        store.create(rule)
+
+    for memo in (schema_mod._NORMALIZED, comparison_mod._COMMON_UNIQUE,
+                 comparison_mod._COMPARE_TABLES, alerts_mod._SNAPSHOTS):
+        memo.clear()
+    at = AppTest.from_function(_tabs_script, args=(n_ports, n_inst, seed), default_timeout=600)
+    for _ in range(1 + warm_runs):
+        at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    runs = at.session_state["bench_ms"]
+    cold, warm = runs[0], runs[1:]
+    return {
+        "portfolios": n_ports, "instruments": n_inst, "rules": n_rules,
+        "cold_ms": {k: round(v, 1) for k, v in cold.items()},
+        "warm_ms": {k: round(statistics.median(r[k] for r in warm), 1) for k in cold} if warm else {},
+        "alert_cards": sum(1 for m in at.markdown if m.value.startswith("<details")),
+    }
+
+
+def _print_table(results: list):
+    for r in results:
+        print(f"\n{r['portfolios']} portfolios x {r['instruments']} instruments, {r['rules']} rules")
+        for name, cold in r["cold_ms"].items():
+            warm = r["warm_ms"].get(name)
+            print(f"  {name:<24} cold {cold:>9.1f} ms   warm {warm:>9.1f} ms" if warm is not None
+                  else f"  {name:<24} cold {cold:>9.1f} ms")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark Compare/Alerts render time at many portfolios.")
+    p.add_argument("--portfolios", default=DEFAULT_PORTFOLIOS, help="Comma-separated portfolio counts")
+    p.add_argument("--instruments", type=int, default=200, help="Holdings per portfolio")
+    p.add_argument("--rules", type=int, default=50)
+    p.add_argument("--warm-runs", type=int, default=3)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", default="", help="Output JSON path (default benchmarks/results/render_<timestamp>.json)")
+    args = p.parse_args()
+
+    results = [bench_portfolios(int(n), args.instruments, args.rules, args.warm_runs, args.seed)
+               for n in args.portfolios.split(",")]
+    payload = {
+        "generated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_rev": _git_rev(),
+        "params": vars(args),
+        "results": results,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"render_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    _print_table(results)
+    print(f"\nSaved results to {out}")
+
+
+if __name__ == "__main__":
+    main()
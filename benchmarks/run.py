@@ -0,0 +1,132 @@
+"""
+Scaling benchmarks for the dashboard's data paths.
+
+    python -m benchmarks.run                      # default sizes, writes benchmarks/results/<ts>.json
+    python -m benchmarks.run --sizes 5x2000 --rules 1000 --baseline benchmarks/results/old.json
+"""
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_portfolios, generate_rules
+from utils import alerts as alerts_mod
+from utils.alerts import generate_alerts
+from utils.comparison import _build_compare_table, _compute_common_unique
+from utils.highlights import portfolio_highlights
+from utils import schema as schema_mod
+from utils.schema import normalize_and_enrich
+
+RESULTS_DIR = Path("benchmarks/results")
+DEFAULT_SIZES = "2x200,5x2000,10x2000"
+
+
+def _time(fn, repeat: int, setup=None) -> dict:
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return {"min_ms": round(min(samples), 3), "median_ms": round(statistics.median(samples), 3),
+            "max_ms": round(max(samples), 3)}
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return ""
+
+
+def bench_size(n_ports: int, n_inst: int, n_rules: int, overlap: float, loss_ratio: float,
+               repeat: int, seed: int) -> dict:
+    raw = generate_portfolios(n_ports, n_inst, overlap=overlap, loss_ratio=loss_ratio, seed=seed)
+    dfs = {name: normalize_and_enrich(df, broker=name) for name, df in raw.items()}
+    rules = generate_rules(n_rules, list(dfs), seed=seed)
+    first = next(iter(dfs.values()))
+
+    timings = {
+        "normalize_and_enrich": _time(
+            lambda: [normalize_and_enrich(df, broker=n) for n, df in raw.items()], repeat,
+            setup=schema_mod._NORMALIZED.clear),
+        "normalize_and_enrich_warm": _time(
+            lambda: [normalize_and_enrich(df, broker=n) for n, df in raw.items()], repeat),
+        "generate_alerts_cold": _time(
+            lambda: generate_alerts(dfs, rules), repeat, setup=alerts_mod._SNAPSHOTS.clear),
+        "generate_alerts_warm": _time(lambda: generate_alerts(dfs, rules), repeat),
+        "compute_common_unique": _time(lambda: _compute_common_unique(dfs), repeat),
+        "compare_table_build": _time(lambda: _build_compare_table(dfs), repeat),
+        "portfolio_highlights": _time(lambda: portfolio_highlights(first), repeat),
+    }
+    return {
+        "portfolios": n_ports, "instruments": n_inst, "rules": n_rules,
+        "overlap": overlap, "loss_ratio": loss_ratio,
+        "alerts_fired": int(len(generate_alerts(dfs, rules))),
+        "timings": timings,
+    }
+
+
+def _print_table(results: list, baseline: dict = None):
+    base = {}
+    for r in (baseline or {}).get("results", []):
+        base[(r["portfolios"], r["instruments"], r["rules"])] = r["timings"]
+    for r in results:
+        key = (r["portfolios"], r["instruments"], r["rules"])
+        print(f"\n{r['portfolios']} portfolios x {r['instruments']} instruments, {r['rules']} rules "
+              f"({r['alerts_fired']} alerts)")
+        for name, t in r["timings"].items():
+            line = f"  {name:<24} {t['median_ms']:>10.2f} ms"
+            old = base.get(key, {}).get(name)
+            if old and t["median_ms"] > 0:
+                line += f"   (baseline {old['median_ms']:.2f} ms, x{old['median_ms'] / t['median_ms']:.2f})"
+            print(line)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark normalization, alerts, comparison and highlights.")
+    p.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated <portfolios>x<instruments>")
+    p.add_argument("--rules", type=int, default=1000)
+    p.add_argument("--overlap", type=float, default=0.5)
+    p.add_argument("--loss-ratio", type=float, default=0.4)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", default="", help="Output JSON path (default benchmarks/results/<timestamp>.json)")
+    p.add_argument("--baseline", default="", help="Earlier results JSON to compare against")
+    args = p.parse_args()
+
+    results = []
+    for size in args.sizes.split(","):
+        n_ports, n_inst = (int(x) for x in size.lower().split("x"))
+        results.append(bench_size(n_ports, n_inst, args.rules, args.overlap, args.loss_ratio,
+                                  args.repeat, args.seed))
+
+    payload = {
+        "generated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "params": vars(args),
+        "results": results,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"bench_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")) if args.baseline else None
+    _print_table(results, baseline)
+    print(f"\nSaved results to {out}")
+
+
+if __name__ == "__main__":
+    main()
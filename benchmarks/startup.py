@@ -0,0 +1,142 @@
+"""
+Startup-time report: cold import cost and per-rerun latency.
+
+    python -m benchmarks.startup                  # writes benchmarks/results/startup_<ts>.json
+    python -m benchmarks.startup --size 5x2000 --baseline benchmarks/results/startup_old.json
+
+Imports are timed in fresh interpreters. "app imports" is what app.py pulls in
+before the first broker fetch; "broker SDKs" is what a fetch adds on top of it
+(the cost cold start used to pay up front). The rerun section replays the
+normalize -> compare -> alerts pipeline on unchanged raw holdings with the
+memo caches cleared (cold) and kept (warm, what a widget-only rerun costs).
+"""
+import argparse
+import datetime
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.run import RESULTS_DIR, _git_rev, _time
+from benchmarks.synthetic import generate_portfolios, generate_rules
+from utils import alerts as alerts_mod
+from utils import comparison as comparison_mod
+from utils import schema as schema_mod
+from utils.alerts import generate_alerts
+from utils.comparison import compute_common_unique
+from utils.schema import normalize_and_enrich
+
+APP_IMPORTS = [
+    "streamlit", "pandas", "modules.auth", "utils.comparison", "utils.schema",
+    "services.smartapi_service", "services.fetch_orchestrator", "services.holdings_cache",
+    "services.history_store", "services.price_stream", "modules.compare_tab",
+    "modules.alerts_tab", "modules.overview_tab", "modules.perf_panel",
+]
+BROKER_SDKS = ["SmartApi", "pyotp", "kiteconnect"]
+
+_PROBE = """
+import importlib, json, sys, time
+base, extra = json.loads(sys.argv[1]), json.loads(sys.argv[2])
+t0 = time.perf_counter()
+for m in base:
+    importlib.import_module(m)
+t1 = time.perf_counter()
+loaded = sorted(m for m in extra if m in sys.modules)
+for m in extra:
+    try:
+        importlib.import_module(m)
+    except ImportError:
+        pass
+t2 = time.perf_counter()
+print(json.dumps({"base_ms": (t1 - t0) * 1000, "extra_ms": (t2 - t1) * 1000, "preloaded": loaded}))
+"""
+
+
+def measure_imports(repeat: int) -> dict:
+    base, extra, preloaded = [], [], set()
+    for _ in range(repeat):
+        out = subprocess.check_output(
+            [sys.executable, "-c", _PROBE, json.dumps(APP_IMPORTS), json.dumps(BROKER_SDKS)], text=True)
+        probe = json.loads(out.strip().splitlines()[-1])
+        base.append(probe["base_ms"])
+        extra.append(probe["extra_ms"])
+        preloaded.update(probe["preloaded"])
+    return {
+        "app_imports_ms": round(statistics.median(base), 1),
+        "broker_sdks_ms": round(statistics.median(extra), 1),
+        "sdks_loaded_at_startup": sorted(preloaded),
+    }
+
+
+def _clear_memos():
+    schema_mod._NORMALIZED.clear()
+    comparison_mod._COMMON_UNIQUE.clear()
+    alerts_mod._SNAPSHOTS.clear()
+
+
+def measure_rerun(n_ports: int, n_inst: int, n_rules: int, repeat: int, seed: int) -> dict:
+    raw = generate_portfolios(n_ports, n_inst, seed=seed)
+    rules = generate_rules(n_rules, list(raw), seed=seed)
+
+    def rerun():
+        dfs = {name: normalize_and_enrich(df, broker=name) for name, df in raw.items()}
+        compute_common_unique(dfs)
+        generate_alerts(dfs, rules)
+
+    return {
+        "portfolios": n_ports, "instruments": n_inst, "rules": n_rules,
+        "rerun_cold": _time(rerun, repeat, setup=_clear_memos),
+        "rerun_warm": _time(rerun, repeat),
+    }
+
+
+def _print_report(payload: dict, baseline: dict = None):
+    imp, rr = payload["imports"], payload["rerun"]
+    old_imp = (baseline or {}).get("imports", {})
+    old_rr = (baseline or {}).get("rerun", {})
+
+    def _line(label, value, old):
+        line = f"  {label:<28} {value:>10.1f} ms"
+        if old:
+            line += f"   (baseline {old:.1f} ms)"
+        return line
+
+    print("\nCold start")
+    print(_line("app imports", imp["app_imports_ms"], old_imp.get("app_imports_ms")))
+    print(_line("broker SDKs (deferred)", imp["broker_sdks_ms"], old_imp.get("broker_sdks_ms")))
+    print(f"  SDKs loaded at startup       {', '.join(imp['sdks_loaded_at_startup']) or 'none'}")
+    print(f"\nRerun, {rr['portfolios']} portfolios x {rr['instruments']} instruments, {rr['rules']} rules")
+    for name in ("rerun_cold", "rerun_warm"):
+        print(_line(name, rr[name]["median_ms"], old_rr.get(name, {}).get("median_ms")))
+
+
+def main():
+    p = argparse.ArgumentParser(description="Report cold import time and per-rerun latency.")
+    p.add_argument("--size", default="5x2000", help="<portfolios>x<instruments> for the rerun replay")
+    p.add_argument("--rules", type=int, default=200)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", default="", help="Output JSON path (default benchmarks/results/startup_<timestamp>.json)")
+    p.add_argument("--baseline", default="", help="Earlier startup report to compare against")
+    args = p.parse_args()
+
+    n_ports, n_inst = (int(x) for x in args.size.lower().split("x"))
+    payload = {
+        "generated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_rev": _git_rev(),
+        "params": vars(args),
+        "imports": measure_imports(args.repeat),
+        "rerun": measure_rerun(n_ports, n_inst, args.rules, args.repeat, args.seed),
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"startup_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")) if args.baseline else None
+    _print_report(payload, baseline)
+    print(f"\nSaved results to {out}")
+
+
+if __name__ == "__main__":
+    main()
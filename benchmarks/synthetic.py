@@ -0,0 +1,79 @@
+"""Seeded generators for realistic multi-portfolio holdings and alert rule sets."""
+import random
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+PRESENCE_OPTS = ["Unique", "Not Unique", "All"]
+DIRECTION_OPTS = ["Profit", "Loss", "Unchanged", ""]
+COMP_OPTS = ["Greater Than", "Less Than", "Range", ""]
+
+
+def generate_portfolios(n_portfolios: int, n_instruments: int, overlap: float = 0.5,
+                        loss_ratio: float = 0.4, seed: int = 0,
+                        broker_schema: bool = True) -> Dict[str, pd.DataFrame]:
+    """
+    n_portfolios x n_instruments holdings.
+    overlap:    fraction of each portfolio's instruments drawn from a pool shared by all portfolios
+    loss_ratio: fraction of holdings currently below their average price
+    broker_schema=True returns Zerodha-style raw columns (tradingsymbol, quantity,
+    average_price, last_price) so normalization is exercised too.
+    """
+    rng = np.random.default_rng(seed)
+    n_shared = int(round(n_instruments * overlap))
+    shared = [f"CORE{i:05d}" for i in range(n_shared)]
+
+    dfs = {}
+    for p in range(n_portfolios):
+        own = [f"P{p:02d}X{i:05d}" for i in range(n_instruments - n_shared)]
+        syms = shared + own
+        n = len(syms)
+        avg = np.round(rng.lognormal(mean=5.5, sigma=1.0, size=n), 2)
+        is_loss = rng.random(n) < loss_ratio
+        move = np.abs(rng.normal(0.0, 0.18, size=n))
+        ltp = np.round(avg * np.where(is_loss, 1 - np.minimum(move, 0.9), 1 + move), 2)
+        qty = rng.integers(1, 500, size=n).astype(float)
+        order = rng.permutation(n)
+        df = pd.DataFrame({
+            "tradingsymbol": np.asarray(syms, dtype=object)[order],
+            "quantity": qty[order],
+            "average_price": avg[order],
+            "last_price": ltp[order],
+        })
+        if not broker_schema:
+            df = df.rename(columns={"tradingsymbol": "instrument", "average_price": "avg_price",
+                                    "last_price": "ltp"})
+        dfs[f"Portfolio{p + 1:02d}"] = df
+    return dfs
+
+
+def generate_rules(n_rules: int, portfolios: Sequence[str], seed: int = 0) -> List[dict]:
+    """Alert rules in the data/alert_rules.json format with a realistic mix of settings."""
+    rnd = random.Random(seed)
+    rules = []
+    for rid in range(1, n_rules + 1):
+        # Mostly fully specified rules, like the saved ones; a few catch-alls
+        direction = rnd.choices(DIRECTION_OPTS, weights=[45, 45, 5, 5])[0]
+        pl_comp = rnd.choice(COMP_OPTS[:3]) if direction and direction != "Unchanged" else ""
+        inv_comp = rnd.choices(COMP_OPTS, weights=[40, 20, 20, 20])[0]
+        applied = [] if rnd.random() < 0.6 else rnd.sample(list(portfolios), k=max(1, len(portfolios) // 2))
+        pl_from = float(rnd.choice([1, 2, 5, 10, 15, 20, 30]))
+        inv_from = float(rnd.choice([5_000, 20_000, 50_000, 100_000, 500_000]))
+        rules.append({
+            "id": rid,
+            "name": f"Rule {rid}",
+            "applied_to": applied,
+            "stock_presence": rnd.choice(PRESENCE_OPTS),
+            "profit_loss": direction,
+            "pl_comp": pl_comp,
+            "pl_from": pl_from,
+            "pl_to": pl_from + float(rnd.choice([5, 10, 20])) if pl_comp == "Range" else 0.0,
+            "pl_basis": rnd.choice(["Per Portfolio", "Total Avg"]),
+            "inv_comp": inv_comp,
+            "inv_from": inv_from,
+            "inv_to": inv_from * 4 if inv_comp == "Range" else 0.0,
+            "inv_level": rnd.choice(["Per Portfolio", "Per Stock"]),
+            "message": f"Synthetic alert {rid}",
+        })
+    return rules
@@ -1,90 +1,68 @@
 # filepath: d:\Portfolio Dashboard Project\portfolio_dashboard\modules\alerts_tab.py
-import os
-import json
-from pathlib import Path
+import html
+import time
+import uuid
+import sqlite3
 import streamlit as st
 import pandas as pd
-from utils.alerts import generate_alerts
+from modules.ui import fragment, rerun_fragment
+from services.alert_events import get_alert_event_store
+from services.alert_results import get_alert_result_store
+from services.rule_store import RuleDeleted, get_rule_store
+from utils.alerts import active_alert_keys, generate_alerts, invalidate_rule
+from utils.presence import presence_index
+from utils.aggregates import build_aggregates
+from utils.snapshot import snapshot_key
+from utils.timing import span
 
 PL_COMP_OPTS = ["Greater Than", "Less Than", "Range"]
 MAX_INV_PCT = 0.10  # 10% cap used for headline investment info
-ALERT_RULES_PATH = Path("data/alert_rules.json")
+CARDS_PER_PAGE = 50  # instrument cards rendered per page
 
 
 # ------------- Persistence Helpers -------------
-def _ensure_rules_dir():
-    ALERT_RULES_PATH.parent.mkdir(parents=True, exist_ok=True)
+def _persist(fn, *args):
+    """Run a rule store write; surface failures instead of losing the edit silently."""
+    try:
+        return fn(*args)
+    except sqlite3.Error as e:
+        st.error(f"❌ Could not save alert rules: {e}")
+        return None
 
 
-def _load_rules_from_disk():
-    if ALERT_RULES_PATH.exists():
-        try:
-            with open(ALERT_RULES_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if isinstance(data, list):
-                # Basic sanity filter
-                clean = []
-                for r in data:
-                    if isinstance(r, dict):
-                        clean.append(r)
-                return clean
-        except Exception:
-            pass
-    return []
-
-
-def _save_rules_to_disk(rules: list):
-    _ensure_rules_dir()
-    try:
-        with open(ALERT_RULES_PATH, "w", encoding="utf-8") as f:
-            json.dump(rules, f, ensure_ascii=False, indent=2)
-    except Exception:
-        pass
+def _sync_rules_from_store(force: bool = False):
+    """Reload rules only when the store's change counter moved (another session or our own write)."""
+    ss = st.session_state
+    store = get_rule_store()
+    if not force and ss.get("alert_rules_version") == store.version():
+        return
+    version, rules = store.snapshot()
+    old = {r.get("id"): r for r in ss.get("alert_rules", [])}
+    for r in rules:
+        if old.get(r["id"]) != r:
+            invalidate_rule(r["id"])
+    for rid in old.keys() - {r["id"] for r in rules}:
+        invalidate_rule(rid)
+    ss.alert_rules = rules
+    ss.alert_rules_version = version
 
 
 # --------- State Initialization ---------
 def init_alert_rules_state():
     ss = st.session_state
-    first_time = "alert_rules" not in ss
     ss.setdefault("alert_rules", [])
-    ss.setdefault("next_rule_id", 1)
     ss.setdefault("show_alert_rules_dialog", False)
     ss.setdefault("editing_rule_id", None)     # existing rule id OR "NEW" for draft
     ss.setdefault("rule_draft", None)          # holds unsaved new rule
     ss.setdefault("show_saved_toast", False)
-
-    if first_time:
-        loaded = _load_rules_from_disk()
-        if loaded:
-            ss.alert_rules = loaded
-            # Derive next id
-            try:
-                ss.next_rule_id = max((r.get("id") or 0) for r in loaded) + 1
-            except ValueError:
-                ss.next_rule_id = 1
-        # Migrate legacy fields (uni_common/common_in) to stock_presence
-        changed = False
-        for r in ss.alert_rules:
-            if "stock_presence" not in r:
-                uc = r.get("uni_common")
-                if uc == "Unique":
-                    r["stock_presence"] = "Unique"
-                elif uc == "Common":
-                    r["stock_presence"] = "Not Unique"
-                else:
-                    r["stock_presence"] = "All"
-                changed = True
-            # Strip legacy keys if you want (optional)
-            r.pop("uni_common", None)
-            r.pop("common_in", None)
-        if changed:
-            _save_rules_to_disk(ss.alert_rules)
+    # First run imports data/alert_rules.json (with the legacy uni_common migration) into the store
+    _sync_rules_from_store()
 
 
 # --------- CRUD Helpers ---------
-def _new_rule_template(next_id: int):
+def _new_rule_template():
     return {
-        "id": next_id,
+        "id": None,                     # allocated by the rule store on save
         "name": "",
         "applied_to": [],
         "stock_presence": "All",
@@ -104,21 +82,17 @@ def _new_rule_template(next_id: int):
 def start_add_rule():
     ss = st.session_state
     if ss.rule_draft is None:
-        ss.rule_draft = _new_rule_template(ss.next_rule_id)
+        ss.rule_draft = _new_rule_template()
     ss.editing_rule_id = "NEW"
     ss.show_alert_rules_dialog = True
-    st.rerun()
+    rerun_fragment()
 
 
 def add_rule_finalize():
     ss = st.session_state
     if ss.rule_draft:
-        rid = ss.next_rule_id
-        draft = ss.rule_draft
-        draft["id"] = rid
-        ss.alert_rules.append(draft)
-        ss.next_rule_id += 1
-        _save_rules_to_disk(ss.alert_rules)
+        _persist(get_rule_store().create, ss.rule_draft)
+        _sync_rules_from_store(force=True)
     ss.rule_draft = None
     ss.editing_rule_id = None
     ss.show_alert_rules_dialog = True
@@ -128,8 +102,8 @@ def add_rule_finalize():
 
 def delete_rule(rid: int):
     ss = st.session_state
-    ss.alert_rules = [r for r in ss.alert_rules if r.get("id") != rid]
-    _save_rules_to_disk(ss.alert_rules)
+    _persist(get_rule_store().delete, rid)
+    _sync_rules_from_store(force=True)
     if ss.editing_rule_id == rid:
         ss.editing_rule_id = None
     ss.show_alert_rules_dialog = True
@@ -138,11 +112,10 @@ def delete_rule(rid: int):
 
 def reset_rules():
     ss = st.session_state
-    ss.alert_rules = []
-    ss.next_rule_id = 1
+    _persist(get_rule_store().delete_all)
+    _sync_rules_from_store(force=True)
     ss.editing_rule_id = None
     ss.rule_draft = None
-    _save_rules_to_disk(ss.alert_rules)
     st.rerun()
 
 
@@ -150,6 +123,7 @@ def save_existing_rule(rid: int):
     ss = st.session_state
     for r in ss.alert_rules:
         if r.get("id") == rid:
+            r = dict(r)
             r["name"] = ss.get(f"rule_name_{rid}", r.get("name"))
             r["applied_to"] = ss.get(f"rule_applied_{rid}", r.get("applied_to", []))
             r["stock_presence"] = ss.get(f"rule_presence_{rid}", r.get("stock_presence", "All"))
@@ -163,11 +137,15 @@ def save_existing_rule(rid: int):
             r["inv_to"] = ss.get(f"rule_inv_to_{rid}", r.get("inv_to", 0.0))
             r["inv_level"] = ss.get(f"rule_inv_level_{rid}", r.get("inv_level", "Per Stock"))
             r["message"] = ss.get(f"rule_message_{rid}", r.get("message", ""))
+            try:
+                _persist(get_rule_store().update, r)
+            except RuleDeleted:
+                ss.rule_deleted_notice = r.get("name") or f"Rule {rid}"
             break
-    _save_rules_to_disk(ss.alert_rules)
+    _sync_rules_from_store(force=True)
     ss.editing_rule_id = None
     ss.show_alert_rules_dialog = True
-    ss.show_saved_toast = True
+    ss.show_saved_toast = "rule_deleted_notice" not in ss
     st.rerun()
 
 
@@ -359,7 +337,7 @@ def _rules_list_body():
         with cols[1]:
             if st.button("✏️ Edit", key=f"edit_{r.get('id')}"):
                 st.session_state.editing_rule_id = r.get("id")
-                st.rerun()
+                rerun_fragment()
         with cols[2]:
             if st.button("🗑️", key=f"del_{r.get('id')}"):
                 delete_rule(r.get("id"))
@@ -397,7 +375,7 @@ def render_rules_dialog(valid_dfs):
         return
     portfolios = list(valid_dfs.keys())
     if st.session_state.editing_rule_id == "NEW" and st.session_state.rule_draft is None:
-        st.session_state.rule_draft = _new_rule_template(st.session_state.next_rule_id)
+        st.session_state.rule_draft = _new_rule_template()
 
     def _body():
         if st.session_state.editing_rule_id in (None,):
@@ -417,11 +395,183 @@ def render_rules_dialog(valid_dfs):
         _dlg()
     else:
         with st.expander("Set Alert Rules", expanded=True):
-            _body()
+            fragment(_body)()
+
+
+# --------- Alert Runner Results ---------
+def _runner_alerts(valid_dfs):
+    """
+    (alerts_df, run) from the headless alert runner when its latest run evaluated
+    exactly these holdings (same snapshot key) with the current rules; None means
+    evaluate here. Live ticks change the snapshot, so a run never stands in for
+    fresher prices.
+    """
+    store = get_alert_result_store()
+    try:
+        run = store.latest()
+        if (run is None or run.rules_version != st.session_state.get("alert_rules_version")
+                or set(run.portfolios) != set(valid_dfs)
+                or run.snapshot != snapshot_key(valid_dfs)):
+            return None
+        # The runner logs transitions from its own process: pick them up once per run
+        get_alert_event_store().reload(marker=run.run_id)
+        return store.alerts(run.run_id), run
+    except sqlite3.Error:
+        return None
+
+
+# --------- Alert Event Log ---------
+def _alert_viewer() -> str:
+    """
+    Who "new since last view" is tracked for: the ?viewer= query parameter, or a
+    generated id written into the URL so reloads and bookmarks keep the marker.
+    """
+    ss = st.session_state
+    if "alert_viewer" not in ss:
+        viewer = st.query_params.get("viewer") or uuid.uuid4().hex[:12]
+        st.query_params["viewer"] = viewer
+        ss.alert_viewer = viewer
+    return ss.alert_viewer
+
+
+def _record_alert_events(valid_dfs, rules, record=True):
+    """
+    Log fired/cleared transitions (unless the alert runner already did) and
+    return the (instrument, portfolio) pairs that fired since this viewer's
+    previous visit.
+    """
+    ss = st.session_state
+    events = get_alert_event_store()
+    if record:
+        # Holdings and rules unchanged since this session's last transition: only refresh last_seen
+        state_key = (snapshot_key(valid_dfs), ss.get("alert_rules_version"))
+        try:
+            if ss.get("alert_events_state") == state_key:
+                events.touch()
+            else:
+                events.transition(active_alert_keys(valid_dfs, rules), portfolios=valid_dfs.keys())
+                ss.alert_events_state = state_key
+        except sqlite3.Error as e:
+            st.warning(f"⚠️ Alert history not updated: {e}")
+    viewer = _alert_viewer()
+    if "alerts_seen_since" not in ss:
+        # New session: show what fired since this viewer's last visit, then move their marker
+        ss.alerts_seen_since = events.last_viewed(viewer)
+        events.mark_viewed(viewer)
+    new_keys = events.new_since(ss.alerts_seen_since)
+    if new_keys:
+        c1, c2 = st.columns([0.8, 0.2])
+        with c1:
+            st.caption(f"🆕 {len(new_keys)} alert(s) new since last view")
+        with c2:
+            if st.button("Mark all seen", key="alerts_mark_seen"):
+                ss.alerts_seen_since = time.time()
+                events.mark_viewed(viewer, ts=ss.alerts_seen_since)
+                rerun_fragment()
+    return {(inst, port) for _, inst, port in new_keys}
+
+
+# --------- Alert Card Rendering ---------
+def _headline_html(p, h):
+    if h.exceed:
+        return (
+            f"<span style='color:#c00;font-weight:600'>"
+            f"{p}: Curr ₹{h.cur_inv:,.0f}! / Max ₹{h.max_inv:,.0f} / Rem: EXCEEDED {int(MAX_INV_PCT*100)}% limit"
+            f"</span>"
+        )
+    return (
+        f"<span style='color:#444'>"
+        f"{p}: Curr ₹{h.cur_inv:,.0f} / Max ₹{h.max_inv:,.0f} / Rem: ₹{h.remaining:,.0f}"
+        f"</span>"
+    )
+
+
+def _detail_table_html(detail_rows):
+    """Same markup as DataFrame.to_html(index=False, justify="center") for the detail table."""
+    head = "".join(f"<th>{c}</th>" for c in ("Portfolio", "Avg Price", "Current Price", "% Change"))
+    body = "".join(
+        "<tr>" + "".join(f"<td>{html.escape(str(v))}</td>" for v in row) + "</tr>"
+        for row in detail_rows
+    )
+    return (
+        '<table border="1" class="dataframe"><thead><tr style="text-align: center;">'
+        f"{head}</tr></thead><tbody>{body}</tbody></table>"
+    )
+
+
+def _instrument_card_html(instr, instr_alert_rows, present_ports, absent_ports, agg, is_new=False):
+    rules_str = ", ".join(sorted(instr_alert_rows["rule"].unique()))
+
+    # Headline: investment headroom per holding portfolio
+    headline_parts_html = []
+    for p in present_ports:
+        h = agg.headroom(p, instr)
+        if h is not None:
+            headline_parts_html.append(_headline_html(p, h))
+    inv_headline_html = " | ".join(headline_parts_html) if headline_parts_html else "<span style='color:#666'>No investment data</span>"
+
+    summary_html = (
+        f"<summary style='cursor:pointer;'>"
+        f"{'🆕 ' if is_new else ''}<b>{instr}</b> | {inv_headline_html} | "
+        f"<span style='color:#555'>Rules: {rules_str}</span>"
+        f"</summary>"
+    )
+
+    # Detail rows
+    detail_rows = []
+    for p in present_ports:
+        d = agg.detail(p, instr)
+        if d is None:
+            continue
+        detail_rows.append((p, round(d.avg_price, 2), round(d.curr_price, 2), round(float(d.pnl_pct), 2)))
+
+    if detail_rows:
+        avg_pct = round(sum(r[3] for r in detail_rows) / len(detail_rows), 2)
+        rows = [(p, a, c, f"{pct:.2f}%") for p, a, c, pct in detail_rows]
+        rows.append(("Average", "", "", f"{avg_pct:.2f}%"))
+        table_html = _detail_table_html(rows)
+    else:
+        table_html = "<em style='color:#666'>No detailed data available.</em>"
+
+    # Alert messages
+    alerts_html = ""
+    if len(instr_alert_rows) > 0:
+        msgs = "".join(
+            f"<li><b>{rule}</b>: {message}</li>"
+            for rule, message in zip(instr_alert_rows["rule"], instr_alert_rows["message"])
+        )
+        alerts_html = f"<ul style='margin:4px 0 0 18px;padding:0'>{msgs}</ul>"
+
+    presence_html = (
+        f"<div style='font-size:0.7rem;color:#555;margin-top:4px;'>"
+        f"Present in: {', '.join(present_ports) if present_ports else 'None'} | "
+        f"Not in: {', '.join(absent_ports) if absent_ports else 'None'}"
+        f"</div>"
+    )
+
+    return (
+        "<details style='border:1px solid #ddd;border-radius:6px;padding:6px 10px;"
+        "background:#f9f9f9;margin-bottom:8px;'>"
+        f"{summary_html}"
+        f"{presence_html}"
+        f"<div style='margin-top:6px'>{table_html}</div>"
+        f"{alerts_html}"
+        "</details>"
+    )
 
 
 # --------- Public Tab Renderer ---------
+@fragment
 def render_alerts_tab(valid_dfs):
+    """
+    Fragment: view-mode and picker changes rerun only this tab, and the rule
+    dialog reruns on its own while editing. Saving a rule reruns the app.
+    """
+    with span("render.alerts"):
+        _render_alerts_tab(valid_dfs)
+
+
+def _render_alerts_tab(valid_dfs):
     init_alert_rules_state()
     ss = st.session_state
 
@@ -447,7 +597,14 @@ def render_alerts_tab(valid_dfs):
         if not valid_dfs:
             st.warning("No portfolios loaded to evaluate alerts.")
         else:
-            alerts_df = generate_alerts(valid_dfs, ss.alert_rules)
+            stored = _runner_alerts(valid_dfs)
+            if stored is not None:
+                alerts_df, run = stored
+                st.caption(f"⏱️ Evaluated by the alert runner {run.age():.0f}s ago")
+                new_pairs = _record_alert_events(valid_dfs, ss.alert_rules, record=False)
+            else:
+                alerts_df = generate_alerts(valid_dfs, ss.alert_rules)
+                new_pairs = _record_alert_events(valid_dfs, ss.alert_rules)
             if alerts_df.empty:
                 st.info("No alerts triggered for current rules.")
             else:
@@ -510,158 +667,32 @@ def render_alerts_tab(valid_dfs):
                         i for i in subset["instrument"].unique()
                         if i and i != "(Portfolio Total)"
                     ]
-                    instruments.sort()
-
-                    for instr in instruments:
-                        instr_alert_rows = subset[subset["instrument"] == instr]
-                        rule_names = sorted(instr_alert_rows["rule"].unique())
-                        rules_str = ", ".join(rule_names)
-
-                        # Presence determination
-                        present_ports = []
-                        for p, dfp in valid_dfs.items():
-                            if dfp is not None and not dfp.empty and "instrument" in dfp.columns:
-                                if instr in dfp["instrument"].values:
-                                    present_ports.append(p)
-                        all_ports_list = list(valid_dfs.keys())
-                        absent_ports = [p for p in all_ports_list if p not in present_ports]
-
-                        # Build styled headline parts (HTML)
-                        headline_parts_html = []
-                        for p in present_ports:
-                            dfp = valid_dfs.get(p)
-                            if dfp is None or dfp.empty:
-                                continue
-                            if "invested" not in dfp.columns and {"quantity", "avg_price"}.issubset(dfp.columns):
-                                df_loc = dfp.copy()
-                                df_loc["invested"] = df_loc["quantity"] * df_loc["avg_price"]
-                            else:
-                                df_loc = dfp
-                            if "invested" not in df_loc.columns:
-                                continue
-                            total_cap = float(df_loc["invested"].sum())
-                            max_inv = total_cap * MAX_INV_PCT if total_cap > 0 else 0.0
-                            cur_inv = float(df_loc.loc[df_loc["instrument"] == instr, "invested"].sum())
-                            exceed = (max_inv > 0) and (cur_inv > max_inv)
-                            remaining = max_inv - cur_inv
-
-                            if exceed:
-                                part_html = (
-                                    f"<span style='color:#c00;font-weight:600'>"
-                                    f"{p}: Curr ₹{cur_inv:,.0f}! / Max ₹{max_inv:,.0f} / Rem: EXCEEDED {int(MAX_INV_PCT*100)}% limit"
-                                    f"</span>"
-                                )
-                            else:
-                                part_html = (
-                                    f"<span style='color:#444'>"
-                                    f"{p}: Curr ₹{cur_inv:,.0f} / Max ₹{max_inv:,.0f} / Rem: ₹{remaining:,.0f}"
-                                    f"</span>"
-                                )
-                            headline_parts_html.append(part_html)
-
-                        inv_headline_html = " | ".join(headline_parts_html) if headline_parts_html else "<span style='color:#666'>No investment data</span>"
-
-                        summary_html = (
-                            f"<summary style='cursor:pointer;'>"
-                            f"<b>{instr}</b> | {inv_headline_html} | "
-                            f"<span style='color:#555'>Rules: {rules_str}</span>"
-                            f"</summary>"
+                    instruments = sorted(instruments)
+                    if len(instruments) > CARDS_PER_PAGE:
+                        # Only one page of cards is built and sent, however many accounts fire
+                        n_pages = -(-len(instruments) // CARDS_PER_PAGE)
+                        page = st.selectbox(
+                            f"Page ({len(instruments)} instruments)", range(1, n_pages + 1),
+                            key="alerts_card_page"
                         )
-
-                        # Build detail rows
-                        detail_rows = []
-                        for p in present_ports:
-                            dfp = valid_dfs.get(p)
-                            if dfp is None or dfp.empty:
-                                continue
-                            if "invested" not in dfp.columns and {"quantity", "avg_price"}.issubset(dfp.columns):
-                                df_tmp = dfp.copy()
-                                df_tmp["invested"] = df_tmp["quantity"] * df_tmp["avg_price"]
-                            else:
-                                df_tmp = dfp
-
-                            row_match = df_tmp[df_tmp["instrument"] == instr]
-                            if row_match.empty:
-                                continue
-                            row0 = row_match.iloc[0]
-                            avg_price = float(row0.get("avg_price", 0) or 0)
-
-                            curr_price = None
-                            for col in ("ltp", "current_price", "last_price", "close"):
-                                if col in row0 and pd.notna(row0[col]):
-                                    curr_price = float(row0[col])
-                                    break
-                            pnl_pct = row0.get("pnl_pct", None)
-                            if curr_price is None and pnl_pct is not None and avg_price:
-                                try:
-                                    curr_price = avg_price * (1 + float(pnl_pct) / 100.0)
-                                except Exception:
-                                    pass
-                            if curr_price is None:
-                                curr_price = avg_price
-                            if pnl_pct is None or pd.isna(pnl_pct):
-                                if avg_price:
-                                    pnl_pct = ((curr_price - avg_price) / avg_price) * 100.0
-                                else:
-                                    pnl_pct = 0.0
-
-                            detail_rows.append({
-                                "Portfolio": p,
-                                "Avg Price": round(avg_price, 2),
-                                "Current Price": round(curr_price, 2),
-                                "% Change": round(float(pnl_pct), 2)
-                            })
-
-                        if detail_rows:
-                            df_detail = pd.DataFrame(detail_rows)
-                            avg_pct = round(df_detail["% Change"].mean(), 2)
-                            df_detail = pd.concat([
-                                df_detail,
-                                pd.DataFrame([{
-                                    "Portfolio": "Average",
-                                    "Avg Price": "",
-                                    "Current Price": "",
-                                    "% Change": avg_pct
-                                }])
-                            ], ignore_index=True)
-                            df_display = df_detail.copy()
-                            df_display["% Change"] = df_display["% Change"].apply(
-                                lambda v: v if v == "" else f"{v:.2f}%"
-                            )
-                            table_html = df_display.to_html(index=False, justify="center")
-                        else:
-                            table_html = "<em style='color:#666'>No detailed data available.</em>"
-
-                        # Alert messages
-                        alerts_html = ""
-                        if len(instr_alert_rows) > 0:
-                            msgs = "".join(
-                                f"<li><b>{arow['rule']}</b>: {arow['message']}</li>"
-                                for _, arow in instr_alert_rows.iterrows()
+                        instruments = instruments[(page - 1) * CARDS_PER_PAGE:page * CARDS_PER_PAGE]
+                    with span("alerts.cards"):
+                        page_rows = subset[subset["instrument"].isin(instruments)]
+                        by_instr = {instr: rows for instr, rows in page_rows.groupby("instrument", sort=False)}
+                        agg = build_aggregates(valid_dfs, MAX_INV_PCT)
+                        presence = presence_index(valid_dfs)
+
+                        for instr in instruments:
+                            is_new = any((instr, p) in new_pairs for p in by_instr[instr]["portfolio"])
+                            block_html = _instrument_card_html(
+                                instr, by_instr[instr], presence.holders(instr), presence.absent(instr), agg, is_new
                             )
-                            alerts_html = f"<ul style='margin:4px 0 0 18px;padding:0'>{msgs}</ul>"
-
-                        presence_html = (
-                            f"<div style='font-size:0.7rem;color:#555;margin-top:4px;'>"
-                            f"Present in: {', '.join(present_ports) if present_ports else 'None'} | "
-                            f"Not in: {', '.join(absent_ports) if absent_ports else 'None'}"
-                            f"</div>"
-                        )
-
-                        block_html = (
-                            "<details style='border:1px solid #ddd;border-radius:6px;padding:6px 10px;"
-                            "background:#f9f9f9;margin-bottom:8px;'>"
-                            f"{summary_html}"
-                            f"{presence_html}"
-                            f"<div style='margin-top:6px'>{table_html}</div>"
-                            f"{alerts_html}"
-                            "</details>"
-                        )
-
-                        st.markdown(block_html, unsafe_allow_html=True)
+                            st.markdown(block_html, unsafe_allow_html=True)
 
     if ss.get("show_saved_toast"):
         st.toast("Rule saved")
         ss.show_saved_toast = False
+    if "rule_deleted_notice" in ss:
+        st.warning(f"⚠️ {ss.pop('rule_deleted_notice')} was deleted in another session; the edit was not saved.")
 
     render_rules_dialog(valid_dfs)
@@ -13,40 +13,104 @@ class AngelOneCreds:
     mpin: str
     totp_secret: str
 
+    @property
+    def configured(self) -> bool:
+        return all((self.api_key, self.client_id, self.mpin, self.totp_secret))
+
 @dataclass
 class ZerodhaCreds:
     api_key: str
     api_secret: str
     access_token: str  # may be cached / refreshed later
 
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key and self.access_token)
+
 CACHE_FILE = "zerodha_token.json"
 
-def _load_cached_zerodha_token(env_token: str) -> str:
+def _load_cached_zerodha_token(env_token: str, cache_file: str = CACHE_FILE) -> str:
     if env_token:
         return env_token.strip()
-    if os.path.exists(CACHE_FILE):
+    if os.path.exists(cache_file):
         try:
-            with open(CACHE_FILE, "r", encoding="utf-8") as f:
+            with open(cache_file, "r", encoding="utf-8") as f:
                 data = json.load(f)
             return data.get("access_token", "")
         except Exception:
             return ""
     return ""
 
-def get_angelone_credentials() -> AngelOneCreds:
+def get_angelone_credentials(prefix: str = "") -> AngelOneCreds:
     return AngelOneCreds(
-        api_key=clean_env_value("API_KEY"),
-        client_id=clean_env_value("CLIENT_ID"),
-        mpin=clean_env_value("MPIN"),
-        totp_secret=clean_env_value("TOTP_SECRET"),
+        api_key=clean_env_value(f"{prefix}API_KEY"),
+        client_id=clean_env_value(f"{prefix}CLIENT_ID"),
+        mpin=clean_env_value(f"{prefix}MPIN"),
+        totp_secret=clean_env_value(f"{prefix}TOTP_SECRET"),
     )
 
-def get_zerodha_credentials() -> ZerodhaCreds:
-    raw_token = clean_env_value("ZERODHA_ACCESS_TOKEN")
+def get_zerodha_credentials(prefix: str = "", token_file: str = CACHE_FILE) -> ZerodhaCreds:
+    # Legacy single-account vars are ZERODHA_*; registry accounts use <prefix>ZERODHA_*
+    raw_token = clean_env_value(f"{prefix}ZERODHA_ACCESS_TOKEN")
     return ZerodhaCreds(
-        api_key=clean_env_value("ZERODHA_API_KEY"),
-        api_secret=clean_env_value("ZERODHA_API_SECRET"),
-        access_token=_load_cached_zerodha_token(raw_token),
+        api_key=clean_env_value(f"{prefix}ZERODHA_API_KEY"),
+        api_secret=clean_env_value(f"{prefix}ZERODHA_API_SECRET"),
+        access_token=_load_cached_zerodha_token(raw_token, token_file),
     )
 
+# ---------- Account registry ----------
+# ACCOUNTS_FILE (default config/accounts.json) lists one entry per account:
+#   {"name": "Mom AngelOne", "broker": "AngelOne", "env_prefix": "MOM_"}
+#   {"name": "Client 12", "broker": "Zerodha", "env_prefix": "C12_", "token_file": "data/tokens/c12.json"}
+# Secrets never live in the file: env_prefix points at <prefix>API_KEY, <prefix>ZERODHA_API_KEY, ...
+# Without the file the legacy single AngelOne + Zerodha env vars are used.
+ACCOUNTS_FILE = "config/accounts.json"
+BROKERS = ("AngelOne", "Zerodha")
+
+@dataclass
+class Account:
+    name: str
+    broker: str                 # AngelOne | Zerodha
+    creds: object               # AngelOneCreds | ZerodhaCreds
+    timeout: float = 60.0       # seconds
+
+    @property
+    def account_id(self) -> str:
+        return self.creds.client_id if self.broker == "AngelOne" else self.creds.api_key
+
+    @property
+    def configured(self) -> bool:
+        return self.creds.configured
+
+def _account_from_entry(entry: dict) -> Account:
+    broker = next((b for b in BROKERS if b.lower() == str(entry.get("broker", "")).lower()), None)
+    if broker is None:
+        raise ValueError(f"unknown broker {entry.get('broker')!r}")
+    prefix = entry.get("env_prefix", "")
+    if broker == "AngelOne":
+        creds = get_angelone_credentials(prefix)
+    else:
+        creds = get_zerodha_credentials(prefix, entry.get("token_file", CACHE_FILE))
+    name = entry.get("name") or f"{broker} {prefix.rstrip('_')}".strip()
+    return Account(name, broker, creds, float(entry.get("timeout", 60.0 if broker == "AngelOne" else 30.0)))
+
+def load_accounts(path: str = "") -> list:
+    """Accounts from the registry file, or the two legacy env-configured accounts."""
+    path = path or clean_env_value("ACCOUNTS_FILE") or ACCOUNTS_FILE
+    if not os.path.exists(path):
+        return [Account("AngelOne", "AngelOne", get_angelone_credentials(), 60.0),
+                Account("Zerodha", "Zerodha", get_zerodha_credentials(), 30.0)]
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    accounts, seen = [], set()
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict) or entry.get("enabled") is False:
+            continue
+        acc = _account_from_entry(entry)
+        if acc.name in seen:
+            raise ValueError(f"duplicate account name {acc.name!r} in {path}")
+        seen.add(acc.name)
+        accounts.append(acc)
+    return accounts
+
 # (Optional) future: add refresh_zerodha_token() if you implement re-auth flows.
@@ -1,34 +1,40 @@
 
+import html
 import streamlit as st
 import pandas as pd
+from modules.ui import fragment
+from utils.comparison import build_compare_table
+from utils.timing import span
 
-def render_compare_tab(valid_dfs, common_list, unique_per):
+# Styler renders every cell in Python; above this the table is shown unstyled
+# (number formatting only) so the tab stays responsive with dozens of portfolios.
+STYLE_MAX_CELLS = 20_000
+
+def _chip_html(stat):
+    unknown = pd.isna(stat.pct)
+    color = "#888" if unknown else "green" if stat.pct > 0 else "red"
+    pct = "NA" if unknown else f"{stat.pct:.2f}%"
+    return (
+        f"<span style='margin:3px;padding:4px 8px;border-radius:6px;"
+        f"background:#f1f3f6;color:{color};font-weight:600;font-size:12px'>"
+        f"{html.escape(str(stat.symbol))} ({pct})</span>"
+    )
+
+@fragment
+def render_compare_tab(valid_dfs, comparison):
+    """Fragment: filter changes rerun only this tab."""
+    with span("render.compare"):
+        _render_compare_tab(valid_dfs, comparison)
+
+def _render_compare_tab(valid_dfs, comparison):
     if not valid_dfs:
         st.warning("No valid portfolio data to compare.")
         return
 
-    all_symbols = sorted(set().union(*[df["instrument"] for df in valid_dfs.values()]))
-    rows = []
-    for sym in all_symbols:
-        present = []
-        pct_map = {}
-        for pname, dfp in valid_dfs.items():
-            match = dfp[dfp["instrument"] == sym]
-            if not match.empty:
-                present.append(pname)
-                pct_map[pname] = float(match.iloc[0].get("pnl_pct", 0))
-        avg_pct_all = round(sum(pct_map.values()) / len(pct_map), 2) if pct_map else 0
-        rows.append({
-            "Stock": sym,
-            "Portfolios": present,
-            "Avg % Up/Down": avg_pct_all,
-            **{f"{p} % Up/Down": pct_map.get(p, 0) for p in valid_dfs.keys()}
-        })
-    table_df = pd.DataFrame(rows)
-
+    with span("compare.table_build"):
+        compare = build_compare_table(valid_dfs)
+    table_df = compare.table
     pct_cols_all = [c for c in table_df.columns if c.endswith("% Up/Down")]
-    for c in pct_cols_all:
-        table_df[c] = pd.to_numeric(table_df[c], errors="coerce").round(2)
 
     st.subheader("📌 Stocks Across Portfolios")
 
@@ -48,16 +54,15 @@ def render_compare_tab(valid_dfs, common_list, unique_per):
         st.button("Clear All", on_click=clear_compare_filters, use_container_width=True)
 
     selected_ports = st.session_state.compare_portfolio_filter
-    disp = table_df.copy()
 
     if selected_ports:
-        disp = disp[disp["Portfolios"].apply(lambda lst: all(p in lst for p in selected_ports))].copy()
+        mask = compare.presence[selected_ports].all(axis=1).to_numpy()
         sel_pct_cols = [f"{p} % Up/Down" for p in selected_ports]
-        if sel_pct_cols:
-            disp["Avg % Up/Down"] = disp[sel_pct_cols].mean(axis=1).round(2)
         keep_cols = ["Stock", "Portfolios", "Avg % Up/Down"] + sel_pct_cols
-        disp = disp[keep_cols]
+        disp = table_df.loc[mask, keep_cols].copy()
+        disp["Avg % Up/Down"] = disp[sel_pct_cols].mean(axis=1).round(2)
     else:
+        disp = table_df.copy()
         disp[pct_cols_all] = disp[pct_cols_all].replace(0, pd.NA)
 
     disp["Portfolios"] = disp["Portfolios"].apply(lambda x: ", ".join(x))
@@ -74,16 +79,24 @@ def render_compare_tab(valid_dfs, common_list, unique_per):
         return "color:#555;"
 
     pct_cols_for_style = [c for c in disp.columns if c.endswith("% Up/Down")]
-    styled = (disp.style
-              .applymap(color_pct, subset=pct_cols_for_style)
-              .format(subset=pct_cols_for_style,
-                      formatter=lambda v: "NA" if pd.isna(v) else f"{float(v):.2f}"))
-    st.dataframe(styled, use_container_width=True)
+    if disp.size <= STYLE_MAX_CELLS:
+        styled = (disp.style
+                  .applymap(color_pct, subset=pct_cols_for_style)
+                  .format(subset=pct_cols_for_style,
+                          formatter=lambda v: "NA" if pd.isna(v) else f"{float(v):.2f}"))
+        st.dataframe(styled, use_container_width=True)
+    else:
+        st.dataframe(disp, use_container_width=True,
+                     column_config={c: st.column_config.NumberColumn(c, format="%.2f")
+                                    for c in pct_cols_for_style})
+        st.caption(f"Colour coding is off for tables over {STYLE_MAX_CELLS:,} cells; "
+                   "filter by portfolio to bring it back.")
 
     with st.expander("Common & Unique Summary", expanded=False):
+        common_list = comparison.common_symbols
         st.markdown(f"**Common Symbols ({len(common_list)})**: "
                     f"{', '.join(common_list) if common_list else 'None'}")
         for pname in valid_dfs.keys():
             st.markdown(f"**Unique to {pname}**:")
-            uniques = unique_per.get(pname, [])
-            st.markdown(" ".join(uniques) or "_None_")
+            uniques = [_chip_html(stat) for stat in comparison.unique.get(pname, [])]
+            st.markdown(" ".join(uniques) or "_None_", unsafe_allow_html=True)
@@ -1,19 +1,58 @@
 
+import time
 import streamlit as st
+from modules.ui import fragment
 from utils.highlights import portfolio_highlights
+from utils.snapshot import SnapshotCache, frame_fingerprint
+from utils.timing import span
 
-def render_overview_tab(dfs):
+HISTORY_RANGES = {"1D": 86400, "1W": 7 * 86400, "1M": 30 * 86400, "1Y": 365 * 86400, "All": None}
+
+# Per-frame results shared by every session; keyed by content hash so reruns skip the work
+_HIGHLIGHTS = SnapshotCache(maxsize=16)
+_CSV_BYTES = SnapshotCache(maxsize=16)
+
+def _cached_highlights(df):
+    return _HIGHLIGHTS.get_or_compute(frame_fingerprint(df), lambda: portfolio_highlights(df))
+
+def _cached_csv(df) -> bytes:
+    return _CSV_BYTES.get_or_compute(frame_fingerprint(df), lambda: df.to_csv(index=False).encode("utf-8"))
+
+def render_value_history(history, portfolios):
+    """Portfolio value over time from the snapshot history (one line per portfolio plus the total)."""
+    st.markdown("**📈 Portfolio value over time**")
+    span_key = st.radio("Range", list(HISTORY_RANGES), index=2, horizontal=True, key="history_range")
+    window = HISTORY_RANGES[span_key]
+    series = history.value_series(brokers=list(portfolios), start=time.time() - window if window else None)
+    if series.empty:
+        st.caption("No history yet: snapshots are recorded on every holdings fetch.")
+        return
+    wide = series.pivot_table(index="ts", columns="broker", values="value", aggfunc="sum", observed=True)
+    # Brokers are fetched at different moments; carry each one's last value forward for the total
+    wide = wide.ffill()
+    wide["Total"] = wide.sum(axis=1)
+    st.line_chart(wide.round(2))
+
+@fragment
+def render_overview_tab(dfs, history=None):
+    """Fragment: range and portfolio pickers rerun only this tab."""
+    with span("render.overview"):
+        _render_overview_tab(dfs, history)
+
+def _render_overview_tab(dfs, history=None):
     st.subheader("⭐ Overview: Highlights & Holdings")
     if not dfs:
         st.warning("No data.")
         return
+    if history is not None:
+        render_value_history(history, dfs.keys())
     c1, c2 = st.columns(2)
 
     with c1:
         sel_h = st.selectbox("Highlights portfolio", list(dfs.keys()), key="highlights_select")
         dfh = dfs[sel_h]
         if not dfh.empty:
-            highlights = portfolio_highlights(dfh)
+            highlights = _cached_highlights(dfh)
             st.write("Top 3 Max Capital:")
             for t in highlights["max_capital"]:
                 st.write("🔹", t)
@@ -33,7 +72,7 @@ def render_overview_tab(dfs):
             st.dataframe(dff, use_container_width=True)
             st.download_button(
                 f"Download {sel_hold} CSV",
-                data=dff.to_csv(index=False).encode("utf-8"),
+                data=_cached_csv(dff),
                 file_name=f"{sel_hold}_holdings.csv",
                 mime="text/csv"
             )
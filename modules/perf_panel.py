@@ -0,0 +1,22 @@
+import streamlit as st
+import pandas as pd
+from utils.timing import percentiles
+
+
+def render_perf_panel(run):
+    """Collapsible sidebar breakdown of the latest rerun plus rolling p50/p95."""
+    with st.sidebar.expander("📈 Performance", expanded=False):
+        if run is not None and run.spans:
+            st.markdown("**This rerun**")
+            latest = (pd.DataFrame({"stage": list(run.spans), "ms": list(run.spans.values())})
+                      .sort_values("ms", ascending=False)
+                      .round(1))
+            st.dataframe(latest, hide_index=True, use_container_width=True)
+        stats = percentiles()
+        if stats:
+            st.markdown("**Rolling (last 200)**")
+            roll = pd.DataFrame([
+                {"stage": k, "p50 ms": v["p50"], "p95 ms": v["p95"], "n": v["count"]}
+                for k, v in stats.items()
+            ]).round(1)
+            st.dataframe(roll, hide_index=True, use_container_width=True)
@@ -0,0 +1,13 @@
+import streamlit as st
+from streamlit.errors import StreamlitAPIException
+
+# st.fragment (1.37+) / st.experimental_fragment (1.33-1.36); older versions rerun the whole app
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda fn: fn)
+
+
+def rerun_fragment():
+    """Rerun only the enclosing fragment; a full rerun outside one or on older Streamlit."""
+    try:
+        st.rerun(scope="fragment")
+    except (TypeError, StreamlitAPIException):
+        st.rerun()
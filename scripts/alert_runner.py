@@ -0,0 +1,77 @@
+"""
+Evaluate the saved alert rules on a schedule, without the dashboard.
+
+    python -m scripts.alert_runner                 # every ALERT_RUNNER_INTERVAL seconds (default 300)
+    python -m scripts.alert_runner --once          # one run, e.g. from cron
+
+Accounts and credentials come from modules/auth (ACCOUNTS_FILE or the legacy
+env vars), rules from the rule store (ALERT_RULES_DB). Results go to
+ALERT_RESULTS_DB, which the Alerts tab reads instead of recomputing, and
+transitions to the alert event log (ALERT_EVENTS_DB).
+"""
+import argparse
+import logging
+import signal
+import sys
+import threading
+
+from modules.auth import load_accounts
+from services.alert_events import get_alert_event_store
+from services.alert_results import get_alert_result_store
+from services.alert_runner import DEFAULT_INTERVAL, AlertRunner
+from services.holdings_cache import get_holdings_cache
+from services.rule_store import get_rule_store
+from services.smartapi_service import BROKER_FETCHERS
+from services.statement_import import get_statement_importer, statements_dir
+from utils.helpers import clean_env_value
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(clean_env_value(name) or default)
+    except ValueError:
+        return default
+
+
+def _statements(reserved):
+    root = statements_dir()
+    if root is None:
+        return {}
+    result = get_statement_importer().import_dir(root, reserved=reserved)
+    for file_name, reason in result.errors.items():
+        logging.warning("Statement %s skipped: %s", file_name, reason)
+    return result.portfolios
+
+
+def main():
+    p = argparse.ArgumentParser(description="Evaluate saved alert rules on a schedule.")
+    p.add_argument("--interval", type=float, default=_env_float("ALERT_RUNNER_INTERVAL", DEFAULT_INTERVAL),
+                   help="Seconds between runs (default ALERT_RUNNER_INTERVAL or 300)")
+    p.add_argument("--once", action="store_true", help="Run once and exit")
+    p.add_argument("--accounts", default="", help="Account registry file (default ACCOUNTS_FILE)")
+    args = p.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    try:
+        accounts = load_accounts(args.accounts)
+    except (OSError, ValueError) as e:
+        print("ERROR: Could not load the account registry:", e)
+        return 1
+    runner = AlertRunner(
+        accounts, BROKER_FETCHERS, get_rule_store(), get_alert_event_store(), get_alert_result_store(),
+        holdings=get_holdings_cache(), statements=_statements,
+        max_workers=int(_env_float("FETCH_CONCURRENCY", 8)),
+    )
+    skipped = [acc.name for acc in accounts if not acc.configured]
+    if skipped:
+        logging.warning("Skipped (no credentials): %s", ", ".join(skipped))
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    runner.run_forever(args.interval, stop, max_runs=1 if args.once else 0)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
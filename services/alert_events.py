@@ -0,0 +1,205 @@
+"""
+Persistent alert event log.
+
+One row per (rule id, instrument, portfolio) with the current episode's
+first-fired time, last-seen time and cleared time. transition() takes the set
+of currently active alerts (apply() takes fired/cleared deltas from
+AlertEvaluator) and writes only the rows whose state changed; last_seen of
+open events is bumped with a single UPDATE at most every SEEN_INTERVAL seconds.
+
+The dashboard and the alert runner write to the same database, so both diff
+against the open rows read from it, never against a possibly stale copy in
+memory. The in-memory copy only serves reads (open_keys, new_since).
+"""
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from utils.helpers import clean_env_value
+
+DEFAULT_DB_PATH = Path("data/alert_events.db")
+SEEN_INTERVAL = 60.0                          # seconds between last_seen refreshes
+
+EventKey = Tuple[str, str, str]               # (rule id, instrument, portfolio)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alert_events (
+    rule_id TEXT NOT NULL,
+    instrument TEXT NOT NULL,
+    portfolio TEXT NOT NULL,
+    first_fired REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    cleared_at REAL,
+    fire_count INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (rule_id, instrument, portfolio)
+);
+CREATE INDEX IF NOT EXISTS idx_alert_events_open ON alert_events (cleared_at, first_fired);
+CREATE TABLE IF NOT EXISTS alert_views (
+    viewer TEXT PRIMARY KEY,
+    last_view REAL NOT NULL
+);
+"""
+
+
+@dataclass(frozen=True)
+class AlertEvent:
+    rule_id: str
+    instrument: str
+    portfolio: str
+    first_fired: float
+    last_seen: float
+    cleared_at: Optional[float]
+    fire_count: int
+
+
+def event_key(rule_id, instrument, portfolio) -> EventKey:
+    return str(rule_id), str(instrument), str(portfolio)
+
+
+class AlertEventStore:
+    def __init__(self, db_path: Path = DEFAULT_DB_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        # Open events as last read or written; reads are served from here
+        self._open: Dict[EventKey, float] = self._read_open()
+        self._last_touch = 0.0
+        self._reload_marker = None
+
+    def _read_open(self) -> Dict[EventKey, float]:
+        with self._conn() as conn:
+            return {
+                (r, i, p): ff for r, i, p, ff in
+                conn.execute("SELECT rule_id, instrument, portfolio, first_fired FROM alert_events "
+                             "WHERE cleared_at IS NULL")
+            }
+
+    def reload(self, marker=None):
+        """
+        Re-read open events written by another process (the alert runner).
+        With a marker (e.g. the runner's run id) the read happens once per marker.
+        """
+        with self._lock:
+            if marker is not None and marker == self._reload_marker:
+                return
+            self._open = self._read_open()
+            self._reload_marker = marker
+
+    @contextmanager
+    def _conn(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:                       # commit on success, rollback on error
+                yield conn
+        finally:
+            conn.close()
+
+    # ---------- transitions ----------
+    def transition(self, active: Iterable[Tuple], portfolios: Optional[Iterable[str]] = None,
+                   ts: Optional[float] = None) -> Tuple[Set[EventKey], Set[EventKey]]:
+        """
+        Bring the log in line with the currently active alerts.
+        Only open events of `portfolios` (default: all) can clear, so a broker
+        that failed to load does not clear its alerts. Returns (fired, cleared);
+        only those rows are written.
+        """
+        active_keys = {event_key(*k) for k in active}
+        scope = None if portfolios is None else {str(p) for p in portfolios}
+        with self._lock:
+            self._open = self._read_open()   # another process may have fired or cleared since
+            fired = active_keys - self._open.keys()
+            cleared = {k for k in self._open.keys() - active_keys if scope is None or k[2] in scope}
+            self._write(fired, cleared, ts or time.time())
+        return fired, cleared
+
+    def apply(self, fired: Iterable[Tuple], cleared: Iterable[Tuple], ts: Optional[float] = None):
+        """Record explicit deltas (e.g. AlertEvaluator output) without a full active set."""
+        with self._lock:
+            self._open = self._read_open()
+            f = {event_key(*k) for k in fired} - self._open.keys()
+            c = {event_key(*k) for k in cleared} & self._open.keys()
+            self._write(f, c, ts or time.time())
+
+    def touch(self, ts: Optional[float] = None):
+        """Refresh last_seen of open events (throttled) when nothing transitioned."""
+        with self._lock:
+            self._write(set(), set(), ts or time.time())
+
+    def _write(self, fired: Set[EventKey], cleared: Set[EventKey], ts: float):
+        touch = bool(self._open) and ts - self._last_touch >= SEEN_INTERVAL
+        if not fired and not cleared and not touch:
+            return
+        with self._conn() as conn:
+            if touch:
+                conn.execute("UPDATE alert_events SET last_seen = ? WHERE cleared_at IS NULL", (ts,))
+                self._last_touch = ts
+            if cleared:
+                conn.executemany(
+                    "UPDATE alert_events SET cleared_at = ?, last_seen = ? "
+                    "WHERE rule_id = ? AND instrument = ? AND portfolio = ? AND cleared_at IS NULL",
+                    [(ts, ts, *k) for k in cleared])
+            if fired:
+                # New key, or a new episode of a cleared one
+                conn.executemany(
+                    "INSERT INTO alert_events (rule_id, instrument, portfolio, first_fired, last_seen) "
+                    "VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (rule_id, instrument, portfolio) DO UPDATE SET "
+                    "first_fired = excluded.first_fired, last_seen = excluded.last_seen, "
+                    "cleared_at = NULL, fire_count = fire_count + 1",
+                    [(*k, ts, ts) for k in fired])
+        for k in cleared:
+            self._open.pop(k, None)
+        for k in fired:
+            self._open[k] = ts
+
+    # ---------- reads ----------
+    def open_keys(self) -> Dict[EventKey, float]:
+        """Open events -> first-fired time (served from memory)."""
+        with self._lock:
+            return dict(self._open)
+
+    def new_since(self, since: float) -> Set[EventKey]:
+        """Open events whose current episode started after `since`."""
+        with self._lock:
+            return {k for k, ff in self._open.items() if ff > since}
+
+    def events(self, include_cleared: bool = True, limit: int = 500) -> List[AlertEvent]:
+        sql = ("SELECT rule_id, instrument, portfolio, first_fired, last_seen, cleared_at, fire_count "
+               "FROM alert_events")
+        if not include_cleared:
+            sql += " WHERE cleared_at IS NULL"
+        sql += " ORDER BY COALESCE(cleared_at, first_fired) DESC LIMIT ?"
+        with self._conn() as conn:
+            return [AlertEvent(*row) for row in conn.execute(sql, (limit,))]
+
+    # ---------- views ----------
+    def last_viewed(self, viewer: str) -> float:
+        with self._conn() as conn:
+            row = conn.execute("SELECT last_view FROM alert_views WHERE viewer = ?", (viewer,)).fetchone()
+        return float(row[0]) if row else 0.0
+
+    def mark_viewed(self, viewer: str, ts: Optional[float] = None):
+        with self._conn() as conn:
+            conn.execute("INSERT INTO alert_views (viewer, last_view) VALUES (?, ?) "
+                         "ON CONFLICT (viewer) DO UPDATE SET last_view = excluded.last_view",
+                         (viewer, ts or time.time()))
+
+
+_store: Optional[AlertEventStore] = None
+_store_lock = threading.Lock()
+
+
+def get_alert_event_store() -> AlertEventStore:
+    """Process-wide store at ALERT_EVENTS_DB (default data/alert_events.db)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AlertEventStore(Path(clean_env_value("ALERT_EVENTS_DB") or DEFAULT_DB_PATH))
+        return _store
@@ -0,0 +1,133 @@
+"""
+Stored alert evaluations written by the headless alert runner.
+
+Each run records when it evaluated, the rule store version and holdings
+snapshot it used, which portfolios loaded (and why others did not), plus the
+generate_alerts rows. The dashboard reads the latest run instead of
+evaluating the rules itself in every session. Only the last KEEP_RUNS runs
+are kept.
+"""
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+from utils.alerts import ALERT_COLUMNS
+from utils.helpers import clean_env_value
+
+DEFAULT_DB_PATH = Path("data/alert_results.db")
+KEEP_RUNS = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alert_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    finished_at REAL NOT NULL,
+    rules_version INTEGER NOT NULL,
+    snapshot TEXT NOT NULL,
+    portfolios TEXT NOT NULL,
+    errors TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS alert_results (
+    run_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    instrument TEXT NOT NULL,
+    portfolio TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (run_id, seq)
+);
+"""
+
+
+@dataclass(frozen=True)
+class AlertRun:
+    run_id: int
+    started_at: float
+    finished_at: float
+    rules_version: int
+    snapshot: str                               # snapshot_key of the evaluated holdings
+    portfolios: Tuple[str, ...]                 # portfolios that loaded and were evaluated
+    errors: Dict[str, str] = field(default_factory=dict)   # portfolio -> fetch failure
+
+    def age(self) -> float:
+        return time.time() - self.finished_at
+
+
+class AlertResultStore:
+    def __init__(self, db_path: Path = DEFAULT_DB_PATH, keep_runs: int = KEEP_RUNS):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.keep_runs = keep_runs
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _conn(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:                       # commit on success, rollback on error
+                yield conn
+        finally:
+            conn.close()
+
+    # ---------- writes ----------
+    def save(self, alerts: pd.DataFrame, rules_version: int, snapshot: str, portfolios: Iterable[str],
+             started_at: float, errors: Optional[Dict[str, str]] = None,
+             finished_at: Optional[float] = None) -> int:
+        """Store one evaluation (run row + its alert rows) atomically; returns the run id."""
+        rows = alerts[ALERT_COLUMNS].astype(str).itertuples(index=False, name=None) if not alerts.empty else ()
+        with self._conn() as conn:
+            cur = conn.execute(
+                "INSERT INTO alert_runs (started_at, finished_at, rules_version, snapshot, portfolios, errors) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (started_at, finished_at or time.time(), int(rules_version), snapshot,
+                 json.dumps(list(portfolios), ensure_ascii=False), json.dumps(errors or {}, ensure_ascii=False)))
+            run_id = int(cur.lastrowid)
+            conn.executemany(
+                "INSERT INTO alert_results (run_id, seq, instrument, portfolio, rule, message) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, seq, *row) for seq, row in enumerate(rows)])
+            stale = run_id - self.keep_runs
+            conn.execute("DELETE FROM alert_results WHERE run_id <= ?", (stale,))
+            conn.execute("DELETE FROM alert_runs WHERE id <= ?", (stale,))
+        return run_id
+
+    # ---------- reads ----------
+    def latest(self) -> Optional[AlertRun]:
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT id, started_at, finished_at, rules_version, snapshot, portfolios, errors "
+                "FROM alert_runs ORDER BY id DESC LIMIT 1").fetchone()
+        if row is None:
+            return None
+        rid, started, finished, version, snap, ports, errors = row
+        return AlertRun(rid, started, finished, version, snap, tuple(json.loads(ports)), json.loads(errors))
+
+    def alerts(self, run_id: int) -> pd.DataFrame:
+        """The run's alert rows, in the order generate_alerts returned them."""
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT instrument, portfolio, rule, message FROM alert_results "
+                "WHERE run_id = ? ORDER BY seq", (int(run_id),)).fetchall()
+        return pd.DataFrame(rows, columns=ALERT_COLUMNS) if rows else pd.DataFrame(columns=ALERT_COLUMNS)
+
+
+_store: Optional[AlertResultStore] = None
+_store_lock = threading.Lock()
+
+
+def get_alert_result_store() -> AlertResultStore:
+    """Process-wide store at ALERT_RESULTS_DB (default data/alert_results.db)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AlertResultStore(Path(clean_env_value("ALERT_RESULTS_DB") or DEFAULT_DB_PATH))
+        return _store
@@ -0,0 +1,123 @@
+"""
+Headless alert evaluation on a schedule (see scripts/alert_runner.py).
+
+One warm process fetches every configured account, normalizes the holdings,
+evaluates the saved rules once and writes the results to the alert result
+store; fired/cleared transitions go to the alert event log. The dashboard
+reads the latest run instead of evaluating in each browser session.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from services.alert_events import AlertEventStore
+from services.alert_results import AlertResultStore
+from services.fetch_orchestrator import BrokerJob, fetch_all
+from services.holdings_cache import HoldingsCache
+from services.rule_store import RuleStore
+from utils.alerts import active_alert_keys, generate_alerts, invalidate_rule
+from utils.schema import normalize_and_enrich
+from utils.snapshot import snapshot_key
+
+DEFAULT_INTERVAL = 300.0                     # seconds between runs
+
+Fetchers = Dict[str, Tuple[Callable[..., pd.DataFrame], Callable]]   # broker -> (fetch fn, creds -> args)
+
+
+@dataclass
+class RunSummary:
+    run_id: int
+    portfolios: List[str]
+    alerts: int
+    fired: int
+    cleared: int
+    errors: Dict[str, str] = field(default_factory=dict)
+    duration: float = 0.0
+
+
+class AlertRunner:
+    def __init__(self, accounts: Sequence, fetchers: Fetchers, rules: RuleStore,
+                 events: AlertEventStore, results: AlertResultStore,
+                 holdings: Optional[HoldingsCache] = None,
+                 statements: Optional[Callable[[Sequence[str]], Dict[str, pd.DataFrame]]] = None,
+                 max_workers: int = 8):
+        self.accounts = [acc for acc in accounts if acc.configured]
+        self.fetchers = fetchers
+        self.rules = rules
+        self.events = events
+        self.results = results
+        self.holdings = holdings             # fetches also refresh the dashboard's disk snapshots
+        self.statements = statements         # reserved names -> extra statement portfolios
+        self.max_workers = max_workers
+        self._rules_seen: Dict = {}
+
+    def _jobs(self) -> List[BrokerJob]:
+        jobs = []
+        for acc in self.accounts:
+            fetch_fn, to_args = self.fetchers[acc.broker]
+            args = to_args(acc.creds)
+            if self.holdings is not None:
+                jobs.append(BrokerJob(acc.name, self.holdings.get, ((acc.name, acc.account_id), fetch_fn, *args),
+                                      {"force": True}, timeout=acc.timeout))
+            else:
+                jobs.append(BrokerJob(acc.name, fetch_fn, tuple(args), timeout=acc.timeout))
+        return jobs
+
+    def _load_rules(self):
+        version, rules = self.rules.snapshot()
+        current = {r["id"]: r for r in rules}
+        for rid, old in self._rules_seen.items():
+            if current.get(rid) != old:
+                invalidate_rule(rid)
+        self._rules_seen = current
+        return version, rules
+
+    def run_once(self) -> RunSummary:
+        started = time.time()
+        t0 = time.perf_counter()
+        fetched = fetch_all(self._jobs(), max_workers=self.max_workers)
+        errors = {name: res.error or res.status for name, res in fetched.items()
+                  if res.status in ("error", "timeout")}
+        raw = {name: res.df for name, res in fetched.items() if res.df is not None}
+        if self.statements is not None:
+            raw.update(self.statements(list(raw)))
+
+        dfs = {name: normalize_and_enrich(df, broker=name) for name, df in raw.items()}
+        valid_dfs = {k: v for k, v in dfs.items() if not v.empty and "instrument" in v.columns}
+        version, rules = self._load_rules()
+
+        alerts = generate_alerts(valid_dfs, rules)
+        # Only portfolios that loaded can clear their events
+        fired, cleared = self.events.transition(active_alert_keys(valid_dfs, rules), portfolios=valid_dfs.keys())
+        run_id = self.results.save(alerts, version, snapshot_key(valid_dfs), valid_dfs.keys(),
+                                   started_at=started, errors=errors)
+        return RunSummary(run_id, list(valid_dfs), len(alerts), len(fired), len(cleared), errors,
+                          time.perf_counter() - t0)
+
+    def run_forever(self, interval: float = DEFAULT_INTERVAL, stop: Optional[threading.Event] = None,
+                    max_runs: int = 0):
+        """Run every `interval` seconds (measured start to start) until `stop` is set."""
+        stop = stop or threading.Event()
+        runs = 0
+        next_at = time.monotonic()
+        while not stop.is_set():
+            try:
+                summary = self.run_once()
+                logging.info("Alert run %d: %d alert(s) over %d portfolio(s), %d fired, %d cleared in %.2fs%s",
+                             summary.run_id, summary.alerts, len(summary.portfolios), summary.fired,
+                             summary.cleared, summary.duration,
+                             f"; failed: {summary.errors}" if summary.errors else "")
+            except Exception:
+                logging.exception("Alert run failed")
+            runs += 1
+            if max_runs and runs >= max_runs:
+                break
+            next_at += interval
+            # A run longer than the interval skips the missed slots instead of bunching up
+            if next_at < time.monotonic():
+                next_at = time.monotonic() + interval
+            stop.wait(max(0.0, next_at - time.monotonic()))
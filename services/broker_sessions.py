@@ -0,0 +1,216 @@
+"""
+Process-wide pool of authenticated broker clients, one per account.
+
+SmartAPI: the SmartConnect object and its JWT / refresh / feed tokens are kept
+until the JWT's `exp` claim (SMART_SESSION_TTL when it has none). An expired
+JWT is renewed with the refresh token first; only when that fails is there a
+full TOTP + generateSession login. A data call rejected with a token error
+invalidates the session so the next call logs in again.
+
+Kite: access tokens cannot be renewed without the browser flow, so the pool
+only caches that a token passed profile() once. It is trusted until Kite's
+daily expiry (06:00 IST) or until a call is rejected.
+
+Logins, token refreshes and validations go through the shared request
+scheduler (services.rate_limit); fetchers use the pool's scheduler for their
+data calls too. Clients, TOTP, the clock and the scheduler are injectable so
+the pool runs against fakes.
+"""
+import base64
+import datetime
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from services.rate_limit import RequestScheduler, get_request_scheduler
+from utils.helpers import clean_env_value
+from utils.timing import span
+
+DEFAULT_SMART_TTL = 8 * 3600.0               # JWT lifetime assumed when it carries no exp claim
+EXPIRY_MARGIN = 120.0                        # renew this many seconds before expiry
+KITE_EXPIRY_HOUR = 6                         # Kite access tokens lapse at 06:00 IST
+IST = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+SMART_TOKEN_ERRORS = {"AG8001", "AG8002", "AG8003"}   # invalid / expired / missing token
+
+
+class SessionError(Exception):
+    """Login or token validation failed."""
+
+
+@dataclass
+class SmartSession:
+    client: object                           # SmartConnect
+    jwt: str
+    refresh_token: str
+    feed_token: str
+    expires_at: float
+
+
+def _jwt_expiry(jwt: str) -> Optional[float]:
+    """`exp` claim of a (possibly 'Bearer '-prefixed) JWT, unverified; None if absent."""
+    try:
+        payload = jwt.split()[-1].split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except Exception:
+        return None
+
+
+def kite_token_expiry(issued: float) -> float:
+    """Next 06:00 IST after `issued` (epoch seconds)."""
+    local = datetime.datetime.fromtimestamp(issued, IST)
+    cutoff = local.replace(hour=KITE_EXPIRY_HOUR, minute=0, second=0, microsecond=0)
+    if cutoff <= local:
+        cutoff += datetime.timedelta(days=1)
+    return cutoff.timestamp()
+
+
+def is_smart_token_error(resp) -> bool:
+    """True for a SmartAPI response rejected because of the session token."""
+    if not isinstance(resp, dict) or resp.get("status") is not False:
+        return False
+    return resp.get("errorcode") in SMART_TOKEN_ERRORS or "token" in str(resp.get("message", "")).lower()
+
+
+def _smart_connect(api_key: str):
+    from SmartApi import SmartConnect
+    return SmartConnect(api_key=api_key)
+
+
+def _kite_connect(api_key: str):
+    from kiteconnect import KiteConnect
+    return KiteConnect(api_key=api_key)
+
+
+def _totp_now(secret: str) -> str:
+    import pyotp
+    return pyotp.TOTP(secret).now()
+
+
+class SessionPool:
+    def __init__(self, smart_factory: Callable[[str], object] = _smart_connect,
+                 kite_factory: Callable[[str], object] = _kite_connect,
+                 totp: Callable[[str], str] = _totp_now,
+                 clock: Callable[[], float] = time.time,
+                 smart_ttl: float = DEFAULT_SMART_TTL,
+                 scheduler: Optional[RequestScheduler] = None):
+        self.scheduler = scheduler or get_request_scheduler()
+        self.smart_factory = smart_factory
+        self.kite_factory = kite_factory
+        self.totp = totp
+        self.clock = clock
+        self.smart_ttl = smart_ttl
+        self._smart: Dict[Tuple[str, str], SmartSession] = {}
+        self._kite: Dict[Tuple[str, str], Tuple[object, float]] = {}   # -> (client, valid until)
+        self._locks: Dict[Tuple, threading.Lock] = {}
+        self._guard = threading.Lock()
+        self.stats = {"login": 0, "refresh": 0, "reuse": 0, "validate": 0}
+
+    def _lock_for(self, key: Tuple) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _count(self, name: str):
+        with self._guard:
+            self.stats[name] += 1
+
+    # ---------- SmartAPI ----------
+    def smart(self, api_key: str, client_id: str, mpin: str, totp_secret: str) -> SmartSession:
+        """Logged-in session for the account: cached, refreshed, or a fresh login (single flight)."""
+        key = (api_key, client_id)
+        with self._lock_for(("smart", *key)):
+            sess = self._smart.get(key)
+            now = self.clock()
+            if sess is not None and now < sess.expires_at - EXPIRY_MARGIN:
+                self._count("reuse")
+                return sess
+            if sess is not None and sess.refresh_token:
+                renewed = self._smart_refresh(api_key, sess)
+                if renewed is not None:
+                    self._smart[key] = renewed
+                    return renewed
+            sess = self._smart[key] = self._smart_login(api_key, client_id, mpin, totp_secret)
+            return sess
+
+    def _session_from(self, client, data: dict, prev: Optional[SmartSession] = None) -> SmartSession:
+        jwt = data.get("jwtToken") or ""
+        feed = data.get("feedToken") or (prev.feed_token if prev else "")
+        if not feed and hasattr(client, "getfeedToken"):
+            feed = client.getfeedToken() or ""
+        expires = _jwt_expiry(jwt) or self.clock() + self.smart_ttl
+        return SmartSession(client, jwt, data.get("refreshToken") or (prev.refresh_token if prev else ""),
+                            feed, expires)
+
+    def _smart_login(self, api_key, client_id, mpin, totp_secret) -> SmartSession:
+        with span("angelone.login"):
+            client = self.smart_factory(api_key)
+            resp = self.scheduler.call("smartapi.login", api_key, client.generateSession,
+                                       client_id, mpin, self.totp(totp_secret))
+        data = (resp or {}).get("data") or {}
+        if not data.get("jwtToken"):
+            raise SessionError(f"Login failed: {resp}")
+        self._count("login")
+        return self._session_from(client, data)
+
+    def _smart_refresh(self, api_key: str, sess: SmartSession) -> Optional[SmartSession]:
+        try:
+            with span("angelone.refresh"):
+                resp = self.scheduler.call("smartapi.token", api_key, sess.client.generateToken,
+                                           sess.refresh_token)
+            data = (resp or {}).get("data") or {}
+            if not data.get("jwtToken"):
+                return None
+        except Exception as e:
+            logging.info("SmartAPI token refresh failed, logging in again: %s", e)
+            return None
+        self._count("refresh")
+        return self._session_from(sess.client, data, prev=sess)
+
+    def invalidate_smart(self, api_key: str, client_id: str):
+        with self._guard:
+            self._smart.pop((api_key, client_id), None)
+
+    # ---------- Kite ----------
+    def kite(self, api_key: str, access_token: str):
+        """KiteConnect client for the token; profile() is called once per token per trading day."""
+        key = (api_key, access_token)
+        with self._lock_for(("kite", *key)):
+            hit = self._kite.get(key)
+            now = self.clock()
+            if hit is not None and now < hit[1]:
+                self._count("reuse")
+                return hit[0]
+            client = self.kite_factory(api_key)
+            client.set_access_token(access_token)
+            try:
+                with span("zerodha.validate"):
+                    self.scheduler.call("kite.profile", api_key, client.profile)
+            except Exception as e:
+                raise SessionError(f"Zerodha auth failed: {e}") from e
+            self._count("validate")
+            self._kite[key] = (client, kite_token_expiry(now))
+            return client
+
+    def invalidate_kite(self, api_key: str, access_token: str):
+        with self._guard:
+            self._kite.pop((api_key, access_token), None)
+
+
+_pool: Optional[SessionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_session_pool() -> SessionPool:
+    """Process-wide pool (SMART_SESSION_TTL overrides the assumed JWT lifetime)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            try:
+                ttl = float(clean_env_value("SMART_SESSION_TTL") or DEFAULT_SMART_TTL)
+            except ValueError:
+                ttl = DEFAULT_SMART_TTL
+            _pool = SessionPool(smart_ttl=ttl)
+        return _pool
@@ -0,0 +1,100 @@
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+import pandas as pd
+
+try:  # lets broker loaders keep using st.* from worker threads
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except Exception:  # pragma: no cover - older/newer streamlit layouts
+    add_script_run_ctx = get_script_run_ctx = None
+
+
+@dataclass
+class BrokerJob:
+    name: str
+    fetch_fn: Callable[..., pd.DataFrame]
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+    timeout: float = 30.0   # seconds, measured from the start of the batch
+
+
+@dataclass
+class FetchResult:
+    name: str
+    df: pd.DataFrame
+    status: str             # ok | empty | error | timeout
+    duration: float
+    error: str = ""
+
+
+def _run_job(job: BrokerJob, ctx, started: Dict[str, float]):
+    if ctx is not None and add_script_run_ctx is not None:
+        add_script_run_ctx(threading.current_thread(), ctx)
+    t0 = started[job.name] = time.perf_counter()
+    try:
+        return job.fetch_fn(*job.args, **job.kwargs), time.perf_counter() - t0, None
+    except Exception as e:
+        return None, time.perf_counter() - t0, e
+
+
+def fetch_all(jobs: List[BrokerJob], max_workers: int = 8) -> Dict[str, FetchResult]:
+    """
+    Run broker loaders in parallel, at most `max_workers` at a time. Each job's
+    timeout counts from when it starts running, so accounts queued behind a full
+    pool are not timed out early; a slow or failing account yields a
+    timeout/error result without holding up the rest.
+    """
+    if not jobs:
+        return {}
+    ctx = get_script_run_ctx() if get_script_run_ctx is not None else None
+    workers = max(1, min(max_workers, len(jobs)))
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="broker-fetch")
+    start = time.perf_counter()
+    started: Dict[str, float] = {}
+    # Each worker runs in a copy of the caller's context so timing spans join the current rerun
+    futures = {job.name: (job, pool.submit(contextvars.copy_context().run, _run_job, job, ctx, started))
+               for job in jobs}
+    # Hard stop for the whole batch: every wave of the pool at its slowest timeout
+    waves = -(-len(jobs) // workers)
+    batch_deadline = start + waves * max(job.timeout for job in jobs)
+
+    results: Dict[str, FetchResult] = {}
+    for name, (job, fut) in sorted(futures.items(), key=lambda kv: kv[1][0].timeout):
+        try:
+            df, duration, err = _wait(fut, job, started, batch_deadline)
+        except FutureTimeout:
+            logging.warning("%s: fetch timed out after %.1fs", name, job.timeout)
+            results[name] = FetchResult(name, pd.DataFrame(), "timeout", job.timeout,
+                                        f"timed out after {job.timeout:.0f}s")
+            continue
+        if err is not None:
+            logging.error("%s: fetch failed: %s", name, err)
+            results[name] = FetchResult(name, pd.DataFrame(), "error", duration, str(err))
+            continue
+        if df is None:
+            df = pd.DataFrame()
+        results[name] = FetchResult(name, df, "ok" if not df.empty else "empty", duration)
+
+    # Don't block the page on stragglers; their threads finish in the background
+    pool.shutdown(wait=False, cancel_futures=True)
+    return {job.name: results[job.name] for job in jobs}
+
+
+def _wait(fut, job: BrokerJob, started: Dict[str, float], batch_deadline: float):
+    """Result of one job, waiting at most job.timeout from its own start."""
+    while True:
+        now = time.perf_counter()
+        t0 = started.get(job.name)
+        deadline = min(batch_deadline, (t0 if t0 is not None else now) + job.timeout)
+        try:
+            return fut.result(timeout=max(0.0, deadline - now))
+        except FutureTimeout:
+            now, t0 = time.perf_counter(), started.get(job.name)
+            if now >= batch_deadline or (t0 is not None and now >= t0 + job.timeout):
+                raise
+            # Still queued behind the pool (or started while we waited): wait against its real start
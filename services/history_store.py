@@ -0,0 +1,192 @@
+"""
+Append-only history of normalized holdings fetches.
+
+Layout (hive-style partitions, Arrow IPC files so reads can be memory-mapped):
+
+    data/history/date=2025-01-31/broker=Zerodha/part-<ms>-<rand>.arrow   one file per fetch
+    data/history/date=2025-01-31/broker=Zerodha/day.arrow                past days, compacted
+
+Every append writes a new part file; earlier days are folded into a single
+uncompressed day.arrow on the next append so a year of intraday snapshots is
+a few hundred mmap'd files. Rows carry a `ts` column (epoch seconds).
+"""
+import os
+import time
+import uuid
+import logging
+import datetime
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+from utils.helpers import clean_env_value
+from utils.schema import CANONICAL_COLUMNS, normalize_holdings
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # optional: history is disabled without pyarrow
+    pa = None
+
+DEFAULT_HISTORY_DIR = Path("data/history")
+DAY_FILE = "day.arrow"
+SERIES_BUCKET = 3600      # value_series memo granularity (seconds); rows are then cut to the exact window
+
+
+def _day(ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+
+
+def _partition_dirs(root: Path, broker: Optional[str] = None) -> List[Path]:
+    pattern = f"date=*/broker={broker}" if broker else "date=*/broker=*"
+    return sorted(root.glob(pattern))
+
+
+def _read_ipc(path: Path, columns: Optional[List[str]] = None) -> "pa.Table":
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.select(columns) if columns else table
+
+
+def _write_ipc(table: "pa.Table", path: Path):
+    tmp = path.with_name(f".{path.name}.tmp")
+    with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+
+
+class HistoryStore:
+    """Date/broker partitioned snapshot store with as-of and time-series reads."""
+
+    def __init__(self, root: Path = DEFAULT_HISTORY_DIR):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._version = 0                    # bumped per append; keys the series memo
+        self._compacted_for = None           # day whose predecessors were last compacted
+        self._series_memo = {}
+
+    # ---------- writes ----------
+    def append(self, broker: str, df: pd.DataFrame, ts: Optional[float] = None):
+        """Record one normalized fetch; empty frames are ignored."""
+        df = normalize_holdings(df, broker)
+        if df.empty:
+            return
+        ts = ts or time.time()
+        frame = df[CANONICAL_COLUMNS].copy()
+        for col in ("instrument", "broker", "exchange", "token"):
+            frame[col] = frame[col].astype(object)
+        frame.insert(0, "ts", ts)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+
+        part_dir = self.root / f"date={_day(ts)}" / f"broker={broker}"
+        with self._lock:
+            part_dir.mkdir(parents=True, exist_ok=True)
+            _write_ipc(table, part_dir / f"part-{int(ts * 1000)}-{uuid.uuid4().hex[:8]}.arrow")
+            if self._compacted_for != _day(ts):
+                self._compact_before(_day(ts))
+                self._compacted_for = _day(ts)
+            self._version += 1
+            self._series_memo.clear()
+
+    def _compact_before(self, today: str):
+        """Fold the part files of every earlier day into that day's day.arrow."""
+        for part_dir in _partition_dirs(self.root):
+            if part_dir.parent.name >= f"date={today}":
+                continue
+            parts = sorted(part_dir.glob("part-*.arrow"))
+            if not parts:
+                continue
+            files = ([part_dir / DAY_FILE] if (part_dir / DAY_FILE).exists() else []) + parts
+            try:
+                _write_ipc(pa.concat_tables([_read_ipc(p) for p in files], promote_options="default"),
+                           part_dir / DAY_FILE)
+                for p in parts:
+                    p.unlink()
+            except Exception as e:
+                logging.warning("History compaction failed for %s: %s", part_dir, e)
+
+    # ---------- reads ----------
+    def _files(self, broker: Optional[str] = None, start: Optional[float] = None,
+               end: Optional[float] = None) -> Iterable[Path]:
+        lo = f"date={_day(start)}" if start else ""
+        hi = f"date={_day(end)}" if end else "date=~"
+        for part_dir in _partition_dirs(self.root, broker):
+            if lo <= part_dir.parent.name <= hi:
+                yield from sorted(part_dir.glob("*.arrow"))
+
+    def scan(self, columns: Optional[List[str]] = None, broker: Optional[str] = None,
+             start: Optional[float] = None, end: Optional[float] = None) -> pd.DataFrame:
+        """Rows between start and end (epoch seconds), reading only the requested columns."""
+        cols = None if columns is None else list(dict.fromkeys(["ts", "broker", *columns]))
+        tables = [_read_ipc(p, cols) for p in self._files(broker, start, end)]
+        if not tables:
+            return pd.DataFrame(columns=cols or ["ts", *CANONICAL_COLUMNS])
+        table = pa.concat_tables(tables, promote_options="default")
+        if start is not None:
+            table = table.filter(pc.greater_equal(table["ts"], start))
+        if end is not None:
+            table = table.filter(pc.less_equal(table["ts"], end))
+        return table.to_pandas()
+
+    def as_of(self, broker: str, ts: float) -> pd.DataFrame:
+        """Canonical holdings frame of the last snapshot taken at or before ts."""
+        by_day = {}
+        for path in self._files(broker, end=ts):
+            by_day.setdefault(path.parent.parent.name, []).append(path)
+        for day in sorted(by_day, reverse=True):
+            table = pa.concat_tables([_read_ipc(p) for p in by_day[day]], promote_options="default")
+            stamps = table["ts"].to_numpy()
+            eligible = stamps[stamps <= ts]
+            if len(eligible):
+                snap = table.filter(pc.equal(table["ts"], float(eligible.max()))).to_pandas()
+                return normalize_holdings(snap.drop(columns="ts"), broker)
+        return pd.DataFrame()
+
+    def value_series(self, brokers: Optional[List[str]] = None, start: Optional[float] = None,
+                     end: Optional[float] = None) -> pd.DataFrame:
+        """Per snapshot: market value, invested and P&L of each broker (ts as datetime)."""
+        # Callers pass a sliding "now - window" start; memoize per bucket so reruns hit
+        lo = None if start is None else start - start % SERIES_BUCKET
+        hi = None if end is None else end - end % SERIES_BUCKET + SERIES_BUCKET
+        key = (self._version, tuple(brokers) if brokers is not None else None, lo, hi)
+        cached = self._series_memo.get(key)
+        if cached is None:
+            cached = self._series_memo[key] = self._value_series(brokers, lo, hi)
+        keep = pd.Series(True, index=cached.index)
+        if start is not None:
+            keep &= cached["ts"] >= pd.Timestamp(start, unit="s", tz="UTC")
+        if end is not None:
+            keep &= cached["ts"] <= pd.Timestamp(end, unit="s", tz="UTC")
+        return cached[keep].reset_index(drop=True)
+
+    def _value_series(self, brokers, start, end) -> pd.DataFrame:
+        df = self.scan(["quantity", "ltp", "invested", "pnl_abs"], start=start, end=end)
+        if brokers is not None:
+            df = df[df["broker"].isin(brokers)]
+        if df.empty:
+            return pd.DataFrame(columns=["ts", "broker", "value", "invested", "pnl"])
+        df = df.assign(value=df["quantity"] * df["ltp"])
+        out = (df.groupby(["ts", "broker"], sort=True)
+                 .agg(value=("value", "sum"), invested=("invested", "sum"), pnl=("pnl_abs", "sum"))
+                 .reset_index())
+        local_tz = datetime.datetime.now().astimezone().tzinfo
+        out["ts"] = pd.to_datetime(out["ts"], unit="s", utc=True).dt.tz_convert(local_tz)
+        return out
+
+
+_store: Optional[HistoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> Optional[HistoryStore]:
+    """Process-wide store; None when pyarrow is missing or HISTORY_DIR=off."""
+    global _store
+    raw_dir = clean_env_value("HISTORY_DIR")
+    if pa is None or raw_dir.lower() == "off":
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore(Path(raw_dir) if raw_dir else DEFAULT_HISTORY_DIR)
+        return _store
@@ -0,0 +1,158 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from services.history_store import get_history_store
+from utils.helpers import clean_env_value
+
+DEFAULT_TTL = 300.0                          # seconds a fetch is considered fresh
+DEFAULT_SNAPSHOT_DIR = Path("data/cache/holdings")
+
+CacheKey = Tuple[str, str]                   # (broker, account)
+
+
+@dataclass
+class CacheEntry:
+    df: pd.DataFrame
+    fetched_at: float                        # epoch seconds
+    source: str = "fetch"                    # fetch | disk
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class HoldingsCache:
+    """
+    Process-wide holdings cache shared by every Streamlit session.
+    Fresh entries are served as-is; stale ones are served immediately while a
+    single background thread refetches them (stale-while-revalidate).
+    Successful fetches are also written to disk so a restart starts warm.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, snapshot_dir: Optional[Path] = DEFAULT_SNAPSHOT_DIR,
+                 on_fetch: Optional[Callable[[CacheKey, pd.DataFrame, float], None]] = None):
+        self.ttl = ttl
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else None
+        self.on_fetch = on_fetch             # called with (key, df, fetched_at) after each good fetch
+        self._entries: Dict[CacheKey, CacheEntry] = {}
+        self._locks: Dict[CacheKey, threading.Lock] = {}
+        self._refreshing = set()
+        self._guard = threading.Lock()
+
+    # ---------- public API ----------
+    def get(self, key: CacheKey, loader: Callable[..., pd.DataFrame], *args,
+            force: bool = False, **kw) -> pd.DataFrame:
+        entry = None if force else self._entries.get(key) or self._load_snapshot(key)
+        if entry is None:
+            return self._fetch(key, loader, args, kw)
+        if entry.age() > self.ttl:
+            self._refresh_in_background(key, loader, args, kw)
+        return entry.df
+
+    def info(self, key: CacheKey) -> Optional[CacheEntry]:
+        return self._entries.get(key)
+
+    def is_refreshing(self, key: CacheKey) -> bool:
+        return key in self._refreshing
+
+    # ---------- internals ----------
+    def _lock_for(self, key: CacheKey) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _fetch(self, key, loader, args, kw) -> pd.DataFrame:
+        lock = self._lock_for(key)
+        started = time.time()
+        with lock:  # single flight: concurrent callers wait for the same fetch
+            entry = self._entries.get(key)
+            if entry is not None and entry.fetched_at >= started:
+                return entry.df
+            df = loader(*args, **kw)
+            if df is None or df.empty:
+                # Never replace good data with a failed/empty fetch
+                return entry.df if entry is not None else pd.DataFrame()
+            entry = self._entries[key] = CacheEntry(df, time.time())
+            self._save_snapshot(key, df)
+            if self.on_fetch is not None:
+                try:
+                    self.on_fetch(key, df, entry.fetched_at)
+                except Exception as e:
+                    logging.warning("on_fetch hook failed for %s: %s", key[0], e)
+            return df
+
+    def _refresh_in_background(self, key, loader, args, kw):
+        with self._guard:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def _run():
+            try:
+                self._fetch(key, loader, args, kw)
+            except Exception as e:
+                logging.error("Background refresh failed for %s: %s", key[0], e)
+            finally:
+                self._refreshing.discard(key)
+
+        threading.Thread(target=_run, name=f"holdings-refresh-{key[0]}", daemon=True).start()
+
+    def _snapshot_path(self, key: CacheKey) -> Optional[Path]:
+        if self.snapshot_dir is None:
+            return None
+        digest = hashlib.sha1("|".join(key).encode("utf-8")).hexdigest()[:16]
+        return self.snapshot_dir / f"{key[0]}_{digest}.pkl"
+
+    def _save_snapshot(self, key: CacheKey, df: pd.DataFrame):
+        path = self._snapshot_path(key)
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            df.to_pickle(tmp)
+            os.replace(tmp, path)
+        except Exception as e:
+            logging.warning("Could not write holdings snapshot for %s: %s", key[0], e)
+
+    def _load_snapshot(self, key: CacheKey) -> Optional[CacheEntry]:
+        path = self._snapshot_path(key)
+        if path is None or not path.exists():
+            return None
+        try:
+            entry = CacheEntry(pd.read_pickle(path), path.stat().st_mtime, source="disk")
+        except Exception:
+            return None
+        self._entries.setdefault(key, entry)
+        return self._entries[key]
+
+
+_CACHE: Optional[HoldingsCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_holdings_cache() -> HoldingsCache:
+    """
+    Singleton configured from HOLDINGS_CACHE_TTL / HOLDINGS_CACHE_DIR (set the dir to 'off' to disable).
+    Every successful fetch is also appended to the history store when one is enabled.
+    """
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            try:
+                ttl = float(clean_env_value("HOLDINGS_CACHE_TTL") or DEFAULT_TTL)
+            except ValueError:
+                ttl = DEFAULT_TTL
+            snap_dir = clean_env_value("HOLDINGS_CACHE_DIR") or str(DEFAULT_SNAPSHOT_DIR)
+            history = get_history_store()
+            _CACHE = HoldingsCache(
+                ttl=ttl, snapshot_dir=None if snap_dir.lower() == "off" else Path(snap_dir),
+                on_fetch=(lambda key, df, ts: history.append(key[0], df, ts)) if history is not None else None,
+            )
+        return _CACHE
@@ -0,0 +1,76 @@
+"""
+Alert events driven by streamed prices.
+
+The dashboard evaluates the rules on each rerun; between reruns the tick feeds
+keep moving P&L. LiveAlerts keeps one AlertEvaluator for the latest holdings
+snapshot and rule version, listens on the PriceTable and writes the fired /
+cleared deltas of every tick batch to the alert event log, so alerts fire when
+the price crosses a threshold rather than when someone next opens the page.
+"""
+import logging
+import sqlite3
+import threading
+from typing import Dict, Mapping, Optional, Tuple
+
+import pandas as pd
+
+from services.alert_events import AlertEventStore, get_alert_event_store
+from services.price_stream import PriceTable
+from services.rule_store import RuleStore, get_rule_store
+from utils.incremental_alerts import AlertEvaluator
+from utils.timing import span
+
+
+class LiveAlerts:
+    def __init__(self, table: PriceTable, events: AlertEventStore, rules: RuleStore):
+        self.events = events
+        self.rules = rules
+        self._evaluator: Optional[AlertEvaluator] = None
+        self._key: Optional[Tuple[str, int]] = None            # (holdings snapshot, rules version)
+        self._lock = threading.Lock()
+        table.add_listener(self.on_ticks)
+
+    def sync(self, snapshot: str, valid_dfs: Dict[str, pd.DataFrame]):
+        """
+        Point the evaluator at this holdings snapshot (keyed without live prices,
+        so ticks alone never force a rebuild) and the current rules. A new snapshot
+        builds a new evaluator; a rules change re-evaluates only the edited rules.
+        """
+        version = self.rules.version()
+        with self._lock:
+            if self._key == (snapshot, version):
+                return
+            _, rules = self.rules.snapshot()
+            if self._evaluator is not None and self._key[0] == snapshot:
+                self._evaluator.set_rules(rules)
+            else:
+                with span("alerts.live_build"):
+                    self._evaluator = AlertEvaluator(valid_dfs, rules)
+            self._key = (snapshot, version)
+
+    def on_ticks(self, broker: str, ticks: Mapping[str, float]):
+        """PriceTable listener (feed threads): portfolios are named after the streamed accounts."""
+        with self._lock:
+            evaluator = self._evaluator
+        if evaluator is None:
+            return
+        delta = evaluator.on_ticks(broker, ticks)
+        if not delta:
+            return
+        try:
+            self.events.apply(delta.fired, delta.cleared)
+        except sqlite3.Error as e:
+            logging.warning("Alert events from live prices not recorded: %s", e)
+
+
+_live: Optional[LiveAlerts] = None
+_live_lock = threading.Lock()
+
+
+def get_live_alerts(table: PriceTable) -> LiveAlerts:
+    """Process-wide instance listening on the price stream's table."""
+    global _live
+    with _live_lock:
+        if _live is None:
+            _live = LiveAlerts(table, get_alert_event_store(), get_rule_store())
+        return _live
@@ -0,0 +1,342 @@
+"""
+Background price streaming over the broker tick feeds.
+
+Each broker gets one long-lived feed (KiteTicker for Zerodha, SmartWebSocketV2
+for AngelOne) subscribed to every held token. Ticks land in a process-wide
+PriceTable that app.py joins into the holdings via normalize_and_enrich, so
+P&L moves between holdings fetches.
+"""
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from services.broker_sessions import SessionError, get_session_pool
+from utils.helpers import clean_env_value
+
+Subscription = Tuple[str, str]               # (exchange, token)
+
+# SmartAPI WebSocket V2 exchangeType codes
+SMART_EXCHANGE_TYPES = {"NSE": 1, "NFO": 2, "BSE": 3, "BFO": 4, "MCX": 5, "NCX": 7, "CDS": 13}
+SMART_MODE_LTP = 1
+RETRY_BASE = 30.0                            # seconds before retrying a feed that failed to start
+RETRY_MAX = 600.0
+RECONNECT_DELAY = 5.0                        # seconds before reconnecting a dropped SmartAPI feed
+
+
+@dataclass
+class Tick:
+    ltp: float
+    ts: float                                # epoch seconds the tick was received
+
+
+class PriceTable:
+    """Latest traded price per (broker, token), safe to update from feed threads."""
+
+    def __init__(self):
+        self._ticks: Dict[Tuple[str, str], Tick] = {}
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[str, Dict[str, float]], None]] = []
+
+    def add_listener(self, fn: Callable[[str, Dict[str, float]], None]):
+        """fn(broker, {token: ltp}) is called after every batch, e.g. AlertEvaluator.on_ticks."""
+        self._listeners.append(fn)
+
+    def update(self, broker: str, token: str, ltp: float, ts: Optional[float] = None):
+        self.update_many(broker, {token: ltp}, ts)
+
+    def update_many(self, broker: str, prices: Dict[str, float], ts: Optional[float] = None):
+        ts = ts or time.time()
+        batch = {str(tok): float(ltp) for tok, ltp in prices.items() if ltp is not None and ltp > 0}
+        if not batch:
+            return
+        with self._lock:
+            for tok, ltp in batch.items():
+                self._ticks[(broker, tok)] = Tick(ltp, ts)
+        for fn in list(self._listeners):
+            try:
+                fn(broker, batch)
+            except Exception as e:
+                logging.error("Price listener failed: %s", e)
+
+    def prices(self, broker: str, since: float = 0.0) -> Dict[str, float]:
+        """token -> ltp for one broker, only ticks newer than `since` (e.g. the holdings fetch time)."""
+        with self._lock:
+            return {tok: t.ltp for (b, tok), t in self._ticks.items() if b == broker and t.ts > since}
+
+    def last_tick(self, broker: str) -> Optional[float]:
+        with self._lock:
+            stamps = [t.ts for (b, _), t in self._ticks.items() if b == broker]
+        return max(stamps) if stamps else None
+
+    def clear(self):
+        with self._lock:
+            self._ticks.clear()
+
+
+# ---------- Feeds ----------
+class KiteFeed:
+    """Zerodha KiteTicker in LTP mode."""
+
+    def __init__(self, api_key: str, access_token: str, table: PriceTable,
+                 broker: str = "Zerodha", ticker_factory: Optional[Callable] = None):
+        if ticker_factory is None:
+            from kiteconnect import KiteTicker
+            ticker_factory = KiteTicker
+        self.broker = broker
+        self.table = table
+        self._tokens: Set[int] = set()
+        self._ws = ticker_factory(api_key, access_token)
+        self._ws.on_ticks = self._on_ticks
+        self._ws.on_connect = self._on_connect
+        self._ws.on_error = lambda ws, code, reason: logging.warning("KiteTicker error %s: %s", code, reason)
+
+    def start(self):
+        self._ws.connect(threaded=True)
+
+    def stop(self):
+        self._ws.close()
+
+    def subscribe(self, subs: Iterable[Subscription]):
+        new = {int(tok) for _, tok in subs if str(tok).isdigit()} - self._tokens
+        if not new:
+            return
+        self._tokens |= new
+        if self._ws.is_connected():
+            self._ws.subscribe(list(new))
+            self._ws.set_mode(self._ws.MODE_LTP, list(new))
+
+    def _on_connect(self, ws, response):
+        if self._tokens:
+            ws.subscribe(list(self._tokens))
+            ws.set_mode(ws.MODE_LTP, list(self._tokens))
+
+    def _on_ticks(self, ws, ticks):
+        self.table.update_many(self.broker, {t.get("instrument_token"): t.get("last_price") for t in ticks})
+
+
+class SmartFeed:
+    """
+    AngelOne SmartAPI WebSocket V2 in LTP mode (prices arrive in paise).
+    `auth()` returns the current (JWT, feed token); it is called again for every
+    reconnect so a session renewed by the pool is picked up after expiry.
+    """
+
+    def __init__(self, api_key: str, client_code: str, table: PriceTable,
+                 auth: Callable[[], Tuple[str, str]], broker: str = "AngelOne",
+                 ws_factory: Optional[Callable] = None, reconnect_delay: float = RECONNECT_DELAY):
+        if ws_factory is None:
+            from SmartApi.smartWebSocketV2 import SmartWebSocketV2
+            ws_factory = SmartWebSocketV2
+        self.api_key = api_key
+        self.client_code = client_code
+        self.broker = broker
+        self.table = table
+        self.auth = auth
+        self.ws_factory = ws_factory
+        self.reconnect_delay = reconnect_delay
+        self._subs: Set[Subscription] = set()
+        self._open = threading.Event()
+        self._stopped = threading.Event()
+        self._ws = None
+
+    def start(self):
+        self._connect()
+
+    def stop(self):
+        self._stopped.set()
+        if self._ws is not None:
+            self._ws.close_connection()
+
+    def _connect(self):
+        jwt, feed_token = self.auth()
+        ws = self.ws_factory(jwt, self.api_key, self.client_code, feed_token)
+        ws.on_open = self._on_open
+        ws.on_data = self._on_data
+        ws.on_error = lambda *a: logging.warning("SmartAPI WebSocket error: %s", a[-1] if a else "")
+        ws.on_close = self._on_close
+        self._ws = ws
+        threading.Thread(target=ws.connect, name="smart-feed", daemon=True).start()
+
+    def _on_close(self, *args):
+        self._open.clear()
+        if not self._stopped.is_set():
+            threading.Thread(target=self._reconnect, name="smart-feed-reconnect", daemon=True).start()
+
+    def _reconnect(self):
+        delay = self.reconnect_delay
+        while not self._stopped.wait(delay):
+            try:
+                self._connect()              # fresh token from the session pool
+                return
+            except Exception as e:
+                logging.warning("SmartAPI feed reconnect failed: %s", e)
+                delay = min(RETRY_MAX, delay * 2)
+
+    def subscribe(self, subs: Iterable[Subscription]):
+        new = {(exch, str(tok)) for exch, tok in subs if tok} - self._subs
+        if not new:
+            return
+        self._subs |= new
+        if self._open.is_set():
+            self._send(new)
+
+    def _send(self, subs: Set[Subscription]):
+        by_exch: Dict[int, list] = {}
+        for exch, tok in subs:
+            by_exch.setdefault(SMART_EXCHANGE_TYPES.get(exch, 1), []).append(tok)
+        token_list = [{"exchangeType": et, "tokens": toks} for et, toks in by_exch.items()]
+        self._ws.subscribe("dashboard", SMART_MODE_LTP, token_list)
+
+    def _on_open(self, wsapp):
+        self._open.set()
+        if self._subs:
+            self._send(set(self._subs))
+
+    def _on_data(self, wsapp, message):
+        if isinstance(message, dict):
+            ltp = message.get("last_traded_price")
+            if ltp is not None:
+                self.table.update(self.broker, message.get("token"), ltp / 100.0)
+
+
+def smart_feed_from_login(api_key: str, client_id: str, mpin: str, totp_secret: str,
+                          table: PriceTable, **kw) -> Optional[SmartFeed]:
+    """Feed on the account's pooled session (the WebSocket needs the JWT and the feed token)."""
+    pool = get_session_pool()
+
+    def auth() -> Tuple[str, str]:
+        sess = pool.smart(api_key, client_id, mpin, totp_secret)
+        return sess.jwt, sess.feed_token
+
+    try:
+        auth()
+    except SessionError as e:
+        logging.error("SmartAPI feed login failed: %s", e)
+        return None
+    return SmartFeed(api_key, client_id, table, auth, **kw)
+
+
+def account_feed_factory(broker: str, name: str, creds, **kw) -> Optional[Callable[[PriceTable], object]]:
+    """
+    Feed factory for one registry account, or None without streaming credentials.
+    Ticks are keyed by the account name, so two accounts at one broker stay apart
+    and match the portfolio names the dashboard tracks and reads them under.
+    """
+    if broker == "AngelOne" and creds.totp_secret:
+        return lambda table: smart_feed_from_login(creds.api_key, creds.client_id, creds.mpin,
+                                                   creds.totp_secret, table, broker=name, **kw)
+    if broker == "Zerodha" and creds.access_token:
+        return lambda table: KiteFeed(creds.api_key, creds.access_token, table, broker=name, **kw)
+    return None
+
+
+# ---------- Stream manager ----------
+class PriceStream:
+    """
+    Owns one feed per broker and keeps it subscribed to the held tokens.
+    Feeds start on a background thread so a slow broker handshake never blocks
+    a rerun; a feed that fails to start is retried with exponential back-off.
+    """
+
+    def __init__(self, table: Optional[PriceTable] = None, clock: Callable[[], float] = time.monotonic,
+                 start_async: bool = True):
+        self.table = table or PriceTable()
+        self.clock = clock
+        self.start_async = start_async
+        self._feeds: Dict[str, object] = {}
+        self._starting: Set[str] = set()
+        self._pending: Dict[str, Set[Subscription]] = {}      # tokens held while the feed starts
+        self._retry: Dict[str, Tuple[int, float]] = {}        # broker -> (failures, next attempt)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def track(self, broker: str, df: pd.DataFrame, feed_factory: Callable[[PriceTable], object]):
+        """Start the broker's feed on first use, then subscribe any tokens not yet streamed."""
+        subs = holdings_subscriptions(df)
+        if not subs:
+            return
+        with self._lock:
+            feed = self._feeds.get(broker)
+            if feed is None:
+                self._pending.setdefault(broker, set()).update(subs)
+                if broker in self._starting or self.clock() < self._retry.get(broker, (0, 0.0))[1]:
+                    return
+                self._starting.add(broker)
+                generation = self._generation
+        if feed is not None:
+            feed.subscribe(subs)
+        elif self.start_async:
+            threading.Thread(target=self._start, args=(broker, feed_factory, generation),
+                             name=f"feed-start-{broker}", daemon=True).start()
+        else:
+            self._start(broker, feed_factory, generation)
+
+    def _start(self, broker: str, feed_factory: Callable[[PriceTable], object], generation: int):
+        feed = None
+        try:
+            feed = feed_factory(self.table)
+            if feed is not None:
+                feed.start()
+        except Exception as e:
+            logging.error("%s price feed failed to start: %s", broker, e)
+            feed = None
+        with self._lock:
+            self._starting.discard(broker)
+            stale = generation != self._generation         # stop() ran meanwhile
+            if feed is None or stale:
+                if not stale:
+                    failures = self._retry.get(broker, (0, 0.0))[0] + 1
+                    delay = min(RETRY_MAX, RETRY_BASE * 2 ** (failures - 1))
+                    self._retry[broker] = (failures, self.clock() + delay)
+                    logging.warning("%s price feed unavailable, retrying in %.0fs", broker, delay)
+                subs = set()
+            else:
+                self._retry.pop(broker, None)
+                self._feeds[broker] = feed
+                subs = self._pending.pop(broker, set())
+        if feed is not None and stale:
+            feed.stop()
+        elif subs:
+            feed.subscribe(subs)
+
+    def is_streaming(self, broker: str) -> bool:
+        return broker in self._feeds
+
+    def stop(self):
+        with self._lock:
+            feeds, self._feeds = self._feeds, {}
+            self._generation += 1
+            self._starting.clear()
+            self._pending.clear()
+            self._retry.clear()
+        for feed in feeds.values():
+            try:
+                feed.stop()
+            except Exception:
+                pass
+
+
+def holdings_subscriptions(df: pd.DataFrame) -> Set[Subscription]:
+    if df is None or df.empty or "token" not in df.columns:
+        return set()
+    exch = df["exchange"].astype(object).fillna("NSE") if "exchange" in df.columns else ["NSE"] * len(df)
+    return {(e, str(t)) for e, t in zip(exch, df["token"].astype(object)) if t is not None and t == t}
+
+
+_stream: Optional[PriceStream] = None
+_stream_lock = threading.Lock()
+
+
+def get_price_stream() -> Optional[PriceStream]:
+    """Process-wide stream, or None when PRICE_STREAM=off."""
+    global _stream
+    if clean_env_value("PRICE_STREAM").lower() in ("off", "0", "false", "no"):
+        return None
+    with _stream_lock:
+        if _stream is None:
+            _stream = PriceStream()
+        return _stream
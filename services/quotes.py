@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.rate_limit import RequestScheduler, get_request_scheduler
+
+MARKET_DATA_MAX_TOKENS = 50   # SmartAPI getMarketData accepts up to 50 tokens per call
+LTP_WORKERS = 8               # concurrent quote calls; the scheduler keeps them within the limits
+
+Quote = Tuple[str, str, str]  # (exchange, instrument, symboltoken)
+
+
+def _chunks(items: List, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _chunk_ltp(obj, exch: str, chunk: List[str], sched: RequestScheduler, scope: str):
+    resp = sched.call("smartapi.quote", scope, obj.getMarketData, "LTP", {exch: chunk})
+    data = (resp or {}).get("data") or {}
+    out = {}
+    for item in data.get("fetched") or []:
+        token = str(item.get("symbolToken", ""))
+        ltp = item.get("ltp")
+        if token and ltp is not None:
+            out[(item.get("exchange", exch), token)] = float(ltp)
+    return out
+
+
+def _bulk_ltp(obj, quotes: List[Quote], chunk_size: int, pool: ThreadPoolExecutor,
+              sched: RequestScheduler, scope: str) -> Dict[Tuple[str, str], float]:
+    """Fetch LTPs with multi-token getMarketData calls, grouped per exchange, paced by the scheduler."""
+    by_exch: Dict[str, List[str]] = {}
+    for exch, _, token in quotes:
+        by_exch.setdefault(exch, []).append(token)
+
+    futures = [pool.submit(_chunk_ltp, obj, exch, chunk, sched, scope)
+               for exch, tokens in by_exch.items() for chunk in _chunks(sorted(set(tokens)), chunk_size)]
+    prices: Dict[Tuple[str, str], float] = {}
+    for fut in futures:
+        try:
+            prices.update(fut.result())
+        except Exception:
+            continue  # leave the chunk to the single-symbol fallback
+    return prices
+
+
+def _single_ltp(obj, quote: Quote, sched: RequestScheduler, scope: str) -> float:
+    exch, symbol, token = quote
+    resp = sched.call("smartapi.ltp", scope, obj.ltpData, exch, symbol, token)
+    return float(resp["data"]["ltp"])
+
+
+def fetch_ltps(obj, quotes: Iterable[Quote],
+               chunk_size: int = MARKET_DATA_MAX_TOKENS,
+               max_workers: int = LTP_WORKERS,
+               scheduler: Optional[RequestScheduler] = None,
+               scope: str = "") -> Tuple[Dict[Tuple[str, str], float], List[str]]:
+    """
+    Fetch last traded prices for many holdings at once.
+    Bulk getMarketData first; whatever is left unfetched goes through ltpData.
+    Every call is held to the endpoint limits of `scope` (the API key) by the
+    shared request scheduler, with throttled calls retried.
+    Returns ({(exchange, symboltoken): ltp}, [failed instruments]); failed
+    instruments have no entry in the price map.
+    """
+    sched = scheduler or get_request_scheduler()
+    quotes = [(q[0] or "NSE", q[1], str(q[2])) for q in quotes if q[2]]
+    failed: List[str] = []
+    if not quotes:
+        return {}, failed
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="ltp") as pool:
+        prices = _bulk_ltp(obj, quotes, chunk_size, pool, sched, scope) if hasattr(obj, "getMarketData") else {}
+        missing = [q for q in quotes if (q[0], q[2]) not in prices]
+        futures = {q: pool.submit(_single_ltp, obj, q, sched, scope) for q in missing}
+        for q, fut in futures.items():
+            try:
+                prices[(q[0], q[2])] = fut.result()
+            except Exception:
+                failed.append(q[1])
+    return prices, sorted(set(failed))
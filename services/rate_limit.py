@@ -0,0 +1,249 @@
+"""
+Shared request scheduler for broker API calls.
+
+Every call goes through RequestScheduler.call(endpoint, scope, fn, ...):
+
+- token buckets per (scope, endpoint) hold calls to the endpoint's published
+  limits (ENDPOINT_LIMITS; scope is the account / API key the limit applies to),
+  sized so no sliding window of the limit's period sees more calls than allowed;
+- throttling responses ("exceeding access rate", HTTP 429) and connection
+  errors are retried with exponential backoff and full jitter;
+- a circuit breaker per (scope, endpoint) opens after repeated failures and
+  fails fast (CircuitOpenError) until a cool-down has passed, then lets one
+  trial call through.
+"""
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+Limit = Tuple[int, float]                    # (calls, period in seconds)
+
+# Published per-API-key limits
+ENDPOINT_LIMITS: Dict[str, Sequence[Limit]] = {
+    # SmartAPI
+    "smartapi.login": [(1, 1.0)],
+    "smartapi.token": [(1, 1.0)],
+    "smartapi.holding": [(1, 1.0)],
+    "smartapi.quote": [(10, 1.0), (500, 60.0), (5000, 3600.0)],
+    "smartapi.ltp": [(10, 1.0), (500, 60.0), (5000, 3600.0)],
+    # Kite Connect
+    "kite.profile": [(10, 1.0)],
+    "kite.holdings": [(10, 1.0)],
+    "kite.quote": [(1, 1.0)],
+}
+THROTTLE_MARKERS = ("exceeding access rate", "too many requests", "rate limit", "429")
+# SDK transport errors worth retrying; matched by name so neither SDK is imported here
+NETWORK_ERRORS = {
+    "requests.exceptions.ConnectionError",   # includes ConnectTimeout
+    "requests.exceptions.Timeout",           # ReadTimeout
+    "kiteconnect.exceptions.NetworkException",
+}
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.25                          # seconds; attempt n waits up to base * 2**n
+BACKOFF_MAX = 8.0
+BREAKER_THRESHOLD = 5                        # consecutive failed calls before opening
+BREAKER_COOLDOWN = 30.0                      # seconds open before a trial call
+
+
+class RateLimited(Exception):
+    """The broker kept throttling the call after every retry."""
+
+
+class CircuitOpenError(Exception):
+    """The endpoint failed repeatedly; calls fail fast until the cool-down passes."""
+
+
+def is_throttled(result) -> bool:
+    """Throttling error or response (SDKs raise for some and return status=False for others)."""
+    if isinstance(result, dict):
+        if result.get("status") is not False:
+            return False
+        text = f"{result.get('message', '')} {result.get('errorcode', '')}"
+    elif isinstance(result, BaseException):
+        text = f"{type(result).__name__} {result}"
+    else:
+        return False
+    text = text.lower()
+    return any(m in text for m in THROTTLE_MARKERS)
+
+
+def is_network_error(error: BaseException) -> bool:
+    """Connection failure or timeout, from the stdlib or from the SDKs' requests transport."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return any(f"{c.__module__}.{c.__qualname__}" in NETWORK_ERRORS for c in type(error).__mro__)
+
+
+class TokenBucket:
+    """
+    Bucket for at most `calls` per `period` in any sliding window: a burst of
+    `capacity` tokens plus refill at (calls - capacity) / period.
+    """
+
+    def __init__(self, calls: int, period: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = max(1, calls // 10)
+        refill = calls - self.capacity if calls > self.capacity else calls
+        self.rate = refill / period
+        self.clock = clock
+        self.tokens = float(self.capacity)
+        self.updated = clock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        self._refill(now)
+        if self.tokens >= 1.0 - 1e-9:            # tolerate float drift in the refill
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1.0
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN,
+                 clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.clock() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True           # exactly one trial call
+                return True
+            return False
+
+    def record(self, ok: bool):
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.failures, self.opened_at = 0, None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = self.clock()  # (re)open; a failed trial restarts the cool-down
+
+
+class RequestScheduler:
+    def __init__(self, limits: Optional[Dict[str, Sequence[Limit]]] = None,
+                 max_retries: int = MAX_RETRIES, backoff_base: float = BACKOFF_BASE,
+                 breaker_threshold: int = BREAKER_THRESHOLD, breaker_cooldown: float = BREAKER_COOLDOWN,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep,
+                 rng: Optional[random.Random] = None):
+        self.limits = ENDPOINT_LIMITS if limits is None else limits
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self._buckets: Dict[Tuple[str, str], List[TokenBucket]] = {}
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._guard = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "rejected": 0}
+
+    def _count(self, name: str):
+        with self._guard:
+            self.stats[name] += 1
+
+    def breaker(self, endpoint: str, scope: str = "") -> CircuitBreaker:
+        key = (scope, endpoint)
+        with self._guard:
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown, self.clock)
+            return self._breakers[key]
+
+    def acquire(self, endpoint: str, scope: str = ""):
+        """Block until every bucket of the endpoint has a token, then take them."""
+        key = (scope, endpoint)
+        with self._guard:
+            if key not in self._buckets:
+                self._buckets[key] = [TokenBucket(n, period, self.clock)
+                                      for n, period in self.limits.get(endpoint, ())]
+                self._locks[key] = threading.Lock()
+            buckets, lock = self._buckets[key], self._locks[key]
+        if not buckets:
+            return
+        while True:
+            with lock:
+                now = self.clock()
+                wait = max(b.wait_time(now) for b in buckets)
+                if wait <= 0:
+                    for b in buckets:
+                        b.take()
+                    return
+            self.sleep(wait)
+
+    def _backoff(self, attempt: int) -> float:
+        return self.rng.uniform(0, min(BACKOFF_MAX, self.backoff_base * 2 ** attempt))
+
+    def call(self, endpoint: str, scope: str, fn: Callable, *args, **kwargs):
+        """
+        fn(*args, **kwargs) within the endpoint's limits. Raises RateLimited when
+        throttling outlasts the retries and CircuitOpenError while the breaker is open;
+        other errors propagate unchanged (after counting against the breaker).
+        """
+        breaker = self.breaker(endpoint, scope)
+        if not breaker.allow():
+            self._count("rejected")
+            raise CircuitOpenError(f"{endpoint} unavailable after repeated failures; retrying later")
+        attempt = 0
+        while True:
+            self.acquire(endpoint, scope)
+            self._count("calls")
+            try:
+                result = fn(*args, **kwargs)
+                error = RateLimited(f"{endpoint} throttled: {result.get('message')}") \
+                    if is_throttled(result) else None
+            except Exception as e:
+                result, error = None, e
+            if error is None:
+                breaker.record(True)
+                return result
+            throttled = is_throttled(error) or isinstance(error, RateLimited)
+            retryable = throttled or is_network_error(error)
+            if throttled:
+                self._count("throttled")
+            if not retryable or attempt >= self.max_retries:
+                breaker.record(False)
+                if throttled and not isinstance(error, RateLimited):
+                    raise RateLimited(f"{endpoint} throttled: {error}") from error
+                raise error
+            delay = self._backoff(attempt)
+            logging.debug("%s %s: %s, retry %d in %.2fs", endpoint, scope, error, attempt + 1, delay)
+            self._count("retries")
+            attempt += 1
+            self.sleep(delay)
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_request_scheduler() -> RequestScheduler:
+    """Process-wide scheduler shared by every broker call (dashboard sessions and the alert runner)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
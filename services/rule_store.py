@@ -0,0 +1,181 @@
+"""
+SQLite-backed alert rule store.
+
+One row per rule (JSON body) in a WAL-mode database so several Streamlit
+sessions can read while one writes. Ids come from AUTOINCREMENT inside the
+insert transaction, and every write bumps a change counter in `meta` so
+sessions reload only when the rules actually changed.
+
+On first use the legacy data/alert_rules.json is imported once (with the
+uni_common -> stock_presence migration applied).
+"""
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional
+
+from utils.helpers import clean_env_value
+
+DEFAULT_DB_PATH = Path("data/alert_rules.db")
+LEGACY_JSON_PATH = Path("data/alert_rules.json")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    body TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', '0');
+"""
+
+
+class RuleDeleted(LookupError):
+    """The rule being edited no longer exists (deleted in another session)."""
+
+
+def migrate_rule(rule: dict) -> dict:
+    """Legacy uni_common/common_in fields -> stock_presence."""
+    r = dict(rule)
+    if "stock_presence" not in r:
+        uc = r.get("uni_common")
+        if uc == "Unique":
+            r["stock_presence"] = "Unique"
+        elif uc == "Common":
+            r["stock_presence"] = "Not Unique"
+        else:
+            r["stock_presence"] = "All"
+    r.pop("uni_common", None)
+    r.pop("common_in", None)
+    return r
+
+
+class RuleStore:
+    def __init__(self, db_path: Path = DEFAULT_DB_PATH, legacy_json: Optional[Path] = LEGACY_JSON_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._tx() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        if legacy_json is not None:
+            self.import_json(legacy_json)
+
+    # ---------- connection ----------
+    @contextmanager
+    def _tx(self):
+        """One short-lived connection per operation; BEGIN IMMEDIATE serializes writers."""
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        try:
+            conn.execute("PRAGMA busy_timeout=10000")
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _write(self):
+        with self._tx() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    # ---------- reads ----------
+    def version(self) -> int:
+        with self._tx() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def list_rules(self) -> List[dict]:
+        """All rules ordered by id."""
+        return self.snapshot()[1]
+
+    def snapshot(self):
+        """(version, rules) read in one transaction so they are consistent."""
+        with self._tx() as conn:
+            conn.execute("BEGIN")
+            version = int(conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0])
+            rows = conn.execute("SELECT id, body FROM rules ORDER BY id").fetchall()
+            conn.execute("COMMIT")
+        return version, [{**json.loads(body), "id": rid} for rid, body in rows]
+
+    # ---------- writes ----------
+    def create(self, rule: dict) -> int:
+        """Insert a new rule and return its id (allocated atomically by SQLite)."""
+        body = {k: v for k, v in rule.items() if k != "id"}
+        with self._write() as conn:
+            cur = conn.execute("INSERT INTO rules (body, updated_at) VALUES (?, ?)",
+                               (json.dumps(body, ensure_ascii=False), time.time()))
+            return int(cur.lastrowid)
+
+    def update(self, rule: dict) -> int:
+        """
+        Replace an existing rule's body. Raises RuleDeleted when the rule is gone,
+        so saving an edit never brings back a rule another session deleted.
+        """
+        rid = int(rule["id"])
+        body = {k: v for k, v in rule.items() if k != "id"}
+        with self._write() as conn:
+            cur = conn.execute("UPDATE rules SET body = ?, updated_at = ? WHERE id = ?",
+                               (json.dumps(body, ensure_ascii=False), time.time(), rid))
+            if cur.rowcount == 0:
+                raise RuleDeleted(f"Rule {rid} was deleted")
+        return rid
+
+    def delete(self, rule_id: int):
+        with self._write() as conn:
+            conn.execute("DELETE FROM rules WHERE id = ?", (int(rule_id),))
+
+    def delete_all(self):
+        with self._write() as conn:
+            conn.execute("DELETE FROM rules")
+
+    # ---------- legacy import ----------
+    def import_json(self, path: Path) -> int:
+        """Import the legacy JSON rules once (ids preserved); returns the number imported."""
+        path = Path(path)
+        with self._tx() as conn:
+            done = conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone()
+        if done or not path.exists():
+            return 0
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logging.error("Could not read legacy rules %s: %s", path, e)
+            return 0
+        rules = [migrate_rule(r) for r in data if isinstance(r, dict)] if isinstance(data, list) else []
+        with self._write() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+                return 0                     # another process won the race
+            for r in rules:
+                body = json.dumps({k: v for k, v in r.items() if k != "id"}, ensure_ascii=False)
+                if r.get("id") is not None:
+                    conn.execute("INSERT OR IGNORE INTO rules (id, body, updated_at) VALUES (?, ?, ?)",
+                                 (int(r["id"]), body, time.time()))
+                else:
+                    conn.execute("INSERT INTO rules (body, updated_at) VALUES (?, ?)", (body, time.time()))
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)", (str(path),))
+        return len(rules)
+
+
+_store: Optional[RuleStore] = None
+_store_lock = threading.Lock()
+
+
+def get_rule_store() -> RuleStore:
+    """Process-wide store at ALERT_RULES_DB (default data/alert_rules.db)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RuleStore(Path(clean_env_value("ALERT_RULES_DB") or DEFAULT_DB_PATH))
+        return _store
@@ -1,70 +1,71 @@
-from SmartApi import SmartConnect
-import pyotp
+import numpy as np
 import pandas as pd
 import streamlit as st
-from kiteconnect import KiteConnect, exceptions
 import logging, traceback, re
-
-def fetch_portfolio(api_key, client_id, mpin, totp_secret):
-    """Fetch live portfolio and CMP from Angel One SmartAPI safely using MPIN."""
+from typing import Optional
+from services.broker_sessions import SessionError, SessionPool, get_session_pool, is_smart_token_error
+from services.quotes import fetch_ltps
+from utils.schema import normalize_holdings
+from utils.timing import span, timed
+
+@timed("angelone.fetch")
+def fetch_portfolio(api_key, client_id, mpin, totp_secret, sessions: Optional[SessionPool] = None):
+    """Fetch live portfolio and CMP from Angel One SmartAPI, reusing the pooled session."""
+    sessions = sessions or get_session_pool()
     try:
-        obj = SmartConnect(api_key=api_key)
-
-        # Generate session with MPIN + TOTP
-        totp = pyotp.TOTP(totp_secret).now()
-        session = obj.generateSession(client_id, mpin, totp)
-
-        if "data" not in session or "jwtToken" not in session["data"]:
-            st.error(f"❌ Login failed: {session}")
-            return pd.DataFrame()
-
+        # Cached JWT until it expires; a refresh or TOTP login only when needed
+        obj = sessions.smart(api_key, client_id, mpin, totp_secret).client
         st.sidebar.success("✅ SmartAPI login successful")
 
-        # Fetch holdings
-        holdings_resp = obj.holding()
+        # Fetch holdings (paced to the endpoint limit, throttled calls retried)
+        sched = sessions.scheduler
+        with span("angelone.holdings"):
+            holdings_resp = sched.call("smartapi.holding", api_key, obj.holding)
+        if is_smart_token_error(holdings_resp):
+            # Session revoked or expired early: log in again once
+            sessions.invalidate_smart(api_key, client_id)
+            obj = sessions.smart(api_key, client_id, mpin, totp_secret).client
+            with span("angelone.holdings"):
+                holdings_resp = sched.call("smartapi.holding", api_key, obj.holding)
         if not holdings_resp or "data" not in holdings_resp or not holdings_resp["data"]:
             st.warning("⚠️ No holdings returned from API")
             return pd.DataFrame()
 
         df = pd.DataFrame(holdings_resp["data"])
 
-        # Standardize + keep token and exchange
-        df.rename(columns={
-            "tradingsymbol": "instrument",
-            "averageprice": "avg_price",
-            "quantity": "qty",
-            "symboltoken": "symboltoken",
-            "exchange": "exchange"
-        }, inplace=True)
-
-        # Fetch CMP for each stock
-        ltps = []
-        for _, row in df.iterrows():
-            try:
-                exch = row.get("exchange", "NSE")
-                token = row.get("symboltoken")
-                if not token:
-                    raise ValueError("Missing symboltoken")
-                ltp_data = obj.ltpData(exch, row["instrument"], token)
-                ltps.append(ltp_data["data"]["ltp"])
-            except Exception as e:
-                st.warning(f"⚠️ Failed LTP for {row['instrument']}: {e}")
-                ltps.append(0)
-
-        df["ltp"] = ltps
-        df["invested"] = df["qty"] * df["avg_price"]
-        df["cur_val"] = df["qty"] * df["ltp"]
-        df["pl"] = df["cur_val"] - df["invested"]
-
-        return df[["instrument", "qty", "avg_price", "ltp", "invested", "cur_val", "pl"]]
-
+        # Fetch CMP in bulk (multi-token requests, bounded single-symbol fallback)
+        if "exchange" not in df.columns:
+            df["exchange"] = "NSE"
+        if "symboltoken" not in df.columns:
+            df["symboltoken"] = None
+        quotes = list(zip(df["exchange"].fillna("NSE"), df["tradingsymbol"], df["symboltoken"]))
+        with span("angelone.ltp"):
+            prices, failed = fetch_ltps(obj, quotes, scheduler=sched, scope=api_key)
+        failed = sorted(set(failed) | {sym for _, sym, token in quotes if not token})
+
+        # A failed quote keeps the holdings response's own LTP, or stays unknown (NaN):
+        # recording 0 would read as a -100% loss and fire loss alerts
+        fallback = (pd.to_numeric(df["ltp"], errors="coerce").where(lambda v: v > 0)
+                    if "ltp" in df.columns else pd.Series(np.nan, index=df.index))
+        df["ltp"] = [prices.get((exch, str(token)), fb) for (exch, _, token), fb in zip(quotes, fallback)]
+        if failed:
+            st.warning(f"⚠️ Failed LTP for {len(failed)} holding(s): {', '.join(failed)}")
+
+        return normalize_holdings(df, broker="AngelOne")
+
+    except SessionError as e:
+        st.error(f"❌ {e}")
+        return pd.DataFrame()
     except Exception as e:
         st.error(f"❌ Portfolio fetch failed: {e}")
         return pd.DataFrame()
 
-def fetch_zerodha_portfolio(api_key: str, api_secret: str, access_token: str):
+@timed("zerodha.fetch")
+def fetch_zerodha_portfolio(api_key: str, api_secret: str, access_token: str,
+                            sessions: Optional[SessionPool] = None):
     """
     Use already-generated access_token (valid for the trading day).
+    The token is validated once per day by the session pool, not on every fetch.
     """
     if not api_key or not access_token:
         logging.error("Zerodha: Missing api_key or access_token.")
@@ -72,24 +73,28 @@ def fetch_zerodha_portfolio(api_key: str, api_secret: str, access_token: str):
 
     api_key = api_key.strip()
     access_token = access_token.strip()
+    sessions = sessions or get_session_pool()
 
     try:
-        kite = KiteConnect(api_key=api_key)
-        kite.set_access_token(access_token)
-
-        # Validate
         try:
-            kite.profile()
-        except exceptions.TokenException as e:
-            logging.error("Zerodha auth failed: %s", e)
+            kite = sessions.kite(api_key, access_token)
+        except SessionError as e:
+            logging.error("%s", e)
             return pd.DataFrame()
 
-        holdings = kite.holdings() or []
+        try:
+            with span("zerodha.holdings"):
+                holdings = sessions.scheduler.call("kite.holdings", api_key, kite.holdings) or []
+        except Exception:
+            # Re-validate the token on the next fetch
+            sessions.invalidate_kite(api_key, access_token)
+            raise
         rows = []
         for h in holdings:
             qty = float(h.get("quantity") or 0)
             avg = float(h.get("average_price") or 0)
-            ltp = float(h.get("last_price") or 0)
+            # No last price: P&L unknown (NaN), not a -100% loss
+            ltp = float(h.get("last_price") or np.nan)
             invested = avg * qty
             pnl_abs = (ltp - avg) * qty
             pnl_pct = ((ltp - avg) / avg * 100) if avg else 0
@@ -101,9 +106,19 @@ def fetch_zerodha_portfolio(api_key: str, api_secret: str, access_token: str):
                 "invested": round(invested, 2),
                 "pnl_abs": round(pnl_abs, 2),
                 "pnl_pct": round(pnl_pct, 2),
+                "exchange": h.get("exchange"),
+                "instrument_token": h.get("instrument_token"),
             })
-        return pd.DataFrame(rows).sort_values("instrument").reset_index(drop=True)
+        df = pd.DataFrame(rows).sort_values("instrument").reset_index(drop=True)
+        return normalize_holdings(df, broker="Zerodha")
     except Exception as e:
         logging.error("Zerodha unexpected error: %s", e)
         traceback.print_exc()
         return pd.DataFrame()
+
+
+# broker -> (holdings fetcher, creds -> fetcher args); shared by the dashboard and the alert runner
+BROKER_FETCHERS = {
+    "AngelOne": (fetch_portfolio, lambda c: (c.api_key, c.client_id, c.mpin, c.totp_secret)),
+    "Zerodha": (fetch_zerodha_portfolio, lambda c: (c.api_key, c.api_secret, c.access_token)),
+}
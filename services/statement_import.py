@@ -0,0 +1,266 @@
+"""
+Bulk import of broker holdings statements (CSV / XLSX) as extra portfolios.
+
+Every file becomes one portfolio named after the file. Headers are detected
+against the canonical column aliases (utils.schema.COLUMN_ALIASES), skipping
+any preamble rows a broker puts above the table. Files are parsed in a thread
+pool: CSV through pandas' pyarrow engine (C engine without pyarrow), XLSX by
+streaming rows with openpyxl in read-only mode.
+
+Parsed frames are cached per file by (mtime, size) and by content hash, so an
+unchanged file is never re-read, a touched-but-identical one is only re-hashed
+and an upload of a file already seen is not parsed again.
+"""
+import csv
+import hashlib
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+from utils.helpers import clean_env_value
+from utils.schema import normalize_holdings, resolve_mapping
+from utils.snapshot import SnapshotCache
+
+try:
+    import pyarrow  # noqa: F401  (only probed: enables pandas' pyarrow CSV engine)
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
+DEFAULT_STATEMENTS_DIR = Path("data/statements")
+STATEMENT_EXTS = (".csv", ".xlsx", ".xlsm")
+HEADER_SCAN_ROWS = 50                        # preamble rows searched for the header
+NUMERIC_FIELDS = ("quantity", "avg_price", "ltp", "invested", "pnl_abs", "pnl_pct")
+
+Source = Union[str, Path, Tuple[str, bytes]]  # path, or (file name, content) for uploads
+
+
+@dataclass
+class ImportResult:
+    portfolios: Dict[str, pd.DataFrame] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)        # file name -> reason
+    sources: Dict[str, str] = field(default_factory=dict)       # portfolio -> parse | cache
+    duration: float = 0.0
+
+
+# ---------- header detection ----------
+def find_header(rows: Iterable[Sequence]) -> Optional[int]:
+    """Index of the first row naming at least an instrument and a quantity column."""
+    for i, row in enumerate(rows):
+        if i >= HEADER_SCAN_ROWS:
+            break
+        cells = tuple(str(c).strip() for c in row if c is not None and str(c).strip())
+        mapping = resolve_mapping(cells)
+        if "instrument" in mapping and "quantity" in mapping:
+            return i
+    return None
+
+
+def _clean_table(df: pd.DataFrame) -> pd.DataFrame:
+    """Strip header whitespace, parse '1,234.50'-style numbers and drop total/blank rows."""
+    df = df.rename(columns=lambda c: str(c).strip())
+    mapping = resolve_mapping(tuple(df.columns))
+    for fld in NUMERIC_FIELDS:
+        col = mapping.get(fld)
+        if col is not None and df[col].dtype == object:
+            df[col] = pd.to_numeric(df[col].astype(str).str.replace(",", "", regex=False).str.strip(),
+                                    errors="coerce")
+    qty = mapping.get("quantity")
+    if qty is not None:
+        df = df[pd.to_numeric(df[qty], errors="coerce").notna()]
+    return df
+
+
+# ---------- readers ----------
+def _read_csv(data: bytes) -> pd.DataFrame:
+    head = data[:64 * 1024].decode("utf-8-sig", errors="replace").splitlines()
+    header = find_header(csv.reader(head))
+    if header is None:
+        raise ValueError("no holdings header found")
+    try:
+        return pd.read_csv(io.BytesIO(data), skiprows=header, engine=CSV_ENGINE, encoding="utf-8-sig")
+    except Exception:
+        if CSV_ENGINE == "c":
+            raise
+        # Ragged trailers (totals, disclaimers) trip the pyarrow parser; the C engine skips them
+        return pd.read_csv(io.BytesIO(data), skiprows=header, encoding="utf-8-sig", on_bad_lines="skip")
+
+
+def _read_xlsx(data: bytes) -> pd.DataFrame:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            rows = ws.iter_rows(values_only=True)
+            preamble = []
+            for row in rows:
+                preamble.append(row)
+                if len(preamble) > HEADER_SCAN_ROWS:
+                    break
+            header = find_header(preamble)
+            if header is None:
+                continue
+            columns = [str(c).strip() if c is not None else f"col{i}" for i, c in enumerate(preamble[header])]
+            body = list(preamble[header + 1:])
+            body.extend(rows)                # stream the rest of the sheet
+            width = len(columns)
+            return pd.DataFrame([list(r[:width]) + [None] * (width - len(r))
+                                 for r in body if any(c is not None for c in r)], columns=columns)
+    finally:
+        wb.close()
+    raise ValueError("no sheet with a holdings header")
+
+
+def parse_statement(data: bytes, name: str, portfolio: Optional[str] = None) -> pd.DataFrame:
+    """One statement file -> canonical holdings frame tagged with the portfolio name."""
+    suffix = Path(name).suffix.lower()
+    if suffix not in STATEMENT_EXTS:
+        raise ValueError(f"unsupported file type {suffix or '(none)'}")
+    raw = _read_xlsx(data) if suffix in (".xlsx", ".xlsm") else _read_csv(data)
+    df = normalize_holdings(_clean_table(raw), broker=portfolio or portfolio_name(name))
+    if df.empty:
+        raise ValueError("no holdings rows")
+    return df
+
+
+def portfolio_name(file_name: str) -> str:
+    return Path(file_name).stem.replace("_", " ").strip() or file_name
+
+
+def statement_files(directory: Union[str, Path]) -> list:
+    root = Path(directory)
+    if not root.is_dir():
+        return []
+    return sorted(p for p in root.iterdir() if p.is_file() and p.suffix.lower() in STATEMENT_EXTS)
+
+
+# ---------- importer ----------
+@dataclass
+class _Parsed:
+    mtime_ns: int
+    size: int
+    digest: str
+    df: Optional[pd.DataFrame]
+    error: str = ""
+
+
+class StatementImporter:
+    """Parses statement batches in parallel with a per-file (mtime, hash) parse cache."""
+
+    def __init__(self, max_workers: int = 8):
+        self.max_workers = max_workers
+        self._by_path: Dict[str, _Parsed] = {}
+        self._by_digest = SnapshotCache(maxsize=64)
+        self._lock = threading.Lock()
+
+    def import_dir(self, directory: Union[str, Path], reserved: Iterable[str] = ()) -> ImportResult:
+        return self.import_files(statement_files(directory), reserved)
+
+    def import_files(self, sources: Sequence[Source], reserved: Iterable[str] = ()) -> ImportResult:
+        """
+        Parse paths and/or (name, bytes) uploads. Portfolio names come from the
+        file names and are suffixed when they clash with `reserved` or each other.
+        """
+        t0 = time.perf_counter()
+        result = ImportResult()
+        taken = set(reserved)
+        named = []
+        for src in sources:
+            file_name = src[0] if isinstance(src, tuple) else Path(src).name
+            base = name = portfolio_name(file_name)
+            n = 2
+            while name in taken:
+                name = f"{base} ({n})"
+                n += 1
+            taken.add(name)
+            named.append((src, file_name, name))
+        if not named:
+            return result
+
+        workers = max(1, min(self.max_workers, len(named)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="statement-import") as pool:
+            outcomes = list(pool.map(lambda item: self._load(*item), named))
+        for (_, file_name, name), (df, source, error) in zip(named, outcomes):
+            if error is not None:
+                result.errors[file_name] = error
+            else:
+                result.portfolios[name] = df
+                result.sources[name] = source
+        result.duration = time.perf_counter() - t0
+        return result
+
+    def _load(self, src: Source, file_name: str, portfolio: str):
+        if isinstance(src, tuple):
+            data = src[1]
+            return self._parse_logged(hashlib.sha1(data).hexdigest(), data, file_name, portfolio)
+        path = Path(src)
+        try:
+            stat = path.stat()
+        except OSError as e:
+            return None, "", str(e)
+        key = str(path.resolve())
+        with self._lock:
+            hit = self._by_path.get(key)
+        if hit is not None and (hit.mtime_ns, hit.size) == (stat.st_mtime_ns, stat.st_size):
+            # Unchanged file: no read at all (failures are remembered too)
+            return (self._tagged(hit.df, portfolio), "cache", None) if hit.df is not None else (None, "", hit.error)
+        try:
+            data = path.read_bytes()
+        except OSError as e:
+            return None, "", str(e)
+        digest = hashlib.sha1(data).hexdigest()
+        df, source, error = self._parse_logged(digest, data, file_name, portfolio)
+        with self._lock:
+            self._by_path[key] = _Parsed(stat.st_mtime_ns, stat.st_size, digest, df, error or "")
+        return df, source, error
+
+    def _parse_logged(self, digest: str, data: bytes, file_name: str, portfolio: str):
+        try:
+            df, source = self._cached_or_parse(digest, data, file_name, portfolio)
+            return df, source, None
+        except Exception as e:
+            logging.warning("Statement import failed for %s: %s", file_name, e)
+            return None, "", str(e)
+
+    def _cached_or_parse(self, digest: str, data: bytes, file_name: str, portfolio: str):
+        df = self._by_digest.get(digest)
+        if df is not None:
+            return self._tagged(df, portfolio), "cache"
+        return self._by_digest.put(digest, parse_statement(data, file_name, portfolio)), "parse"
+
+    @staticmethod
+    def _tagged(df: pd.DataFrame, portfolio: str) -> pd.DataFrame:
+        """Same content under another portfolio name (renamed or duplicated file)."""
+        if df["broker"].cat.categories.tolist() == [portfolio]:
+            return df
+        out = df.copy()
+        out["broker"] = pd.Categorical([portfolio] * len(out))
+        return out
+
+
+_importer: Optional[StatementImporter] = None
+_importer_lock = threading.Lock()
+
+
+def get_statement_importer() -> StatementImporter:
+    global _importer
+    with _importer_lock:
+        if _importer is None:
+            _importer = StatementImporter()
+        return _importer
+
+
+def statements_dir() -> Optional[Path]:
+    """STATEMENTS_DIR (default data/statements); None when set to 'off'."""
+    raw = clean_env_value("STATEMENTS_DIR")
+    if raw.lower() == "off":
+        return None
+    return Path(raw) if raw else DEFAULT_STATEMENTS_DIR
@@ -0,0 +1,271 @@
+"""
+In-process stand-ins for the broker SDK clients.
+Used by the tests (and importable from benchmarks as tests.fakes) to exercise
+the service layer without credentials or network access.
+"""
+import base64
+import json
+import time
+import threading
+
+
+SMARTAPI_RATE_LIMITS = {"generateSession": (1, 1.0), "generateToken": (1, 1.0), "holding": (1, 1.0),
+                        "getMarketData": (10, 1.0), "ltpData": (10, 1.0)}
+
+
+class FakeSmartConnect:
+    """Mimics the SmartConnect calls used by services/smartapi_service.py."""
+
+    def __init__(self, holdings=None, prices=None, latency: float = 0.0,
+                 fail_tokens=(), max_tokens: int = 50, bulk_enabled: bool = True,
+                 session_ttl: float = 3600.0, clock=time.time, rate_limits=None):
+        self.holdings_data = list(holdings or [])
+        self.prices = dict(prices or {})          # symboltoken -> ltp
+        self.latency = latency                    # seconds added to every call
+        self.fail_tokens = set(str(t) for t in fail_tokens)
+        self.max_tokens = max_tokens
+        self.bulk_enabled = bulk_enabled
+        self.session_ttl = session_ttl            # lifetime of issued JWTs (exp claim)
+        self.clock = clock
+        self.jwt = ""
+        self.refresh_ok = True                    # False: generateToken is rejected
+        # method -> (calls, period): enforced like the server, over a sliding window
+        self.rate_limits = dict(rate_limits or {})
+        self._recent = {}
+        self.calls = {}
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _hit(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            limit = self.rate_limits.get(name)
+            if limit is not None:
+                n, period = limit
+                now = time.monotonic()
+                recent = [t for t in self._recent.get(name, []) if now - t < period]
+                if len(recent) >= n:
+                    self._recent[name] = recent
+                    self.throttled += 1
+                    raise Exception("Access denied because of exceeding access rate")
+                self._recent[name] = recent + [now]
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _issue(self):
+        claims = json.dumps({"exp": self.clock() + self.session_ttl}).encode()
+        self.jwt = "Bearer hdr." + base64.urlsafe_b64encode(claims).decode().rstrip("=") + ".sig"
+        return {"status": True, "data": {"jwtToken": self.jwt, "refreshToken": "fake-refresh",
+                                         "feedToken": "fake-feed"}}
+
+    def generateSession(self, client_id, mpin, totp):
+        self._hit("generateSession")
+        return self._issue()
+
+    def generateToken(self, refresh_token):
+        self._hit("generateToken")
+        if not self.refresh_ok or refresh_token != "fake-refresh":
+            return {"status": False, "message": "Invalid refresh token", "errorcode": "AG8002", "data": None}
+        return self._issue()
+
+    def revoke(self):
+        """Invalidate the current JWT server-side (data calls fail with AG8001)."""
+        self.jwt = ""
+
+    def getfeedToken(self):
+        return "fake-feed"
+
+    def holding(self):
+        self._hit("holding")
+        if not self.jwt:
+            return {"status": False, "message": "Invalid Token", "errorcode": "AG8001", "data": None}
+        return {"status": True, "data": self.holdings_data}
+
+    def ltpData(self, exchange, tradingsymbol, symboltoken):
+        self._hit("ltpData")
+        token = str(symboltoken)
+        if token in self.fail_tokens or token not in self.prices:
+            raise Exception(f"No data for {tradingsymbol}")
+        return {"status": True, "data": {"exchange": exchange, "tradingsymbol": tradingsymbol,
+                                         "symboltoken": token, "ltp": self.prices[token]}}
+
+    def getMarketData(self, mode, exchangeTokens):
+        self._hit("getMarketData")
+        if not self.bulk_enabled:
+            raise Exception("Market data endpoint unavailable")
+        tokens = [(exch, str(t)) for exch, toks in exchangeTokens.items() for t in toks]
+        if len(tokens) > self.max_tokens:
+            raise Exception(f"Too many tokens: {len(tokens)} > {self.max_tokens}")
+        fetched, unfetched = [], []
+        for exch, token in tokens:
+            if token in self.fail_tokens or token not in self.prices:
+                unfetched.append({"exchange": exch, "symbolToken": token})
+            else:
+                fetched.append({"exchange": exch, "symbolToken": token, "ltp": self.prices[token]})
+        return {"status": True, "data": {"fetched": fetched, "unfetched": unfetched}}
+
+
+class FakeKiteConnect:
+    """Mimics the KiteConnect calls used by fetch_zerodha_portfolio."""
+
+    def __init__(self, holdings=None, valid_tokens=("fake-access",)):
+        self.holdings_data = list(holdings or [])
+        self.valid_tokens = set(valid_tokens)
+        self.access_token = ""
+        self.calls = {}
+
+    def _hit(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.access_token not in self.valid_tokens:
+            raise PermissionError("Incorrect `api_key` or `access_token`.")
+
+    def set_access_token(self, access_token):
+        self.access_token = access_token
+
+    def profile(self):
+        self._hit("profile")
+        return {"user_id": "FAKE01"}
+
+    def holdings(self):
+        self._hit("holdings")
+        return self.holdings_data
+
+
+def fake_angel_holdings(n: int, exchange: str = "NSE"):
+    """Build n SmartAPI-style holding rows plus a matching token -> price map."""
+    holdings, prices = [], {}
+    for i in range(n):
+        token = str(1000 + i)
+        holdings.append({
+            "tradingsymbol": f"SYM{i:04d}-EQ",
+            "exchange": exchange,
+            "symboltoken": token,
+            "quantity": 10 + i % 7,
+            "averageprice": 100.0 + i,
+        })
+        prices[token] = round(100.0 + i * 1.01, 2)
+    return holdings, prices
+
+
+# ---------- Tick feeds ----------
+class FakeTickServer:
+    """
+    Local tick source for the price stream: a background thread random-walks
+    each subscribed token's price and pushes it to every connected client.
+    """
+
+    def __init__(self, prices=None, interval: float = 0.05, seed: int = 0, step_pct: float = 0.5):
+        import random
+        self.prices = {str(k): float(v) for k, v in (prices or {}).items()}
+        self.interval = interval
+        self.step_pct = step_pct
+        self.ticks_sent = 0
+        self._rng = random.Random(seed)
+        self._clients = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="fake-ticks", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def connect(self, client):
+        with self._lock:
+            self._clients.append(client)
+
+    def disconnect(self, client):
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                clients = list(self._clients)
+            for client in clients:
+                batch = {}
+                for token in client.subscribed:
+                    if token not in self.prices:
+                        continue
+                    move = 1 + self._rng.uniform(-self.step_pct, self.step_pct) / 100.0
+                    self.prices[token] = round(self.prices[token] * move, 2)
+                    batch[token] = self.prices[token]
+                if batch:
+                    self.ticks_sent += len(batch)
+                    client.deliver(batch)
+
+
+class FakeKiteTicker:
+    """KiteTicker stand-in; pass `lambda k, t: FakeKiteTicker(k, t, server)` as ticker_factory."""
+    MODE_LTP = "ltp"
+
+    def __init__(self, api_key, access_token, server: FakeTickServer = None):
+        self.server = server
+        self.subscribed = set()
+        self.on_ticks = self.on_connect = self.on_error = None
+        self._connected = False
+
+    def connect(self, threaded=True):
+        self._connected = True
+        self.server.connect(self)
+        if self.on_connect:
+            self.on_connect(self, {})
+
+    def close(self):
+        self._connected = False
+        self.server.disconnect(self)
+
+    def is_connected(self):
+        return self._connected
+
+    def subscribe(self, tokens):
+        self.subscribed |= {str(t) for t in tokens}
+
+    def set_mode(self, mode, tokens):
+        pass
+
+    def deliver(self, batch):
+        if self.on_ticks:
+            self.on_ticks(self, [{"instrument_token": int(t), "last_price": p} for t, p in batch.items()])
+
+
+class FakeSmartWebSocketV2:
+    """SmartWebSocketV2 stand-in; prices are delivered in paise like the real feed."""
+
+    def __init__(self, auth_token, api_key, client_code, feed_token, server: FakeTickServer = None):
+        self.server = server
+        self.auth_token = auth_token
+        self.feed_token = feed_token
+        self.subscribed = set()
+        self.on_open = self.on_data = self.on_error = self.on_close = None
+
+    def connect(self):
+        self.server.connect(self)
+        if self.on_open:
+            self.on_open(self)
+
+    def close_connection(self):
+        self.server.disconnect(self)
+        if self.on_close:
+            self.on_close(self)
+
+    def drop(self):
+        """Server-side disconnect (e.g. the JWT expired); the client sees on_close."""
+        self.close_connection()
+
+    def subscribe(self, correlation_id, mode, token_list):
+        for group in token_list:
+            self.subscribed |= {str(t) for t in group["tokens"]}
+
+    def deliver(self, batch):
+        if self.on_data:
+            for token, price in batch.items():
+                self.on_data(self, {"token": token, "last_traded_price": int(round(price * 100))})
@@ -0,0 +1,121 @@
+import datetime
+import threading
+
+import pytest
+
+from services import smartapi_service
+from services.broker_sessions import EXPIRY_MARGIN, IST, SessionError, SessionPool, kite_token_expiry
+from tests.fakes import FakeKiteConnect, FakeSmartConnect, fake_angel_holdings
+from services.rate_limit import RequestScheduler
+
+SMART = ("key", "client", "1234", "secret")
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    # 10:00 IST on a trading day
+    return Clock(datetime.datetime(2026, 3, 2, 10, 0, tzinfo=IST).timestamp())
+
+
+def _pool(clock, smart=None, kite=None):
+    return SessionPool(smart_factory=lambda key: smart, kite_factory=lambda key: kite,
+                       totp=lambda secret: "000000", clock=clock,
+                       scheduler=RequestScheduler(limits={}, max_retries=0))
+
+
+def test_jwt_is_reused_until_exp(clock):
+    fake = FakeSmartConnect(clock=clock, session_ttl=3600)
+    pool = _pool(clock, smart=fake)
+
+    first = pool.smart(*SMART)
+    clock.now += 3600 - EXPIRY_MARGIN - 1
+    assert pool.smart(*SMART) is first
+
+    assert fake.calls == {"generateSession": 1}
+    assert pool.stats["login"] == 1 and pool.stats["reuse"] == 1
+
+
+def test_expired_jwt_is_refreshed_before_logging_in(clock):
+    fake = FakeSmartConnect(clock=clock, session_ttl=3600)
+    pool = _pool(clock, smart=fake)
+    first = pool.smart(*SMART)
+
+    clock.now += 3600
+    renewed = pool.smart(*SMART)
+    assert renewed.jwt != first.jwt and renewed.expires_at == clock.now + 3600
+    assert fake.calls == {"generateSession": 1, "generateToken": 1}
+
+    fake.refresh_ok = False
+    clock.now += 3600
+    pool.smart(*SMART)
+    assert fake.calls == {"generateSession": 2, "generateToken": 2}
+    assert pool.stats["refresh"] == 1 and pool.stats["login"] == 2
+
+
+def test_revoked_session_logs_in_again(clock, monkeypatch):
+    holdings, prices = fake_angel_holdings(3)
+    fake = FakeSmartConnect(holdings=holdings, prices=prices, clock=clock)
+    pool = _pool(clock, smart=fake)
+    monkeypatch.setattr(smartapi_service.st, "warning", lambda *a: None)
+
+    assert len(smartapi_service.fetch_portfolio(*SMART, sessions=pool)) == 3
+    fake.revoke()                            # next holding() answers AG8001
+    assert len(smartapi_service.fetch_portfolio(*SMART, sessions=pool)) == 3
+
+    assert fake.calls["generateSession"] == 2 and fake.calls["holding"] == 3
+
+
+def test_failed_login_raises_session_error(clock):
+    class Refusing(FakeSmartConnect):
+        def generateSession(self, client_id, mpin, totp):
+            return {"status": False, "message": "Invalid totp", "errorcode": "AB1050", "data": None}
+
+    with pytest.raises(SessionError):
+        _pool(clock, smart=Refusing(clock=clock)).smart(*SMART)
+
+
+def test_kite_profile_is_checked_once_per_day(clock):
+    fake = FakeKiteConnect(valid_tokens=("day-1",))
+    pool = _pool(clock, kite=fake)
+
+    assert pool.kite("key", "day-1") is pool.kite("key", "day-1")
+    clock.now += 3 * 3600
+    pool.kite("key", "day-1")
+    assert fake.calls == {"profile": 1}
+
+    clock.now = kite_token_expiry(clock.now)   # 06:00 IST next day: validated again
+    pool.kite("key", "day-1")
+    assert fake.calls == {"profile": 2}
+
+
+def test_rejected_kite_token_raises_session_error(clock):
+    with pytest.raises(SessionError):
+        _pool(clock, kite=FakeKiteConnect(valid_tokens=())).kite("key", "stale")
+
+
+def test_concurrent_callers_share_one_login(clock):
+    fake = FakeSmartConnect(clock=clock, latency=0.05)
+    pool = _pool(clock, smart=fake)
+    barrier = threading.Barrier(8)
+    sessions = []
+
+    def worker():
+        barrier.wait()
+        sessions.append(pool.smart(*SMART))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert fake.calls == {"generateSession": 1}
+    assert len({id(s) for s in sessions}) == 1
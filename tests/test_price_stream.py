@@ -0,0 +1,186 @@
+import time
+
+import pandas as pd
+import pytest
+
+from modules.auth import ZerodhaCreds
+from tests.fakes import FakeKiteTicker, FakeSmartWebSocketV2, FakeTickServer
+from services.price_stream import KiteFeed, PriceStream, SmartFeed, account_feed_factory
+from utils.schema import apply_live_prices, normalize_holdings
+
+
+def _wait_for(cond, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def server():
+    srv = FakeTickServer({"101": 100.0, "202": 50.0, "303": 10.0}, interval=0.01).start()
+    yield srv
+    srv.stop()
+
+
+@pytest.fixture
+def zerodha():
+    return normalize_holdings(pd.DataFrame({
+        "tradingsymbol": ["A", "B"], "quantity": [1, 2], "average_price": [90.0, 60.0],
+        "last_price": [100.0, 50.0], "instrument_token": [101, 202], "exchange": ["NSE", "NSE"],
+    }), broker="Zerodha")
+
+
+@pytest.fixture
+def angel():
+    return normalize_holdings(pd.DataFrame({
+        "tradingsymbol": ["C-EQ"], "quantity": [5], "averageprice": [9.0], "ltp": [10.0],
+        "symboltoken": ["303"], "exchange": ["NSE"],
+    }), broker="AngelOne")
+
+
+def _kite_factory(server):
+    return lambda table: KiteFeed("key", "token", table,
+                                  ticker_factory=lambda k, t: FakeKiteTicker(k, t, server))
+
+
+def _smart_factory(server, sockets, tokens=None):
+    tokens = iter(tokens or ["jwt"] * 10)
+
+    def ws(*args):
+        sockets.append(FakeSmartWebSocketV2(*args, server=server))
+        return sockets[-1]
+    return lambda table: SmartFeed("key", "client", table, lambda: (next(tokens), "feed"),
+                                   ws_factory=ws, reconnect_delay=0.01)
+
+
+def test_kite_ticks_reach_the_holdings(server, zerodha):
+    stream = PriceStream(start_async=False)
+    stream.track("Zerodha", zerodha, _kite_factory(server))
+    try:
+        assert stream.is_streaming("Zerodha")
+        assert _wait_for(lambda: len(stream.table.prices("Zerodha")) == 2)
+    finally:
+        stream.stop()
+    server.stop()
+    prices = stream.table.prices("Zerodha")
+    assert prices == {"101": server.prices["101"], "202": server.prices["202"]}
+
+    live = apply_live_prices(zerodha, prices)
+    assert list(live["ltp"]) == [prices["101"], prices["202"]]
+    assert live["pnl_pct"].iloc[0] == round((prices["101"] - 90.0) / 90.0 * 100, 2)
+
+
+def test_smart_ticks_arrive_in_rupees(server, angel):
+    stream = PriceStream(start_async=False)
+    stream.track("AngelOne", angel, _smart_factory(server, []))
+    try:
+        assert _wait_for(lambda: "303" in stream.table.prices("AngelOne"))
+    finally:
+        stream.stop()
+    server.stop()
+    assert stream.table.prices("AngelOne")["303"] == server.prices["303"]
+
+
+def test_live_price_without_a_percentage_keeps_the_fetched_one():
+    df = normalize_holdings(pd.DataFrame({
+        "tradingsymbol": ["A", "B"], "quantity": [1, 1], "average_price": [None, 10.0],
+        "last_price": [5.0, 10.0], "pnl_pct": [12.5, 0.0], "instrument_token": [101, 202],
+    }), broker="Zerodha")
+    fetched = df["pnl_pct"].iloc[0]
+
+    live = apply_live_prices(df, {"101": 6.0, "202": 11.0})
+
+    assert live["pnl_pct"].iloc[0] == fetched and live["ltp"].iloc[0] == 6.0
+    assert live["pnl_pct"].iloc[1] == 10.0
+
+
+def test_only_ticks_after_the_fetch_are_joined(server, zerodha):
+    stream = PriceStream(start_async=False)
+    stream.track("Zerodha", zerodha, _kite_factory(server))
+    try:
+        assert _wait_for(lambda: stream.table.prices("Zerodha"))
+        assert stream.table.prices("Zerodha", since=time.time() + 60) == {}
+    finally:
+        stream.stop()
+    assert apply_live_prices(zerodha, {}) is zerodha
+
+
+def test_feed_start_runs_off_the_caller_thread(server, zerodha):
+    started = []
+
+    def slow_factory(table):
+        time.sleep(0.2)
+        started.append(True)
+        return _kite_factory(server)(table)
+
+    stream = PriceStream()
+    t0 = time.perf_counter()
+    stream.track("Zerodha", zerodha, slow_factory)
+    try:
+        assert time.perf_counter() - t0 < 0.1
+        assert not stream.is_streaming("Zerodha")
+        assert _wait_for(lambda: stream.is_streaming("Zerodha"))
+        # Tokens requested while the feed was starting are subscribed once it is up
+        assert _wait_for(lambda: len(stream.table.prices("Zerodha")) == 2)
+    finally:
+        stream.stop()
+    assert started == [True]
+
+
+def test_failed_start_is_retried_after_backoff(server, zerodha):
+    now = [0.0]
+    attempts = []
+
+    def flaky(table):
+        attempts.append(now[0])
+        if len(attempts) == 1:
+            raise ConnectionError("handshake failed")
+        return _kite_factory(server)(table)
+
+    stream = PriceStream(clock=lambda: now[0], start_async=False)
+    stream.track("Zerodha", zerodha, flaky)
+    stream.track("Zerodha", zerodha, flaky)   # still backing off
+    assert attempts == [0.0] and not stream.is_streaming("Zerodha")
+
+    now[0] = 31.0
+    stream.track("Zerodha", zerodha, flaky)
+    try:
+        assert attempts == [0.0, 31.0] and stream.is_streaming("Zerodha")
+    finally:
+        stream.stop()
+
+
+def test_smart_feed_reconnects_with_a_fresh_token(server, angel):
+    sockets = []
+    stream = PriceStream(start_async=False)
+    stream.track("AngelOne", angel, _smart_factory(server, sockets, tokens=["jwt-1", "jwt-2"]))
+    try:
+        assert _wait_for(lambda: sockets and sockets[0].subscribed == {"303"})
+        sockets[0].drop()
+        assert _wait_for(lambda: len(sockets) == 2 and sockets[1].subscribed == {"303"})
+    finally:
+        stream.stop()
+    assert [ws.auth_token for ws in sockets] == ["jwt-1", "jwt-2"]
+
+
+def test_same_broker_accounts_stream_under_their_own_names(server, zerodha):
+    stream = PriceStream(start_async=False)
+    tickers = lambda k, t: FakeKiteTicker(k, t, server)
+    for name in ("Zerodha", "Mom Zerodha"):
+        creds = ZerodhaCreds(api_key="key", api_secret="", access_token=f"token-{name}")
+        stream.track(name, zerodha, account_feed_factory("Zerodha", name, creds, ticker_factory=tickers))
+    try:
+        assert stream.is_streaming("Zerodha") and stream.is_streaming("Mom Zerodha")
+        assert _wait_for(lambda: len(stream.table.prices("Mom Zerodha")) == 2
+                         and len(stream.table.prices("Zerodha")) == 2)
+    finally:
+        stream.stop()
+    assert set(stream.table.prices("Mom Zerodha")) == {"101", "202"}
+
+
+def test_accounts_without_streaming_credentials_get_no_feed():
+    creds = ZerodhaCreds(api_key="key", api_secret="", access_token="")
+    assert account_feed_factory("Zerodha", "Zerodha", creds) is None
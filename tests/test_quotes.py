@@ -0,0 +1,116 @@
+import math
+import time
+
+from services import smartapi_service
+from services.broker_sessions import SessionPool
+from tests.fakes import FakeSmartConnect, fake_angel_holdings
+from services.quotes import fetch_ltps
+from services.rate_limit import RequestScheduler
+
+
+def _unpaced():
+    return RequestScheduler(limits={}, max_retries=0)
+
+
+def _quotes(holdings):
+    return [(h["exchange"], h["tradingsymbol"], h["symboltoken"]) for h in holdings]
+
+
+class _PartialBulk(FakeSmartConnect):
+    """getMarketData reports some tokens as unfetched while ltpData still prices them."""
+
+    def __init__(self, *args, unfetched=(), **kw):
+        super().__init__(*args, **kw)
+        self.unfetched = set(unfetched)
+
+    def getMarketData(self, mode, exchangeTokens):
+        resp = super().getMarketData(mode, exchangeTokens)
+        data = resp["data"]
+        moved = [f for f in data["fetched"] if f["symbolToken"] in self.unfetched]
+        data["fetched"] = [f for f in data["fetched"] if f["symbolToken"] not in self.unfetched]
+        data["unfetched"] += [{"exchange": f["exchange"], "symbolToken": f["symbolToken"]} for f in moved]
+        return resp
+
+
+def test_bulk_requests_are_chunked_to_50_tokens():
+    holdings, prices = fake_angel_holdings(120)
+    fake = FakeSmartConnect(prices=prices, max_tokens=50)
+
+    got, failed = fetch_ltps(fake, _quotes(holdings), scheduler=_unpaced())
+
+    assert fake.calls == {"getMarketData": 3}
+    assert failed == []
+    assert got == {("NSE", tok): ltp for tok, ltp in prices.items()}
+
+
+def test_bulk_time_scales_with_chunks_not_symbols():
+    latency = 0.05
+
+    def elapsed(n, chunk_size):
+        holdings, prices = fake_angel_holdings(n)
+        fake = FakeSmartConnect(prices=prices, latency=latency)
+        t0 = time.perf_counter()
+        got, _ = fetch_ltps(fake, _quotes(holdings), chunk_size=chunk_size, max_workers=1, scheduler=_unpaced())
+        assert len(got) == n and fake.calls == {"getMarketData": 4}
+        return time.perf_counter() - t0
+
+    few, many = elapsed(20, 5), elapsed(200, 50)      # four sequential calls each
+    assert 4 * latency <= few < 6 * latency
+    assert 4 * latency <= many < 6 * latency
+
+
+def test_unfetched_tokens_fall_back_to_single_quotes():
+    holdings, prices = fake_angel_holdings(60)
+    fake = _PartialBulk(prices=prices, unfetched={"1003", "1042"})
+
+    got, failed = fetch_ltps(fake, _quotes(holdings), scheduler=_unpaced())
+
+    assert fake.calls == {"getMarketData": 2, "ltpData": 2}
+    assert failed == []
+    assert got[("NSE", "1003")] == prices["1003"] and got[("NSE", "1042")] == prices["1042"]
+
+
+def test_failed_symbols_are_reported_and_left_unpriced():
+    holdings, prices = fake_angel_holdings(10)
+    fake = FakeSmartConnect(prices=prices, fail_tokens={"1002", "1007"})
+
+    got, failed = fetch_ltps(fake, _quotes(holdings), scheduler=_unpaced())
+
+    assert failed == ["SYM0002-EQ", "SYM0007-EQ"]
+    assert ("NSE", "1002") not in got and len(got) == 8
+
+
+def test_portfolio_fetch_summarizes_failed_symbols(monkeypatch):
+    holdings, prices = fake_angel_holdings(5)
+    holdings[1]["ltp"] = 250.0               # the holdings response's own price is the fallback
+    fake = FakeSmartConnect(holdings=holdings, prices=prices, fail_tokens={"1001", "1003"})
+    sched = _unpaced()
+    pool = SessionPool(smart_factory=lambda key: fake, totp=lambda secret: "000000", scheduler=sched)
+    warnings = []
+    monkeypatch.setattr(smartapi_service.st, "warning", warnings.append)
+
+    df = smartapi_service.fetch_portfolio("key", "client", "1234", "secret", sessions=pool)
+
+    assert warnings == ["⚠️ Failed LTP for 2 holding(s): SYM0001-EQ, SYM0003-EQ"]
+    ltp = dict(zip(df["instrument"].astype(str), df["ltp"]))
+    assert ltp["SYM0001-EQ"] == 250.0
+    assert math.isnan(ltp["SYM0003-EQ"])
+    assert ltp["SYM0000-EQ"] == prices["1000"]
+
+
+def test_bulk_disabled_uses_single_quotes_only():
+    holdings, prices = fake_angel_holdings(12)
+    fake = FakeSmartConnect(prices=prices, bulk_enabled=False)
+
+    got, failed = fetch_ltps(fake, _quotes(holdings), scheduler=_unpaced())
+
+    assert fake.calls["ltpData"] == 12
+    assert failed == []
+    assert len(got) == 12
+
+
+def test_holdings_without_tokens_are_skipped():
+    fake = FakeSmartConnect(prices={"1": 10.0})
+    got, failed = fetch_ltps(fake, [("NSE", "A-EQ", None), (None, "B-EQ", "1")], scheduler=_unpaced())
+    assert got == {("NSE", "1"): 10.0} and failed == []
+    assert fake.calls == {"getMarketData": 1}
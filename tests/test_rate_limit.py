@@ -0,0 +1,150 @@
+import bisect
+import math
+
+import pytest
+
+from tests.fakes import SMARTAPI_RATE_LIMITS, FakeSmartConnect, fake_angel_holdings
+from services.quotes import fetch_ltps
+from services.rate_limit import (ENDPOINT_LIMITS, CircuitBreaker, CircuitOpenError, RateLimited,
+                                 RequestScheduler, TokenBucket, is_network_error)
+
+
+class FakeTime:
+    """Clock and sleep for the scheduler: sleeping just advances the clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def clock(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+def _max_in_window(stamps, period):
+    """Most calls in any window [t, t + period) starting at a call."""
+    return max(bisect.bisect_left(stamps, t + period) - i for i, t in enumerate(stamps))
+
+
+@pytest.mark.parametrize("endpoint", ["smartapi.quote", "smartapi.holding", "kite.quote"])
+def test_calls_stay_within_every_sliding_window(endpoint):
+    t = FakeTime()
+    sched = RequestScheduler(clock=t.clock, sleep=t.sleep)
+    stamps = []
+    for _ in range(1200):
+        sched.acquire(endpoint, "key")
+        stamps.append(t.now)
+    for calls, period in ENDPOINT_LIMITS[endpoint]:
+        assert _max_in_window(stamps, period) <= calls
+
+
+def test_token_bucket_burst_and_refill():
+    t = FakeTime()
+    bucket = TokenBucket(10, 1.0, clock=t.clock)
+    assert bucket.capacity == 1 and bucket.rate == 9.0
+    assert bucket.wait_time(t.now) == 0.0
+    bucket.take()
+    assert bucket.wait_time(t.now) == pytest.approx(1 / 9)
+    t.now += 1 / 9
+    assert bucket.wait_time(t.now) == 0.0
+
+
+def test_breaker_opens_then_half_opens_then_closes():
+    t = FakeTime()
+    breaker = CircuitBreaker(threshold=2, cooldown=10.0, clock=t.clock)
+    breaker.record(False)
+    assert breaker.state == "closed"
+    breaker.record(False)
+    assert breaker.state == "open" and not breaker.allow()
+
+    t.now += 10.0
+    assert breaker.state == "half-open"
+    assert breaker.allow() and not breaker.allow()      # a single trial call
+    breaker.record(True)
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker():
+    t = FakeTime()
+    breaker = CircuitBreaker(threshold=1, cooldown=5.0, clock=t.clock)
+    breaker.record(False)
+    t.now += 5.0
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open"
+    t.now += 4.9
+    assert not breaker.allow()
+
+
+def test_scheduler_fails_fast_while_open():
+    t = FakeTime()
+    sched = RequestScheduler(limits={}, breaker_threshold=2, breaker_cooldown=30.0,
+                             clock=t.clock, sleep=t.sleep)
+
+    def broken():
+        raise ValueError("bad response")
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            sched.call("smartapi.ltp", "key", broken)
+    with pytest.raises(CircuitOpenError):
+        sched.call("smartapi.ltp", "key", broken)
+    assert sched.stats["rejected"] == 1
+
+    t.now += 30.0
+    assert sched.call("smartapi.ltp", "key", lambda: "ok") == "ok"
+    assert sched.breaker("smartapi.ltp", "key").state == "closed"
+
+
+def test_throttled_responses_are_retried_then_raise():
+    t = FakeTime()
+    sched = RequestScheduler(limits={}, max_retries=2, clock=t.clock, sleep=t.sleep)
+    replies = iter([{"status": False, "message": "Access denied because of exceeding access rate"},
+                    {"status": True, "data": 1}])
+    assert sched.call("smartapi.quote", "key", lambda: next(replies)) == {"status": True, "data": 1}
+    assert sched.stats["retries"] == 1
+
+    with pytest.raises(RateLimited):
+        sched.call("smartapi.quote", "key", lambda: {"status": False, "message": "Too many requests"})
+    assert sched.stats["throttled"] == 4
+
+
+def test_sdk_network_errors_are_retried():
+    requests = pytest.importorskip("requests")
+    t = FakeTime()
+    sched = RequestScheduler(limits={}, clock=t.clock, sleep=t.sleep)
+    errors = iter([requests.exceptions.ConnectionError("reset"), requests.exceptions.ReadTimeout("slow")])
+
+    def flaky():
+        err = next(errors, None)
+        if err is not None:
+            raise err
+        return "ok"
+
+    assert sched.call("kite.holdings", "key", flaky) == "ok"
+    assert sched.stats["retries"] == 2
+    assert is_network_error(requests.exceptions.ConnectTimeout()) and not is_network_error(ValueError())
+
+
+def test_paced_quotes_are_never_throttled_by_the_broker():
+    holdings, prices = fake_angel_holdings(150)
+    quotes = [(h["exchange"], h["tradingsymbol"], h["symboltoken"]) for h in holdings]
+    fake = FakeSmartConnect(prices=prices, latency=0.01, rate_limits=SMARTAPI_RATE_LIMITS)
+
+    got, failed = fetch_ltps(fake, quotes, chunk_size=5, scheduler=RequestScheduler(), scope="key")
+
+    assert fake.throttled == 0
+    assert failed == []
+    assert len(got) == 150 and not any(math.isnan(v) for v in got.values())
+
+
+def test_unpaced_bursts_are_throttled_by_the_fake_broker():
+    holdings, prices = fake_angel_holdings(150)
+    quotes = [(h["exchange"], h["tradingsymbol"], h["symboltoken"]) for h in holdings]
+    fake = FakeSmartConnect(prices=prices, latency=0.01, rate_limits=SMARTAPI_RATE_LIMITS)
+
+    _, failed = fetch_ltps(fake, quotes, chunk_size=5, scheduler=RequestScheduler(limits={}, max_retries=0),
+                           scope="key")
+
+    assert fake.throttled > 0 and failed
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from utils.snapshot import SnapshotCache, snapshot_key
+
+PRICE_COLS = ("ltp", "current_price", "last_price", "close")
+
+
+@dataclass(frozen=True)
+class Headroom:
+    cur_inv: float
+    max_inv: float
+    remaining: float
+    exceed: bool
+
+
+@dataclass(frozen=True)
+class HoldingDetail:
+    avg_price: float
+    curr_price: float
+    pnl_pct: float
+
+
+@dataclass
+class PortfolioAggregates:
+    """Per-snapshot lookups for the Alerts tab instrument cards."""
+    max_inv_pct: float
+    total_cap: Dict[str, float] = field(default_factory=dict)                  # portfolios with invested data
+    invested: Dict[Tuple[str, str], float] = field(default_factory=dict)       # (portfolio, instrument) -> sum
+    details: Dict[Tuple[str, str], HoldingDetail] = field(default_factory=dict)  # first row per pair
+
+    def max_inv(self, portfolio: str) -> float:
+        total = self.total_cap.get(portfolio, 0.0)
+        return total * self.max_inv_pct if total > 0 else 0.0
+
+    def headroom(self, portfolio: str, instrument: str) -> Optional[Headroom]:
+        if portfolio not in self.total_cap:
+            return None
+        max_inv = self.max_inv(portfolio)
+        cur_inv = self.invested.get((portfolio, instrument), 0.0)
+        return Headroom(cur_inv, max_inv, max_inv - cur_inv, (max_inv > 0) and (cur_inv > max_inv))
+
+    def detail(self, portfolio: str, instrument: str) -> Optional[HoldingDetail]:
+        return self.details.get((portfolio, instrument))
+
+
+def _add_portfolio(agg: PortfolioAggregates, p: str, df: pd.DataFrame):
+    if df is None or df.empty or "instrument" not in df.columns:
+        return
+    if "invested" in df.columns:
+        invested = df["invested"]
+    elif {"quantity", "avg_price"}.issubset(df.columns):
+        invested = df["quantity"] * df["avg_price"]
+    else:
+        invested = None
+
+    if invested is not None:
+        agg.total_cap[p] = float(invested.sum())
+        sums = invested.groupby(df["instrument"], sort=False, observed=True).sum()
+        agg.invested.update({(p, inst): float(v) for inst, v in sums.items()})
+
+    first = df.drop_duplicates("instrument", keep="first")
+    n = len(first)
+    avg = first["avg_price"].to_numpy(dtype=float) if "avg_price" in first.columns else np.zeros(n)
+    price_cols = [c for c in PRICE_COLS if c in first.columns]
+    curr = (first[price_cols].astype(float).bfill(axis=1).iloc[:, 0].to_numpy()
+            if price_cols else np.full(n, np.nan))
+    pnl = first["pnl_pct"].to_numpy(dtype=float) if "pnl_pct" in first.columns else np.full(n, np.nan)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # No price column: derive from pnl_pct, else fall back to the average price
+        curr = np.where(np.isnan(curr) & ~np.isnan(pnl) & (avg != 0), avg * (1 + pnl / 100.0), curr)
+        curr = np.where(np.isnan(curr), avg, curr)
+        pnl = np.where(np.isnan(pnl), np.where(avg != 0, (curr - avg) / avg * 100.0, 0.0), pnl)
+
+    agg.details.update({
+        (p, inst): HoldingDetail(a, c, q)
+        for inst, a, c, q in zip(first["instrument"].tolist(), avg.tolist(), curr.tolist(), pnl.tolist())
+    })
+
+
+_AGGREGATES = SnapshotCache(maxsize=4)
+
+
+def build_aggregates(valid_dfs: Dict[str, pd.DataFrame], max_inv_pct: float) -> PortfolioAggregates:
+    """Total capital, per-holding invested/avg/ltp/pnl and MAX_INV_PCT headroom, cached per snapshot."""
+    def _build():
+        agg = PortfolioAggregates(max_inv_pct=max_inv_pct)
+        for p, df in valid_dfs.items():
+            _add_portfolio(agg, p, df)
+        return agg
+    return _AGGREGATES.get_or_compute((snapshot_key(valid_dfs), max_inv_pct), _build)
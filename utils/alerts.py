@@ -1,5 +1,20 @@
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
 import pandas as pd
-from typing import Dict, List
+
+from utils.presence import presence_index
+from utils.snapshot import SnapshotCache, snapshot_key
+from utils.timing import span, timed
+
+ALERT_COLUMNS = ["instrument", "portfolio", "rule", "message"]
+COMPARATORS = {"Greater Than", "Less Than", "Range"}
+DIRECTIONS = {"Profit", "Loss", "Unchanged", ""}
+UNCHANGED_TOL = 0.0001
 
 
 def _value_matches(comp: str, val: float, from_v: float, to_v: float) -> bool:
@@ -15,202 +30,376 @@ def _value_matches(comp: str, val: float, from_v: float, to_v: float) -> bool:
     return True
 
 
-def generate_alerts(valid_dfs: Dict[str, pd.DataFrame], alert_rules: List[dict]) -> pd.DataFrame:
-    if not valid_dfs or not alert_rules:
-        return pd.DataFrame(columns=["instrument", "portfolio", "rule", "message"])
+def _values_match(comp: str, vals: np.ndarray, from_v: float, to_v: float) -> np.ndarray:
+    """Array form of _value_matches (NaN never matches a comparator)."""
+    with np.errstate(invalid="ignore"):
+        if comp == "Greater Than":
+            return vals >= from_v
+        if comp == "Less Than":
+            return vals <= from_v
+        if comp == "Range":
+            lo, hi = sorted([from_v, to_v])
+            return (vals >= lo) & (vals <= hi)
+    return np.ones(len(vals), dtype=bool)
 
-    # Ensure invested column
-    prepared: Dict[str, pd.DataFrame] = {}
-    for p, df in valid_dfs.items():
-        if df is None or df.empty:
-            prepared[p] = df
-            continue
-        if "invested" not in df.columns and {"quantity", "avg_price"}.issubset(df.columns):
-            tmp = df.copy()
-            tmp["invested"] = tmp["quantity"] * tmp["avg_price"]
-            prepared[p] = tmp
-        else:
-            prepared[p] = df
-
-    all_ports = list(prepared.keys())
-    records = []
-
-    for rule in alert_rules:
-        # Extract rule fields with defaults
-        applied = rule.get("applied_to") or all_ports
-        applied = [p for p in applied if p in prepared and prepared[p] is not None and not prepared[p].empty]
-        if not applied:
-            continue
 
-        direction = rule.get("profit_loss", "")
-        pl_comp = rule.get("pl_comp", "")
-        pl_from = float(rule.get("pl_from", 0) or 0)
-        pl_to = float(rule.get("pl_to", pl_from) or pl_from)
-        pl_basis = rule.get("pl_basis", "Per Portfolio")  # Per Portfolio | Total Avg
+class HoldingsFrame:
+    """
+    Long-format view of all portfolios built once per evaluation:
+    one row per holding with integer instrument / portfolio codes and the
+    numeric columns the rules test, plus the snapshot's shared instrument x
+    portfolio presence index (utils.presence).
+    """
 
-        inv_comp = rule.get("inv_comp", "")
-        inv_from = float(rule.get("inv_from", 0) or 0)
-        inv_to = float(rule.get("inv_to", inv_from) or inv_from)
-        inv_level = rule.get("inv_level", "Per Stock")  # Per Portfolio | Per Stock
+    def __init__(self, valid_dfs: Dict[str, pd.DataFrame]):
+        self.ports: List[str] = []
+        totals, has_inv, has_pnl = [], [], []
+        parts = []
+        for p, df in valid_dfs.items():
+            if df is None or df.empty or "instrument" not in df.columns:
+                continue
+            code = len(self.ports)
+            self.ports.append(p)
+            if "invested" in df.columns:
+                invested = pd.to_numeric(df["invested"], errors="coerce")
+            elif {"quantity", "avg_price"}.issubset(df.columns):
+                invested = df["quantity"] * df["avg_price"]
+            else:
+                invested = None
+            totals.append(float(invested.sum()) if invested is not None else 0.0)
+            has_inv.append(invested is not None)
+            has_pnl.append("pnl_pct" in df.columns)
+            part = pd.DataFrame({
+                "instrument": df["instrument"].to_numpy(),
+                "port": code,
+                "pnl_pct": pd.to_numeric(df["pnl_pct"], errors="coerce").to_numpy(dtype=float)
+                if "pnl_pct" in df.columns else np.nan,
+                "invested": invested.to_numpy(dtype=float) if invested is not None else np.nan,
+                "avg_price": pd.to_numeric(df["avg_price"], errors="coerce").to_numpy(dtype=float)
+                if "avg_price" in df.columns else np.nan,
+                "token": df["token"].astype(object).to_numpy() if "token" in df.columns else None,
+            })
+            parts.append(part[part["instrument"].notna()])
 
-        presence = rule.get("stock_presence", "All")  # Unique | Not Unique | All
-        rule_name = rule.get("name") or f"Rule {rule.get('id', '')}"
-        message = rule.get("message") or ""
+        self.n_ports = len(self.ports)
+        self.port_totals = np.asarray(totals, dtype=float)
+        self.port_has_inv = np.asarray(has_inv, dtype=bool)
+        self.port_has_pnl = np.asarray(has_pnl, dtype=bool)
+        # Portfolio codes ranked by name, for the final sort
+        self.port_rank = np.argsort(np.argsort(np.asarray(self.ports, dtype=object)))
 
-        # Basic direction validity
-        if direction not in {"Profit", "Loss", "Unchanged", ""}:
-            continue
-        # If direction requires comparator ensure provided
-        if direction and direction != "Unchanged" and pl_comp not in {"Greater Than", "Less Than", "Range"}:
-            # allow empty comparator => treat as pass (skip threshold)
-            pass
+        long_df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(
+            {"instrument": [], "port": [], "pnl_pct": [], "invested": [], "avg_price": [], "token": []})
+        # Instrument codes and presence come from the snapshot's shared index
+        self.index = presence_index(valid_dfs)
+        self.instruments = self.index.instruments
+        self.n_inst = len(self.instruments)
+        self.inst = long_df["instrument"].map(self.index.inst_code).to_numpy(dtype=np.int64)
+        self.port = long_df["port"].to_numpy(dtype=np.int64)
+        self.pnl = long_df["pnl_pct"].to_numpy(dtype=float)
+        self.abs_pnl = np.abs(self.pnl)
+        self.invested = long_df["invested"].to_numpy(dtype=float)
+        self.avg_price = long_df["avg_price"].to_numpy(dtype=float)
+        self.token = long_df["token"].to_numpy(dtype=object)
+        self.row_has_inv = self.port_has_inv[self.port] if len(self.port) else np.zeros(0, dtype=bool)
+        self.row_has_pnl = self.port_has_pnl[self.port] if len(self.port) else np.zeros(0, dtype=bool)
 
-        # ---------- Investment gating (Per Portfolio) ----------
-        if inv_level == "Per Portfolio" and inv_comp in {"Greater Than", "Less Than", "Range"}:
-            passing_ports = []
-            for p in applied:
-                dfp = prepared[p]
-                total_inv = float(dfp["invested"].sum()) if "invested" in dfp.columns else 0.0
-                if _value_matches(inv_comp, total_inv, inv_from, inv_to):
-                    passing_ports.append(p)
-            if not passing_ports:
-                continue
-            target_ports = passing_ports
-        else:
-            target_ports = applied
+        # Index column of each portfolio here (the index also spans empty frames)
+        self.index_cols = np.asarray([self.index.port_code[p] for p in self.ports], dtype=np.int64)
+        self.presence = self.index.matrix[:, self.index_cols]
 
-        if not target_ports:
-            continue
+        with np.errstate(invalid="ignore"):
+            self.direction_masks = {
+                "Profit": self.row_has_pnl & (self.pnl > 0),
+                "Loss": self.row_has_pnl & (self.pnl < 0),
+                "Unchanged": self.row_has_pnl & (self.abs_pnl <= UNCHANGED_TOL),
+                "": self.row_has_pnl.copy(),
+            }
+        self._base_masks = {}
 
-        # ---------- Build instrument -> portfolios map for presence filtering ----------
-        inst_port_map = {}
-        for p in target_ports:
-            dfp = prepared[p]
-            if dfp is None or dfp.empty or "instrument" not in dfp.columns:
-                continue
-            for sym in dfp["instrument"].dropna().unique():
-                inst_port_map.setdefault(sym, set()).add(p)
+    def set_pnl(self, rows: np.ndarray, pnl: np.ndarray):
+        """Update pnl_pct for some rows in place (live prices); presence and investment are untouched."""
+        if not self.pnl.flags.writeable:
+            self.pnl = self.pnl.copy()
+        self.pnl[rows] = pnl
+        self.abs_pnl[rows] = np.abs(pnl)
+        has = self.row_has_pnl[rows]
+        with np.errstate(invalid="ignore"):
+            self.direction_masks["Profit"][rows] = has & (pnl > 0)
+            self.direction_masks["Loss"][rows] = has & (pnl < 0)
+            self.direction_masks["Unchanged"][rows] = has & (np.abs(pnl) <= UNCHANGED_TOL)
 
-        if not inst_port_map:
-            continue
+    def pair_codes(self, mask: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Sorted unique inst * n_ports + port codes of the masked rows."""
+        if not mask.any():
+            return np.zeros(0, dtype=np.int64)
+        if rows is not None:  # small subsets: skip the full-size scatter
+            return np.unique(self.inst[rows][mask] * self.n_ports + self.port[rows][mask])
+        seen = np.zeros(self.n_inst * self.n_ports, dtype=bool)
+        seen[self.inst[mask] * self.n_ports + self.port[mask]] = True
+        return np.flatnonzero(seen)
 
+    def base_mask(self, port_mask: np.ndarray, presence: str) -> np.ndarray:
+        """Rows in the selected portfolios whose instrument passes the presence test."""
+        key = (port_mask.tobytes(), presence)
+        cached = self._base_masks.get(key)
+        if cached is not None:
+            return cached
+        sel = np.zeros(self.index.n_ports, dtype=bool)
+        sel[self.index_cols[port_mask]] = True
+        counts = self.index.counts(self.index.port_bits(sel))
         if presence == "Unique":
-            selected_syms = {s for s, ps in inst_port_map.items() if len(ps) == 1}
+            inst_sel = counts == 1
         elif presence == "Not Unique":
-            selected_syms = {s for s, ps in inst_port_map.items() if len(ps) > 1}
+            inst_sel = counts > 1
         else:  # All
-            selected_syms = set(inst_port_map.keys())
+            inst_sel = counts > 0
+        mask = port_mask[self.port] & inst_sel[self.inst]
+        self._base_masks[key] = mask
+        return mask
 
-        if not selected_syms:
-            continue
 
-        # ---------- Helper: direction + comparator logic ----------
-        def direction_mask(df: pd.DataFrame) -> pd.Series:
-            if "pnl_pct" not in df.columns:
-                return pd.Series(False, index=df.index)
-            if direction == "Profit":
-                return df["pnl_pct"] > 0
-            if direction == "Loss":
-                return df["pnl_pct"] < 0
-            if direction == "Unchanged":
-                return df["pnl_pct"].abs() <= 0.0001
-            # No direction specified => accept all
-            return pd.Series(True, index=df.index)
-
-        def row_comp_series(df: pd.DataFrame) -> pd.Series:
-            # Value to compare according to direction
-            if "pnl_pct" not in df.columns:
-                return pd.Series([], dtype=float)
-            if direction == "Loss":
-                return df["pnl_pct"].abs()
-            if direction == "Unchanged":
-                return df["pnl_pct"].abs()
-            return df["pnl_pct"]
-
-        # ---------- Iterate symbols ----------
-        for sym in selected_syms:
-            holding_ports = inst_port_map[sym]
-            # Gather rows across holding portfolios
-            rows_list = []
-            for p in holding_ports:
-                if p not in target_ports:
-                    continue
-                dfp = prepared[p]
-                part = dfp[dfp["instrument"] == sym].copy()
-                if part.empty:
-                    continue
-
-                # Per Stock investment filter
-                if inv_level == "Per Stock" and inv_comp in {"Greater Than", "Less Than", "Range"}:
-                    if "invested" in part.columns:
-                        inv_vals = part["invested"]
-                        if inv_comp == "Greater Than":
-                            part = part[inv_vals >= inv_from]
-                        elif inv_comp == "Less Than":
-                            part = part[inv_vals <= inv_from]
-                        elif inv_comp == "Range":
-                            lo, hi = sorted([inv_from, inv_to])
-                            part = part[(inv_vals >= lo) & (inv_vals <= hi)]
-                        if part.empty:
-                            continue
-
-                # Direction filter
-                m = direction_mask(part)
-                part = part[m]
-                if part.empty:
-                    continue
-
-                part["__portfolio"] = p
-                rows_list.append(part)
-
-            if not rows_list:
-                continue
+def rule_key(rule: dict) -> str:
+    """Content hash of a rule dict; any edited field yields a new key."""
+    payload = json.dumps(rule, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
 
-            sym_df = pd.concat(rows_list, ignore_index=True)
 
-            # If direction is Unchanged we optionally still can check comparator if provided
-            comp_series = row_comp_series(sym_df)
+@dataclass(frozen=True)
+class CompiledRule:
+    """A rule dict parsed and validated once; match() is a pure function of the holdings."""
+    key: str
+    rule_id: Any
+    name: str
+    message: str
+    applied_to: Tuple[str, ...]
+    presence: str       # Unique | Not Unique | All
+    direction: str      # Profit | Loss | Unchanged | ""
+    pl_comp: str
+    pl_from: float
+    pl_to: float
+    pl_basis: str       # Per Portfolio | Total Avg
+    inv_comp: str
+    inv_from: float
+    inv_to: float
+    inv_level: str      # Per Portfolio | Per Stock
 
-            emit_df = sym_df
+    @classmethod
+    def from_dict(cls, rule: dict, key: Optional[str] = None) -> "CompiledRule":
+        pl_from = float(rule.get("pl_from", 0) or 0)
+        inv_from = float(rule.get("inv_from", 0) or 0)
+        return cls(
+            key=key or rule_key(rule),
+            rule_id=rule.get("id"),
+            name=rule.get("name") or f"Rule {rule.get('id', '')}",
+            message=rule.get("message") or "",
+            applied_to=tuple(rule.get("applied_to") or ()),
+            presence=rule.get("stock_presence", "All"),
+            direction=rule.get("profit_loss", ""),
+            pl_comp=rule.get("pl_comp", ""),
+            pl_from=pl_from,
+            pl_to=float(rule.get("pl_to", pl_from) or pl_from),
+            pl_basis=rule.get("pl_basis", "Per Portfolio"),
+            inv_comp=rule.get("inv_comp", ""),
+            inv_from=inv_from,
+            inv_to=float(rule.get("inv_to", inv_from) or inv_from),
+            inv_level=rule.get("inv_level", "Per Stock"),
+        )
 
-            if direction == "Unchanged":
-                # Comparator optional; if provided apply
-                if pl_comp in {"Greater Than", "Less Than", "Range"}:
-                    mask_comp = comp_series.apply(lambda v: _value_matches(pl_comp, v, pl_from, pl_to))
-                    emit_df = sym_df[mask_comp]
-                    if emit_df.empty:
-                        continue
-            else:
-                # Only apply comparator if provided
-                if pl_comp in {"Greater Than", "Less Than", "Range"}:
-                    if pl_basis == "Per Portfolio":
-                        mask_comp = comp_series.apply(lambda v: _value_matches(pl_comp, v, pl_from, pl_to))
-                        emit_df = sym_df[mask_comp]
-                        if emit_df.empty:
-                            continue
-                    else:  # Total Avg
-                        avg_val = float(comp_series.mean()) if not comp_series.empty else 0.0
-                        if not _value_matches(pl_comp, avg_val, pl_from, pl_to):
-                            continue
-                        # Average passes -> keep all rows already direction-filtered
-
-            if emit_df.empty:
-                continue
+    @property
+    def valid(self) -> bool:
+        return self.direction in DIRECTIONS
+
+    def static_mask(self, hf: HoldingsFrame) -> Optional[np.ndarray]:
+        """
+        Rows passing the price-independent tests: portfolio selection, the
+        Per Portfolio investment gate, presence and the Per Stock investment filter.
+        None when nothing can match.
+        """
+        if not self.valid:
+            return None
+        applied = set(self.applied_to or hf.ports)
+        port_mask = np.array([p in applied for p in hf.ports], dtype=bool)
+        if not port_mask.any():
+            return None
+
+        # ---------- Investment gating (Per Portfolio) ----------
+        if self.inv_level == "Per Portfolio" and self.inv_comp in COMPARATORS:
+            port_mask = port_mask & _values_match(self.inv_comp, hf.port_totals, self.inv_from, self.inv_to)
+            if not port_mask.any():
+                return None
+
+        # ---------- Presence ----------
+        mask = hf.base_mask(port_mask, self.presence)
+
+        # ---------- Per Stock investment filter ----------
+        if self.inv_level == "Per Stock" and self.inv_comp in COMPARATORS:
+            mask = mask & (_values_match(self.inv_comp, hf.invested, self.inv_from, self.inv_to) | ~hf.row_has_inv)
+        return mask
+
+    def price_mask(self, hf: HoldingsFrame, static: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Direction and P/L tests on top of static_mask(). With `rows`, only those
+        rows are evaluated (`static` is then already restricted to them); they must
+        cover every row of their instruments for Total Avg rules.
+        """
+        sel = slice(None) if rows is None else rows
+        mask = static & hf.direction_masks[self.direction][sel]
+
+        # ---------- P/L comparator ----------
+        if self.pl_comp in COMPARATORS and mask.any():
+            comp_vals = (hf.abs_pnl if self.direction in ("Loss", "Unchanged") else hf.pnl)[sel]
+            if self.direction == "Unchanged" or self.pl_basis == "Per Portfolio":
+                mask &= _values_match(self.pl_comp, comp_vals, self.pl_from, self.pl_to)
+            else:  # Total Avg: mean over direction-filtered holdings of each instrument
+                inst = hf.inst[sel]
+                ok = mask & ~np.isnan(comp_vals)
+                sums = np.bincount(inst[ok], weights=comp_vals[ok], minlength=hf.n_inst)
+                cnts = np.bincount(inst[ok], minlength=hf.n_inst)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    avg = sums / cnts
+                mask &= _values_match(self.pl_comp, avg, self.pl_from, self.pl_to)[inst]
+        return mask
 
-            # Emit alert rows (one per portfolio holding)
-            for p in emit_df["__portfolio"].unique():
-                records.append({
-                    "instrument": sym,
-                    "portfolio": p,
-                    "rule": rule_name,
-                    "message": message
-                })
-
-    if not records:
-        return pd.DataFrame(columns=["instrument", "portfolio", "rule", "message"])
-    return (
-        pd.DataFrame(records)
-        .drop_duplicates()
-        .sort_values(["portfolio", "instrument"])
-        .reset_index(drop=True)
-    )
+    def match(self, hf: HoldingsFrame) -> np.ndarray:
+        """Matched (instrument, portfolio) pairs as inst * n_ports + port codes of hf."""
+        static = self.static_mask(hf)
+        if static is None:
+            return np.zeros(0, dtype=np.int64)
+        return hf.pair_codes(self.price_mask(hf, static))
+
+
+# ------------- Compiled rule + match caches (process-wide) -------------
+_COMPILED: Dict[str, CompiledRule] = {}
+_RULE_KEYS: Dict[Any, str] = {}      # rule id -> key of the last compiled version
+_CACHE_LOCK = threading.Lock()
+
+
+class _SnapshotState:
+    """Per holdings-snapshot memo: long frame, per-rule matches, assembled results."""
+
+    def __init__(self, hf: HoldingsFrame):
+        self.hf = hf
+        self.matches: Dict[str, np.ndarray] = {}
+        self.results: Dict[Tuple[str, ...], pd.DataFrame] = {}
+
+
+_SNAPSHOTS = SnapshotCache(maxsize=4)
+
+
+def compile_rule(rule) -> CompiledRule:
+    if isinstance(rule, CompiledRule):
+        return rule
+    key = rule_key(rule)
+    compiled = _COMPILED.get(key)
+    if compiled is None:
+        compiled = CompiledRule.from_dict(rule, key)
+        with _CACHE_LOCK:
+            _COMPILED[key] = compiled
+    if rule.get("id") is not None:
+        _RULE_KEYS[rule.get("id")] = key
+    return compiled
+
+
+def invalidate_rule(rule_id) -> None:
+    """Drop the compiled form and memoized matches of one rule (after an edit/delete)."""
+    with _CACHE_LOCK:
+        key = _RULE_KEYS.pop(rule_id, None)
+        if key is None:
+            return
+        _COMPILED.pop(key, None)
+    for state in _SNAPSHOTS.values():
+        state.matches.pop(key, None)
+        for rkey in [k for k in state.results if key in k]:
+            state.results.pop(rkey, None)
+
+
+def _snapshot_state(valid_dfs: Dict[str, pd.DataFrame]) -> _SnapshotState:
+    def _build_state():
+        with span("alerts.snapshot_build"):
+            return _SnapshotState(HoldingsFrame(valid_dfs))
+    return _SNAPSHOTS.get_or_compute(snapshot_key(valid_dfs), _build_state)
+
+
+def _rule_matches(state: _SnapshotState, rule: CompiledRule) -> np.ndarray:
+    pairs = state.matches.get(rule.key)
+    if pairs is None:
+        pairs = state.matches[rule.key] = rule.match(state.hf)
+    return pairs
+
+
+@timed("alerts.generate")
+def generate_alerts(valid_dfs: Dict[str, pd.DataFrame], alert_rules: List[dict]) -> pd.DataFrame:
+    if not valid_dfs or not alert_rules:
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+
+    rules = [compile_rule(r) for r in alert_rules]
+    state = _snapshot_state(valid_dfs)
+    hf = state.hf
+    if hf.n_ports == 0:
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+
+    result_key = tuple(r.key for r in rules)
+    cached = state.results.get(result_key)
+    if cached is not None:
+        return cached.copy()
+
+    pair_parts, rule_parts = [], []
+    for idx, rule in enumerate(rules):
+        pairs = _rule_matches(state, rule)
+        if len(pairs):
+            pair_parts.append(pairs)
+            rule_parts.append(np.full(len(pairs), idx, dtype=np.int64))
+
+    if not pair_parts:
+        state.results[result_key] = pd.DataFrame(columns=ALERT_COLUMNS)
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+
+    pairs = np.concatenate(pair_parts)
+    rule_idx = np.concatenate(rule_parts)
+    inst, port = np.divmod(pairs, hf.n_ports)
+    # Sort by portfolio name, instrument, then rule order (as the row-wise engine emitted them)
+    sort_key = (hf.port_rank[port] * hf.n_inst + inst) * len(rules) + rule_idx
+    order = np.argsort(sort_key, kind="stable")
+    pairs, inst, port, rule_idx = pairs[order], inst[order], port[order], rule_idx[order]
+
+    names = [r.name for r in rules]
+    messages = [r.message for r in rules]
+    out_codes, out_keys = pd.factorize(pd.Series(list(zip(names, messages))))
+    if len(out_keys) < len(rules):
+        # Rules sharing a name and message emit identical rows: keep the first one
+        _, first = np.unique(pairs * len(out_keys) + out_codes[rule_idx], return_index=True)
+        keep = np.sort(first)
+        inst, port, rule_idx = inst[keep], port[keep], rule_idx[keep]
+
+    result = pd.DataFrame({
+        "instrument": pd.Index(hf.instruments).take(inst),
+        "portfolio": pd.Index(hf.ports).take(port),
+        "rule": pd.Index(names).take(rule_idx),
+        "message": pd.Index(messages).take(rule_idx),
+    })
+    state.results[result_key] = result
+    return result.copy()
+
+
+def active_alert_keys(valid_dfs: Dict[str, pd.DataFrame], alert_rules: List[dict]) -> List[Tuple[Any, str, str]]:
+    """
+    (rule id, instrument, portfolio) of every match, without name/message dedup.
+    Shares the per-rule matches memoized by generate_alerts, so it is cheap after it.
+    """
+    if not valid_dfs or not alert_rules:
+        return []
+    state = _snapshot_state(valid_dfs)
+    hf = state.hf
+    if hf.n_ports == 0:
+        return []
+    ports = np.asarray(hf.ports, dtype=object)
+    out: List[Tuple[Any, str, str]] = []
+    for rule in (compile_rule(r) for r in alert_rules):
+        pairs = _rule_matches(state, rule)
+        if not len(pairs):
+            continue
+        inst, port = np.divmod(pairs, hf.n_ports)
+        rid = rule.rule_id if rule.rule_id is not None else rule.key
+        out.extend((rid, i, p) for i, p in zip(hf.instruments[inst].tolist(), ports[port].tolist()))
+    return out
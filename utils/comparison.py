@@ -1,35 +1,119 @@
 import streamlit as st
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+from utils.presence import presence_index
+from utils.snapshot import SnapshotCache, snapshot_key
 
-def compute_common_unique(dfs):
+
+@dataclass(frozen=True)
+class SymbolStat:
+    symbol: str
+    pct: float                      # pnl_pct of the holding (average across holders for common symbols)
+    portfolios: Tuple[str, ...]     # portfolios holding the symbol
+
+
+@dataclass
+class CommonUnique:
+    common: List[SymbolStat]
+    unique: Dict[str, List[SymbolStat]]
+    holders: Dict[str, Tuple[str, ...]]   # every symbol -> portfolios holding it
+
+    @property
+    def common_symbols(self) -> List[str]:
+        return [s.symbol for s in self.common]
+
+
+_COMMON_UNIQUE = SnapshotCache(maxsize=4)
+
+
+def _first_pct_index(df) -> Dict[str, float]:
+    """instrument -> pnl_pct of its first row; one indexed view per portfolio."""
+    first = df.dropna(subset=["instrument"]).drop_duplicates("instrument", keep="first")
+    # Unknown P/L (unpriced holding) stays NaN
+    pct = first["pnl_pct"].to_numpy(dtype=float) if "pnl_pct" in first.columns else [0.0] * len(first)
+    return dict(zip(first["instrument"].tolist(), pct))
+
+
+def _known_mean(values) -> float:
+    known = [v for v in values if not np.isnan(v)]
+    return float(np.mean(known)) if known else float("nan")
+
+
+def _compute_common_unique(dfs) -> CommonUnique:
+    names = list(dfs.keys())
+    if not names:
+        return CommonUnique([], {}, {})
+
+    idx = presence_index(dfs)
+    holders = idx.holders_map()
+    views = {n: _first_pct_index(dfs[n]) for n in names}
+
+    common_stats = [
+        SymbolStat(sym, _known_mean([views[n][sym] for n in holders[sym]]), holders[sym])
+        for sym in idx.instruments[idx.common()].tolist()
+    ]
+    unique_per = {
+        n: [SymbolStat(sym, float(views[n][sym]), (n,)) for sym in idx.unique_to(n).tolist()]
+        for n in names
+    }
+    return CommonUnique(common_stats, unique_per, holders)
+
+
+def compute_common_unique(dfs) -> CommonUnique:
     """
-    Returns (common_list, unique_per_portfolio_html)
-    Expects each df to contain: instrument, pnl_pct(optional)
+    Common symbols, per-portfolio unique symbols and symbol -> holders map.
+    Expects each df to contain: instrument, pnl_pct(optional). Memoized per holdings snapshot.
     """
-    names = list(dfs.keys())
-    sets = {n: set(dfs[n]["instrument"].dropna().unique()) for n in names}
-
-    if not sets:
-        return [], {n: [] for n in names}
-
-    common = set.intersection(*sets.values()) if len(sets) > 1 else next(iter(sets.values()))
-
-    unique_per = {}
-    for n in names:
-        others = set().union(*(sets[o] for o in names if o != n))
-        uniques = sorted(list(sets[n] - others))
-        df = dfs[n]
-        chips = []
-        for sym in uniques:
-            row = df[df["instrument"] == sym]
-            if not row.empty:
-                pct = row.iloc[0].get("pnl_pct", 0)
-                color = "green" if pct > 0 else "red"
-                chips.append(
-                    f"<span style='margin:3px;padding:4px 8px;border-radius:6px;"
-                    f"background:#f1f3f6;color:{color};font-weight:600;font-size:12px'>"
-                    f"{sym} ({pct:.2f}%)</span>"
-                )
-            else:
-                chips.append(f"<span>{sym}</span>")
-        unique_per[n] = chips
-    return sorted(list(common)), unique_per
+    return _COMMON_UNIQUE.get_or_compute(snapshot_key(dfs), lambda: _compute_common_unique(dfs))
+
+
+@dataclass
+class CompareTable:
+    table: pd.DataFrame      # Stock, Portfolios, Avg % Up/Down, <portfolio> % Up/Down ...
+    presence: pd.DataFrame   # bool instrument x portfolio matrix, same row order as table
+
+
+_COMPARE_TABLES = SnapshotCache(maxsize=4)
+
+
+def _build_compare_table(dfs) -> CompareTable:
+    ports = list(dfs.keys())
+    parts = [pd.DataFrame({"instrument": df["instrument"].to_numpy(),
+                           "pnl_pct": df["pnl_pct"].to_numpy(dtype=float) if "pnl_pct" in df.columns else 0.0,
+                           "port": code})
+             for code, df in enumerate(dfs.values())]
+    long_df = pd.concat(parts, ignore_index=True).dropna(subset=["instrument"])
+    # First row per (instrument, portfolio), as the row-wise lookup used
+    long_df = long_df.drop_duplicates(["instrument", "port"], keep="first")
+
+    # Rows and presence come from the shared snapshot index (same sorted instruments)
+    idx = presence_index(dfs)
+    symbols = idx.instruments
+    inst_codes = long_df["instrument"].map(idx.inst_code).to_numpy(dtype=np.int64)
+    port_codes = long_df["port"].to_numpy()
+    pct = np.zeros((len(symbols), len(ports)))
+    pct[inst_codes, port_codes] = long_df["pnl_pct"].to_numpy(dtype=float)
+    present = idx.matrix
+
+    # Average over the holders with a known P/L (an unpriced holding is NaN, not 0%)
+    counts = (present & ~np.isnan(pct)).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg = np.where(counts > 0, np.nansum(pct, axis=1) / np.maximum(counts, 1), np.nan)
+
+    port_names = np.asarray(ports, dtype=object)
+    table = pd.DataFrame({
+        "Stock": np.asarray(symbols, dtype=object),
+        "Portfolios": [list(port_names[row]) for row in present],
+        # Python round (not np.round) to keep the half-way cases of the row-wise version
+        "Avg % Up/Down": np.round([round(v, 2) for v in avg.tolist()], 2),
+        **{f"{p} % Up/Down": np.round(pct[:, i], 2) for i, p in enumerate(ports)},
+    })
+    presence = pd.DataFrame(present, columns=ports)
+    return CompareTable(table, presence)
+
+
+def build_compare_table(dfs) -> CompareTable:
+    """Instrument x portfolio P/L matrix for the Compare tab, cached per holdings snapshot."""
+    return _COMPARE_TABLES.get_or_compute(snapshot_key(dfs), lambda: _build_compare_table(dfs))
@@ -1,4 +1,6 @@
 from utils.helpers import rupees
+from utils.schema import is_canonical
+import pandas as pd
 import math
 
 def portfolio_highlights(df):
@@ -13,6 +15,10 @@ def portfolio_highlights(df):
     if df is None or df.empty:
         return {"max_capital": [], "max_profit": [], "max_loss": []}
 
+    if is_canonical(df):
+        # Canonical frames already carry the derived fields: no copy, no re-derivation
+        return _top_lines(df["instrument"], df["invested"], df["pnl_abs"], df["pnl_pct"])
+
     d = df.copy()
 
     # Standardize / derive invested
@@ -62,21 +68,29 @@ def portfolio_highlights(df):
     for c in ["_invested", "_pl_abs", "_pl_pct"]:
         d[c] = d[c].fillna(0)
 
+    return _top_lines(d[inst_col], d["_invested"], d["_pl_abs"], d["_pl_pct"])
+
+
+def _top_lines(inst, invested, pl_abs, pl_pct):
+    """Top 3 by capital, profit and loss as display strings."""
+    def line(i, fmt):
+        return fmt.format(inst=inst.iloc[i], inv=invested.iloc[i], pl=pl_abs.iloc[i], pct=pl_pct.iloc[i])
+
+    pos = pd.RangeIndex(len(inst))
+    inv_s = pd.Series(invested.to_numpy(), index=pos)
+    pl_s = pd.Series(pl_abs.to_numpy(), index=pos)
+
     # Top 3 by capital
-    cap = (
-        d.sort_values("_invested", ascending=False)
-         .head(3)
-         .apply(lambda r: f"{r[inst_col]} | Invested ₹{r['_invested']:.0f} | P&L {r['_pl_abs']:.0f} ( {r['_pl_pct']:.2f}% )", axis=1)
-         .tolist()
-    )
+    cap_idx = inv_s.sort_values(ascending=False).head(3).index
+    cap = [line(i, "{inst} | Invested ₹{inv:.0f} | P&L {pl:.0f} ( {pct:.2f}% )") for i in cap_idx]
 
     # Top 3 profit (positive pl_abs)
-    prof_src = d[d["_pl_abs"] > 0].sort_values("_pl_abs", ascending=False).head(3)
-    prof = prof_src.apply(lambda r: f"{r[inst_col]} | ₹{r['_pl_abs']:.0f} ( {r['_pl_pct']:.2f}% )", axis=1).tolist()
+    prof_idx = pl_s[pl_s > 0].sort_values(ascending=False).head(3).index
+    prof = [line(i, "{inst} | ₹{pl:.0f} ( {pct:.2f}% )") for i in prof_idx]
 
     # Top 3 loss (negative pl_abs)
-    loss_src = d[d["_pl_abs"] < 0].sort_values("_pl_abs").head(3)
-    loss = loss_src.apply(lambda r: f"{r[inst_col]} | ₹{r['_pl_abs']:.0f} ( {r['_pl_pct']:.2f}% )", axis=1).tolist()
+    loss_idx = pl_s[pl_s < 0].sort_values().head(3).index
+    loss = [line(i, "{inst} | ₹{pl:.0f} ( {pct:.2f}% )") for i in loss_idx]
 
     return {
         "max_capital": cap,
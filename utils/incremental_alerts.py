@@ -0,0 +1,233 @@
+"""
+Incremental alert evaluation for streamed prices.
+
+generate_alerts() re-evaluates every rule over every holding; on a tick feed
+that is mostly wasted work. AlertEvaluator keeps each rule's matching
+(instrument, portfolio) pairs and, for a batch of price updates, re-checks only
+the affected instruments and reports what fired and what cleared.
+
+The price-independent part of each rule (portfolio selection, Per Portfolio
+investment gate, presence, Per Stock investment filter) is computed once per
+holdings snapshot / rule set; Total Avg rules are re-averaged only over the
+instruments whose prices moved.
+"""
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.alerts import COMPARATORS, UNCHANGED_TOL, CompiledRule, HoldingsFrame, compile_rule
+from utils.rule_index import ThresholdIndex
+from utils.timing import span
+
+AlertKey = Tuple[Any, str, str]          # (rule id, instrument, portfolio)
+_DIRECTIONS = ("", "Profit", "Loss", "Unchanged")
+
+
+@dataclass
+class AlertDelta:
+    fired: List[AlertKey] = field(default_factory=list)
+    cleared: List[AlertKey] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.fired or self.cleared)
+
+    def extend(self, other: "AlertDelta"):
+        self.fired.extend(other.fired)
+        self.cleared.extend(other.cleared)
+
+
+class _RuleState:
+    __slots__ = ("rule", "static", "pairs")
+
+    def __init__(self, rule: CompiledRule, static: Optional[np.ndarray]):
+        self.rule = rule
+        self.static = static                 # price-independent row mask (None: never matches)
+        self.pairs: Set[int] = set()         # matched inst * n_ports + port codes
+
+
+class AlertEvaluator:
+    """
+    Holds one holdings snapshot and a rule set; update_prices() returns the
+    fired/cleared deltas caused by a batch of LTP changes.
+    """
+
+    def __init__(self, valid_dfs: Dict[str, pd.DataFrame], alert_rules: Iterable[dict]):
+        self._rules: Dict[str, _RuleState] = {}
+        self._lock = threading.RLock()       # feed threads call on_ticks concurrently with rule edits
+        self._load(valid_dfs)
+        for rule in (compile_rule(x) for x in alert_rules):
+            if rule.key not in self._rules:
+                self._add_rule(rule)
+        self._reindex()
+
+    # ---------- snapshot ----------
+    def _load(self, valid_dfs: Dict[str, pd.DataFrame]):
+        # Own HoldingsFrame: set_pnl() mutates it, so it must not be the shared snapshot cache entry
+        hf = self.hf = HoldingsFrame(valid_dfs)
+        self._port_codes = {p: i for i, p in enumerate(hf.ports)}
+        self._inst_codes = {inst: i for i, inst in enumerate(hf.instruments)}
+        # Rows grouped by instrument (CSR layout) and by (portfolio, instrument)
+        order = np.argsort(hf.inst, kind="stable")
+        self._inst_order = order
+        self._inst_start = np.searchsorted(hf.inst[order], np.arange(hf.n_inst + 1))
+        self._pair_rows: Dict[Tuple[int, int], List[int]] = {}
+        self._token_rows: Dict[Tuple[int, str], List[int]] = {}
+        for row, (i, p, tok) in enumerate(zip(hf.inst.tolist(), hf.port.tolist(), hf.token.tolist())):
+            self._pair_rows.setdefault((p, i), []).append(row)
+            if tok is not None and tok == tok:
+                self._token_rows.setdefault((p, str(tok)), []).append(row)
+
+    def reset(self, valid_dfs: Dict[str, pd.DataFrame]) -> AlertDelta:
+        """New holdings snapshot: recompute every rule (gates included) and diff against the old state."""
+        with self._lock:
+            before = self.active()
+            self._load(valid_dfs)
+            rules = [st.rule for st in self._rules.values()]
+            self._rules = {}
+            for rule in rules:
+                self._add_rule(rule)
+            self._reindex()
+            return self._diff(before, self.active())
+
+    # ---------- rules ----------
+    def set_rules(self, alert_rules: Iterable[dict]) -> AlertDelta:
+        """Replace the rule set; only added or edited rules are evaluated."""
+        compiled = {r.key: r for r in (compile_rule(x) for x in alert_rules)}
+        delta = AlertDelta()
+        with self._lock:
+            for key in [k for k in self._rules if k not in compiled]:
+                delta.cleared.extend(self._keys(self._rules.pop(key)))
+            for key, rule in compiled.items():
+                if key not in self._rules:
+                    delta.fired.extend(self._keys(self._add_rule(rule)))
+            self._reindex()
+        return delta
+
+    def _add_rule(self, rule: CompiledRule) -> _RuleState:
+        state = _RuleState(rule, rule.static_mask(self.hf))
+        if state.static is not None:
+            state.pairs = set(self.hf.pair_codes(rule.price_mask(self.hf, state.static)).tolist())
+        self._rules[rule.key] = state
+        return state
+
+    def _reindex(self):
+        """Positional rule list plus the P/L threshold index used to pick candidates per tick."""
+        self._order = [st for st in self._rules.values() if st.static is not None]
+        rules = [st.rule for st in self._order]
+        self._pl_index = ThresholdIndex.for_pl(rules)
+        by_dir = {d: [] for d in _DIRECTIONS}
+        avg = {d: [] for d in _DIRECTIONS}
+        for i, r in enumerate(rules):
+            by_dir[r.direction].append(i)
+            if r.direction != "Unchanged" and r.pl_basis != "Per Portfolio" and r.pl_comp in COMPARATORS:
+                avg[r.direction].append(i)       # Total Avg: depends on the instrument's other rows too
+        self._dir_ids = {d: np.asarray(v, dtype=np.int64) for d, v in by_dir.items()}
+        self._avg_ids = {d: np.asarray(v, dtype=np.int64) for d, v in avg.items()}
+
+    def _candidates(self, old: np.ndarray, new: np.ndarray) -> np.ndarray:
+        """Rule positions whose outcome on some row can change when pnl_pct moves old -> new."""
+        parts = []
+        for a, b in zip(old.tolist(), new.tolist()):
+            for d in _DIRECTIONS:
+                in_a, in_b = _in_direction(d, a), _in_direction(d, b)
+                if in_a != in_b:
+                    parts.append(self._dir_ids[d])
+                elif in_b:
+                    va, vb = (abs(a), abs(b)) if d in ("Loss", "Unchanged") else (a, b)
+                    parts.append(self._pl_index.crossed(d, va, vb))
+                    parts.append(self._avg_ids[d])
+        return np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+
+    # ---------- prices ----------
+    def update_prices(self, portfolio: str, prices: Mapping[str, float], by: str = "instrument") -> AlertDelta:
+        """
+        Apply LTPs for one portfolio, keyed by instrument name (or by broker
+        token with by="token"), and return the alerts that fired or cleared.
+        """
+        with self._lock, span("alerts.incremental"):
+            return self._update_prices(portfolio, prices, by)
+
+    def _update_prices(self, portfolio: str, prices: Mapping[str, float], by: str) -> AlertDelta:
+        p = self._port_codes.get(portfolio)
+        if p is None or not prices:
+            return AlertDelta()
+        index = self._token_rows if by == "token" else self._pair_rows
+        key_of = (lambda k: (p, str(k))) if by == "token" else (lambda k: (p, self._inst_codes.get(k)))
+
+        rows, ltps = [], []
+        for k, ltp in prices.items():
+            for row in index.get(key_of(k), ()):
+                rows.append(row)
+                ltps.append(ltp)
+        if not rows:
+            return AlertDelta()
+        rows = np.asarray(rows, dtype=np.int64)
+        avg = self.hf.avg_price[rows]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pnl = np.round((np.asarray(ltps, dtype=float) - avg) / avg * 100, 2)
+        # A tick that yields no P&L (bad price, no average) leaves the row as it was, never 0%
+        keep = ~np.isnan(pnl) & (pnl != self.hf.pnl[rows]) & self.hf.row_has_pnl[rows]
+        if not keep.any():
+            return AlertDelta()
+        rows, pnl = rows[keep], pnl[keep]
+        candidates = self._candidates(self.hf.pnl[rows], pnl)
+        self.hf.set_pnl(rows, pnl)
+        return self._reevaluate(np.unique(self.hf.inst[rows]), candidates)
+
+    def on_ticks(self, portfolio: str, ticks: Mapping[str, float]) -> AlertDelta:
+        """PriceTable listener form: broker tokens -> LTP (portfolios are named after brokers)."""
+        return self.update_prices(portfolio, ticks, by="token")
+
+    def _reevaluate(self, insts: np.ndarray, candidates: np.ndarray) -> AlertDelta:
+        """Re-match the candidate rules on every row of the touched instruments."""
+        hf = self.hf
+        # Every row of the touched instruments (all portfolios: Total Avg spans them)
+        rows = np.concatenate([self._inst_order[self._inst_start[i]:self._inst_start[i + 1]] for i in insts])
+        n = hf.n_ports
+        pair_slots = [c for i in insts.tolist() for c in range(i * n, i * n + n)]
+        delta = AlertDelta()
+        for pos in candidates.tolist():
+            state = self._order[pos]
+            static = state.static[rows]
+            if not static.any():             # no touched row can match, so none matched before either
+                continue
+            new = set(hf.pair_codes(state.rule.price_mask(hf, static, rows), rows).tolist())
+            old = {c for c in pair_slots if c in state.pairs}
+            if new == old:
+                continue
+            fired, cleared = new - old, old - new
+            state.pairs = (state.pairs - cleared) | fired
+            delta.fired.extend(self._key(state.rule, c) for c in sorted(fired))
+            delta.cleared.extend(self._key(state.rule, c) for c in sorted(cleared))
+        return delta
+
+    # ---------- results ----------
+    def _key(self, rule: CompiledRule, code: int) -> AlertKey:
+        inst, port = divmod(code, self.hf.n_ports)
+        rid = rule.rule_id if rule.rule_id is not None else rule.key
+        return rid, self.hf.instruments[inst], self.hf.ports[port]
+
+    def _keys(self, state: _RuleState) -> List[AlertKey]:
+        return [self._key(state.rule, c) for c in sorted(state.pairs)]
+
+    def active(self) -> Set[AlertKey]:
+        with self._lock:
+            return {k for st in self._rules.values() for k in self._keys(st)}
+
+    @staticmethod
+    def _diff(before: Set[AlertKey], after: Set[AlertKey]) -> AlertDelta:
+        return AlertDelta(fired=sorted(after - before, key=str), cleared=sorted(before - after, key=str))
+
+
+def _in_direction(direction: str, pnl: float) -> bool:
+    """Scalar form of HoldingsFrame.direction_masks for a row that has pnl_pct."""
+    if direction == "Profit":
+        return pnl > 0
+    if direction == "Loss":
+        return pnl < 0
+    if direction == "Unchanged":
+        return abs(pnl) <= UNCHANGED_TOL
+    return True
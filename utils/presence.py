@@ -0,0 +1,121 @@
+"""
+Instrument x portfolio presence index, built once per holdings snapshot.
+
+Each instrument's holders are a bitmask over the portfolios (bit i = ports[i],
+packed into uint64 words so any number of portfolios fits), kept next to the
+equivalent boolean matrix for row/column indexing. Unique / Not Unique /
+common and "present in / not in" questions are bit operations on these masks:
+
+    idx = presence_index(valid_dfs)
+    sel = idx.port_bits(["AngelOne", "Zerodha"])
+    idx.instruments[idx.unique(sel)]          # held by exactly one of the two
+    idx.holders("INFY"), idx.absent("INFY")   # ('AngelOne',), ('Zerodha',)
+"""
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from utils.snapshot import SnapshotCache, snapshot_key
+
+if hasattr(np, "bitwise_count"):             # numpy >= 2.0
+    _popcount = np.bitwise_count
+else:
+    def _popcount(words: np.ndarray) -> np.ndarray:
+        return np.unpackbits(words.view(np.uint8), axis=-1).reshape(*words.shape, 64).sum(axis=-1)
+
+
+class PresenceIndex:
+    def __init__(self, dfs: Dict[str, pd.DataFrame]):
+        self.ports: Tuple[str, ...] = tuple(dfs.keys())
+        self.port_code = {p: i for i, p in enumerate(self.ports)}
+        self.n_ports = len(self.ports)
+
+        cols = []
+        for df in dfs.values():
+            if df is None or df.empty or "instrument" not in df.columns:
+                cols.append(np.zeros(0, dtype=object))
+            else:
+                cols.append(df["instrument"].dropna().to_numpy(dtype=object))
+        port_of = np.repeat(np.arange(self.n_ports), [len(c) for c in cols])
+        inst_codes, uniques = pd.factorize(np.concatenate(cols) if cols else np.zeros(0, dtype=object), sort=True)
+        self.instruments = np.asarray(uniques, dtype=object)
+        self.inst_code = {s: i for i, s in enumerate(self.instruments.tolist())}
+        self.n_inst = len(self.instruments)
+
+        self.matrix = np.zeros((self.n_inst, self.n_ports), dtype=bool)
+        self.matrix[inst_codes, port_of] = True
+        self.bits = self._pack(self.matrix)                  # (n_inst, n_words) uint64
+        self.all_bits = self._pack(np.ones((1, self.n_ports), dtype=bool))[0]
+        self._holders: Dict[str, Tuple[str, ...]] = {}
+
+    @staticmethod
+    def _pack(matrix: np.ndarray) -> np.ndarray:
+        n_words = max(1, -(-matrix.shape[1] // 64))
+        padded = np.zeros((matrix.shape[0], n_words * 64), dtype=bool)
+        padded[:, :matrix.shape[1]] = matrix
+        return np.packbits(padded, axis=1, bitorder="little").view("<u8")
+
+    # ---------- selections ----------
+    def port_bits(self, ports: Optional[Union[Iterable[str], np.ndarray]] = None) -> np.ndarray:
+        """Bitmask of the given portfolio names (or boolean mask over ports); all ports by default."""
+        if ports is None:
+            return self.all_bits
+        if isinstance(ports, np.ndarray) and ports.dtype == bool:
+            sel = ports
+        else:
+            sel = np.zeros(self.n_ports, dtype=bool)
+            sel[[self.port_code[p] for p in ports if p in self.port_code]] = True
+        return self._pack(sel[None, :])[0]
+
+    def counts(self, sel: Optional[np.ndarray] = None) -> np.ndarray:
+        """Per instrument: how many of the selected portfolios hold it."""
+        sel = self.all_bits if sel is None else sel
+        return _popcount(self.bits & sel).sum(axis=1, dtype=np.int64)
+
+    def held(self, sel: Optional[np.ndarray] = None) -> np.ndarray:
+        return (self.bits & (self.all_bits if sel is None else sel)).any(axis=1)
+
+    def unique(self, sel: Optional[np.ndarray] = None) -> np.ndarray:
+        return self.counts(sel) == 1
+
+    def shared(self, sel: Optional[np.ndarray] = None) -> np.ndarray:
+        return self.counts(sel) > 1
+
+    def common(self, sel: Optional[np.ndarray] = None) -> np.ndarray:
+        """Instruments held by every selected portfolio."""
+        sel = self.all_bits if sel is None else sel
+        return ((self.bits & sel) == sel).all(axis=1)
+
+    def unique_to(self, port: str) -> np.ndarray:
+        """Instruments held by `port` and no other portfolio (sorted)."""
+        only = self.port_bits([port])
+        return self.instruments[(self.bits == only).all(axis=1)]
+
+    # ---------- per instrument ----------
+    def holders(self, instrument) -> Tuple[str, ...]:
+        """Portfolios holding `instrument`, in portfolio order."""
+        cached = self._holders.get(instrument)
+        if cached is None:
+            i = self.inst_code.get(instrument)
+            cached = () if i is None else tuple(self.ports[j] for j in np.flatnonzero(self.matrix[i]))
+            self._holders[instrument] = cached
+        return cached
+
+    def absent(self, instrument) -> Tuple[str, ...]:
+        """Portfolios not holding `instrument`."""
+        i = self.inst_code.get(instrument)
+        if i is None:
+            return self.ports
+        return tuple(self.ports[j] for j in np.flatnonzero(~self.matrix[i]))
+
+    def holders_map(self) -> Dict[str, Tuple[str, ...]]:
+        return {sym: self.holders(sym) for sym in self.instruments.tolist()}
+
+
+_PRESENCE = SnapshotCache(maxsize=4)
+
+
+def presence_index(dfs: Dict[str, pd.DataFrame]) -> PresenceIndex:
+    """Presence index of a {portfolio: holdings} snapshot, shared by comparison and alerts."""
+    return _PRESENCE.get_or_compute(snapshot_key(dfs), lambda: PresenceIndex(dfs))
@@ -0,0 +1,84 @@
+"""
+Sorted threshold index over the rules' comparator bounds.
+
+Every comparator is Greater Than (v >= from), Less Than (v <= from) or Range
+(lo <= v <= hi). Keeping each kind's bounds sorted turns "which rules change
+outcome when a value moves from a to b" into binary searches instead of a scan
+over all rules; AlertEvaluator uses it to pick the rules a tick can affect.
+
+    pl = ThresholdIndex.for_pl(rules)            # grouped by direction
+    pl.crossed("Profit", 4.0, 6.5)               # rule positions whose outcome flips
+"""
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from utils.alerts import COMPARATORS, CompiledRule
+
+_EMPTY = np.zeros(0, dtype=np.int64)
+
+
+class _SortedBounds:
+    """One group's bounds: GT thresholds, LT thresholds, Range lows and highs, each sorted."""
+
+    def __init__(self, entries: List[Tuple[str, float, float, int]]):
+        def _sorted(pairs):
+            if not pairs:
+                return np.zeros(0), _EMPTY
+            vals, ids = zip(*sorted(pairs))
+            return np.asarray(vals, dtype=float), np.asarray(ids, dtype=np.int64)
+
+        self.gt, self.gt_ids = _sorted([(lo, i) for comp, lo, _, i in entries if comp == "Greater Than"])
+        self.lt, self.lt_ids = _sorted([(lo, i) for comp, lo, _, i in entries if comp == "Less Than"])
+        ranges = [(lo, hi, i) for comp, lo, hi, i in entries if comp == "Range"]
+        self.rlo, self.rlo_ids = _sorted([(lo, i) for lo, _, i in ranges])
+        self.rhi, self.rhi_ids = _sorted([(hi, i) for _, hi, i in ranges])
+        self.all_ids = np.asarray(sorted(i for *_, i in entries), dtype=np.int64)
+
+    def crossed(self, a: float, b: float) -> np.ndarray:
+        """Rules whose outcome may differ between values a and b (all of them if either is NaN)."""
+        if np.isnan(a) or np.isnan(b):
+            return self.all_ids
+        lo, hi = min(a, b), max(a, b)
+        if lo == hi:
+            return _EMPTY
+        parts = [
+            self.gt_ids[np.searchsorted(self.gt, lo, "right"):np.searchsorted(self.gt, hi, "right")],  # lo < t <= hi
+            self.lt_ids[np.searchsorted(self.lt, lo, "left"):np.searchsorted(self.lt, hi, "left")],    # lo <= t < hi
+            self.rlo_ids[np.searchsorted(self.rlo, lo, "right"):np.searchsorted(self.rlo, hi, "right")],
+            self.rhi_ids[np.searchsorted(self.rhi, lo, "left"):np.searchsorted(self.rhi, hi, "left")],
+        ]
+        return np.unique(np.concatenate(parts))
+
+
+class ThresholdIndex:
+    """
+    Comparator bounds of many rules, split into groups (P/L: by direction).
+    Rules without a comparator accept every value, so they never cross and are
+    not indexed.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str, float, float, int]]):
+        groups: Dict[str, list] = {}
+        for group, comp, from_v, to_v, idx in entries:
+            if comp in COMPARATORS:
+                lo, hi = sorted([from_v, to_v]) if comp == "Range" else (from_v, from_v)
+                groups.setdefault(group, []).append((comp, lo, hi, idx))
+        self._groups = {g: _SortedBounds(e) for g, e in groups.items()}
+
+    @classmethod
+    def for_pl(cls, rules: List[CompiledRule], basis: str = "Per Portfolio") -> "ThresholdIndex":
+        """
+        P/L bounds by direction. Only rules tested row by row are indexed
+        (Per Portfolio basis, or Unchanged); Total Avg rules compare a per-instrument
+        average and are left out.
+        """
+        return cls(
+            (r.direction, r.pl_comp, r.pl_from, r.pl_to, i) for i, r in enumerate(rules)
+            if r.valid and (r.direction == "Unchanged" or r.pl_basis == basis)
+        )
+
+    def crossed(self, group: str, a: float, b: float) -> np.ndarray:
+        """Positions of rules in `group` whose comparator outcome changes between `a` and `b`."""
+        bounds = self._groups.get(group)
+        return bounds.crossed(float(a), float(b)) if bounds is not None else _EMPTY
@@ -0,0 +1,199 @@
+from functools import lru_cache
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.snapshot import SnapshotCache, frame_fingerprint
+
+# Canonical holdings schema shared by every module:
+#   instrument (category), quantity / avg_price / ltp (float64),
+#   broker / exchange (category), invested / pnl_abs / pnl_pct (float64, precomputed),
+#   token (category, broker instrument token as a string; used by the live price feeds)
+CANONICAL_COLUMNS = [
+    "instrument", "quantity", "avg_price", "ltp",
+    "invested", "pnl_abs", "pnl_pct", "broker", "exchange", "token",
+]
+CATEGORY_COLUMNS = ("instrument", "broker", "exchange", "token")
+# Canonical frames are shared: the holdings cache and the normalization memo hand the
+# same object to every session, and frame_fingerprint memoizes its hash per object.
+# Their numeric arrays are therefore read-only (in-place writes raise ValueError);
+# derive new frames with .copy() or assign columns on a copy, never on the original.
+
+# Source column aliases per canonical field; the first match wins.
+COLUMN_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "instrument": ("instrument", "tradingsymbol", "trading_symbol", "symbol", "name", "Instrument",
+                   "Symbol", "Stock Name"),
+    "quantity": ("quantity", "qty", "QTY", "Quantity", "Qty.", "Quantity Available"),
+    "avg_price": ("avg_price", "average_price", "averageprice", "Average Price", "avgPrice",
+                  "Avg. cost", "avg_cost", "avg_cost_price", "Average buy price"),
+    "ltp": ("ltp", "LTP", "last_price", "last_traded_price", "close_price",
+            "Previous Closing Price", "Closing price"),
+    "invested": ("invested", "Invested"),
+    "pnl_abs": ("pnl_abs",),
+    "pnl_pct": ("pnl_pct",),
+    "exchange": ("exchange", "Exchange"),
+    "token": ("token", "symboltoken", "instrument_token"),
+}
+
+
+@lru_cache(maxsize=64)
+def resolve_mapping(columns: Tuple[str, ...]) -> Dict[str, str]:
+    """Canonical field -> source column for one source schema (cached per column set)."""
+    present = set(columns)
+    mapping = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        src = next((c for c in aliases if c in present), None)
+        if src is not None:
+            mapping[field] = src
+    return mapping
+
+
+def is_canonical(df: pd.DataFrame) -> bool:
+    return (
+        df is not None
+        and list(df.columns) == CANONICAL_COLUMNS
+        and isinstance(df["instrument"].dtype, pd.CategoricalDtype)
+    )
+
+
+def _numeric(df: pd.DataFrame, col: Optional[str]) -> Optional[pd.Series]:
+    if col is None:
+        return None
+    return pd.to_numeric(df[col], errors="coerce").astype("float64")
+
+
+def _category(values: Iterable, n: int) -> pd.Categorical:
+    if isinstance(values, str) or values is None:
+        values = [values] * n
+    return pd.Categorical(values)
+
+
+def _token_str(v) -> Optional[str]:
+    if v is None or v == "" or (isinstance(v, float) and np.isnan(v)):
+        return None
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+def _frozen_frame(columns: Dict[str, object], index=None) -> pd.DataFrame:
+    """DataFrame over the given column arrays (not copied unless they view other data), made read-only."""
+    data = {}
+    for name, values in columns.items():
+        if isinstance(values, np.ndarray) and values.flags.writeable:
+            if values.base is not None:      # a view into someone else's (mutable) data
+                values = values.copy()
+            values.flags.writeable = False
+        data[name] = values
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+def is_frozen(df: pd.DataFrame) -> bool:
+    return all(not df[c].to_numpy().flags.writeable for c in df.columns if c not in CATEGORY_COLUMNS)
+
+
+def _columns(df: pd.DataFrame) -> Dict[str, object]:
+    return {c: df[c].array if c in CATEGORY_COLUMNS else df[c].to_numpy() for c in df.columns}
+
+
+def normalize_holdings(df: pd.DataFrame, broker: Optional[str] = None) -> pd.DataFrame:
+    """
+    Build the canonical (read-only) holdings frame from any supported source schema
+    in one pass. Canonical read-only input is returned as-is (no copy).
+    """
+    if df is None or df.empty:
+        return pd.DataFrame()
+    if is_canonical(df):
+        return df if is_frozen(df) else _frozen_frame(_columns(df.copy()), index=df.index)
+
+    mapping = resolve_mapping(tuple(df.columns))
+    if "instrument" not in mapping:
+        return pd.DataFrame()
+
+    n = len(df)
+    qty = _numeric(df, mapping.get("quantity"))
+    avg = _numeric(df, mapping.get("avg_price"))
+    ltp = _numeric(df, mapping.get("ltp"))
+
+    invested = _numeric(df, mapping.get("invested"))
+    if invested is None and avg is not None and qty is not None:
+        invested = (avg.fillna(0) * qty.fillna(0)).round(2)
+    pnl_abs = _numeric(df, mapping.get("pnl_abs"))
+    if pnl_abs is None and avg is not None and ltp is not None and qty is not None:
+        pnl_abs = ((ltp - avg) * qty).round(2)
+    pnl_pct = _numeric(df, mapping.get("pnl_pct"))
+    if pnl_pct is None and avg is not None and ltp is not None:
+        pnl_pct = (ltp - avg) / avg * 100
+
+    def _col(s: Optional[pd.Series], fill=np.nan) -> np.ndarray:
+        return s.to_numpy(dtype="float64") if s is not None else np.full(n, fill)
+
+    exch_col = mapping.get("exchange")
+    token_col = mapping.get("token")
+    cols = {
+        "instrument": pd.Categorical(df[mapping["instrument"]]),
+        "quantity": _col(qty),
+        "avg_price": _col(avg),
+        "ltp": _col(ltp),
+        "invested": np.nan_to_num(_col(invested, 0.0), nan=0.0, posinf=np.inf, neginf=-np.inf),
+        "pnl_abs": np.nan_to_num(_col(pnl_abs, 0.0), nan=0.0, posinf=np.inf, neginf=-np.inf),
+        "pnl_pct": np.round(np.nan_to_num(_col(pnl_pct, 0.0), nan=0.0, posinf=np.inf, neginf=-np.inf), 2),
+        "broker": _category(broker, n),
+        "exchange": _category(df[exch_col].to_numpy() if exch_col else None, n),
+        "token": _category([_token_str(v) for v in df[token_col]] if token_col else None, n),
+    }
+    if ltp is not None:
+        # Missing price (failed quote): unknown P&L stays NaN instead of reading as 0%
+        unpriced = np.isnan(cols["ltp"])
+        if unpriced.any():
+            cols["pnl_abs"] = np.where(unpriced, _col(pnl_abs), cols["pnl_abs"])
+            cols["pnl_pct"] = np.where(unpriced, np.round(_col(pnl_pct), 2), cols["pnl_pct"])
+    return _frozen_frame(cols)
+
+
+def apply_live_prices(df: pd.DataFrame, prices: Mapping[str, float]) -> pd.DataFrame:
+    """
+    Overlay streamed LTPs (token -> price) on a canonical frame and recompute P&L.
+    Returns the input unchanged when no price differs, so snapshot caches stay warm.
+    """
+    if df.empty or not prices or "token" not in df.columns:
+        return df
+    live = df["token"].map(prices).astype("float64").to_numpy()
+    hit = ~np.isnan(live) & (live != df["ltp"].to_numpy())
+    if not hit.any():
+        return df
+
+    cols = _columns(df)
+    ltp = np.where(hit, live, cols["ltp"])
+    avg, qty = cols["avg_price"], cols["quantity"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pnl_pct = (ltp - avg) / avg * 100
+    cols["ltp"] = ltp
+    cols["pnl_abs"] = np.where(hit, np.round((ltp - avg) * qty, 2), cols["pnl_abs"])
+    # A missing average gives no percentage: keep the fetched one, as the evaluator does
+    cols["pnl_pct"] = np.where(hit & ~np.isnan(pnl_pct), np.round(pnl_pct, 2), cols["pnl_pct"])
+    return _frozen_frame(cols, index=df.index)
+
+
+_NORMALIZED = SnapshotCache(maxsize=128)   # one entry per account; sized for dozens of portfolios
+
+
+def _prices_key(prices: Optional[Mapping[str, float]]) -> Optional[tuple]:
+    return tuple(sorted(prices.items())) if prices else None
+
+
+def normalize_and_enrich(df: pd.DataFrame, broker: Optional[str] = None,
+                         live_prices: Optional[Mapping[str, float]] = None) -> pd.DataFrame:
+    """
+    Entry point used by the app; kept under its historical name. Joins streamed LTPs when given.
+    Memoized by a content hash of the raw frame, so reruns on unchanged holdings return
+    the same (read-only) frame and downstream snapshot caches stay warm.
+    """
+    key = (broker, frame_fingerprint(df), _prices_key(live_prices))
+    return _NORMALIZED.get_or_compute(key, lambda: _normalize_and_enrich(df, broker, live_prices))
+
+
+def _normalize_and_enrich(df, broker, live_prices) -> pd.DataFrame:
+    out = normalize_holdings(df, broker)
+    return apply_live_prices(out, live_prices) if live_prices else out
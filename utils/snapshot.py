@@ -0,0 +1,80 @@
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+import pandas as pd
+
+
+# id(frame) -> (weakref, fingerprint). Canonical holdings frames are read-only
+# (utils.schema) and every transform copies, so a frame's hash is computed once per object.
+_FINGERPRINTS: Dict[int, Tuple[weakref.ref, str]] = {}
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """Content hash of a DataFrame (columns, index and values); memoized per frame object."""
+    if df is None:
+        return "none"
+    hit = _FINGERPRINTS.get(id(df))
+    if hit is not None and hit[0]() is df:
+        return hit[1]
+    fp = _content_hash(df)
+    key = id(df)
+    _FINGERPRINTS[key] = (weakref.ref(df, lambda _ref, k=key: _FINGERPRINTS.pop(k, None)), fp)
+    return fp
+
+
+def _content_hash(df: pd.DataFrame) -> str:
+    h = hashlib.sha1()
+    h.update(repr(list(df.columns)).encode("utf-8"))
+    if not df.empty:
+        h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def snapshot_key(dfs: Dict[str, pd.DataFrame]) -> str:
+    """Content hash of a {portfolio: holdings} mapping; stable across reruns."""
+    h = hashlib.sha1()
+    for name, df in dfs.items():
+        h.update(str(name).encode("utf-8"))
+        h.update(frame_fingerprint(df).encode("utf-8"))
+    return h.hexdigest()
+
+
+class SnapshotCache:
+    """Small thread-safe LRU keyed by snapshot key (shared by all sessions of the process)."""
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def get_or_compute(self, key, fn):
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, fn())
+        return value
+
+    def values(self):
+        with self._lock:
+            return list(self._data.values())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
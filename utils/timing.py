@@ -0,0 +1,143 @@
+"""
+Lightweight timing spans for the hot paths.
+
+    with span("alerts.generate"):
+        ...
+
+    @timed("angelone.login")
+    def login(...): ...
+
+Spans recorded while a run is active (start_run() at the top of app.py) are
+grouped into that rerun's breakdown; every span also feeds a rolling window
+used for p50/p95 and the JSON lines / Prometheus exports. Prometheus gets the
+window's quantiles plus monotonic _count/_sum totals since process start.
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.helpers import clean_env_value
+
+WINDOW = 200  # samples kept per span for the rolling percentiles
+
+
+class RunRecord:
+    def __init__(self):
+        self.started = time.time()
+        self.spans: Dict[str, float] = {}       # name -> total ms within the run
+        self._lock = threading.Lock()
+
+    def add(self, name: str, ms: float):
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + ms
+
+
+_current_run: contextvars.ContextVar = contextvars.ContextVar("perf_run", default=None)
+_samples = defaultdict(lambda: deque(maxlen=WINDOW))
+_totals: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])   # name -> [count, sum ms], never reset
+_samples_lock = threading.Lock()
+
+
+def record(name: str, ms: float):
+    with _samples_lock:
+        _samples[name].append(ms)
+        total = _totals[name]
+        total[0] += 1
+        total[1] += ms
+    run = _current_run.get()
+    if run is not None:
+        run.add(name, ms)
+
+
+@contextmanager
+def span(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - t0) * 1000.0)
+
+
+def timed(name: Optional[str] = None):
+    def deco(fn):
+        label = name or f"{fn.__module__}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kw):
+            with span(label):
+                return fn(*args, **kw)
+        return wrapper
+    return deco
+
+
+def start_run() -> RunRecord:
+    run = RunRecord()
+    _current_run.set(run)
+    return run
+
+
+def finish_run() -> Optional[RunRecord]:
+    """Close the active run and export it; returns it for display."""
+    run = _current_run.get()
+    if run is None:
+        return None
+    record("rerun.total", (time.time() - run.started) * 1000.0)
+    _current_run.set(None)
+    _export(run)
+    return run
+
+
+def percentiles() -> Dict[str, Dict[str, float]]:
+    with _samples_lock:
+        snap = {k: list(v) for k, v in _samples.items() if v}
+    return {
+        k: {"p50": float(np.percentile(v, 50)), "p95": float(np.percentile(v, 95)), "count": len(v)}
+        for k, v in sorted(snap.items())
+    }
+
+
+# ---------- exports ----------
+def _export(run: RunRecord):
+    jsonl_path = clean_env_value("PERF_JSONL_PATH")
+    prom_path = clean_env_value("PERF_PROM_PATH")
+    try:
+        if jsonl_path:
+            with open(jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"ts": run.started, "spans_ms": run.spans}) + "\n")
+        if prom_path:
+            write_prometheus(prom_path)
+    except OSError:
+        pass
+
+
+def prometheus_text() -> str:
+    lines: List[str] = [
+        "# HELP dashboard_span_duration_ms Duration of dashboard stages in milliseconds "
+        f"(quantiles over the last {WINDOW} samples; count and sum since start).",
+        "# TYPE dashboard_span_duration_ms summary",
+    ]
+    with _samples_lock:
+        totals = {k: tuple(v) for k, v in _totals.items()}
+    for name, st in percentiles().items():
+        count, total_ms = totals.get(name, (0, 0.0))
+        lines.append(f'dashboard_span_duration_ms{{span="{name}",quantile="0.5"}} {st["p50"]:.3f}')
+        lines.append(f'dashboard_span_duration_ms{{span="{name}",quantile="0.95"}} {st["p95"]:.3f}')
+        lines.append(f'dashboard_span_duration_ms_sum{{span="{name}"}} {total_ms:.3f}')
+        lines.append(f'dashboard_span_duration_ms_count{{span="{name}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str):
+    """Atomic write for the node_exporter textfile collector."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)